@@ -8,7 +8,12 @@ identify the tokens, and output the tokens to a file USING FSM.
 
 
 
+from array import array  # Compact typed arrays for token streams
+from collections import OrderedDict  # Least recently used order of the line memo
+from itertools import chain
+import mmap  # Memory-mapped file access
 import re  # Regular expression library
+import sys
 
 # Token Types
 class TokenType:
@@ -27,20 +32,46 @@ class TokenType:
     #invaild
     INVALID = "invalid"
 
+# Integer kind codes for the token types, used wherever tokens are stored or compared in bulk
+KIND_KEYWORD = 0
+KIND_IDENTIFIER = 1
+KIND_OPERATOR = 2
+KIND_INTEGER = 3
+KIND_REAL = 4
+KIND_SEPARATOR = 5
+KIND_INVALID = 6
+
+# kind code -> token type, and token type -> kind code
+kind_names = (TokenType.KEYWORD, TokenType.IDENTIFIER, TokenType.OPERATOR, TokenType.INTEGER,
+              TokenType.REAL, TokenType.SEPARATOR, TokenType.INVALID)
+kind_codes = {name: code for code, name in enumerate(kind_names)}
+
 # Token class includes the token type and lexeme
 class Token: 
-    def __init__(self, token_type, lexeme):
+    __slots__ = ("token_type", "lexeme", "offset", "line", "column")
+
+    def __init__(self, token_type, lexeme, offset=None, line=None, column=None):
         # type of token 
         self.token_type = token_type
         # the string associated with the token 
         self.lexeme = lexeme
+        # position of the token in the source (None when lexing a single line)
+        self.offset = offset
+        self.line = line
+        self.column = column
         
+    @property
+    def kind(self):
+        # integer kind code of the token type
+        return kind_codes[self.token_type]
+
     def __str__(self):
         # This will define how the token is represented a string 
         return f"{self.token_type:<10} {self.lexeme}"
 
 # Defining keywords
 keywords = ["function", "integer", "boolean", "real", "if", "else", "fi", "return", "put", "get", "while", "true", "false"]
+keyword_set = frozenset(keywords)  # hashed, for constant-time keyword checks
 
 # DFSM Transition Table for Identifiers
 identifier_transition_table = {
@@ -75,10 +106,10 @@ def is_operator_char(char):
 """
     This function checks if the provided lexeme (a sequence of characters) is a keyword.
     Keywords are reserved words in programming languages (e.g., 'if', 'else', 'while').
-    The 'keywords' variable is assumed to be a predefined list or set of keywords.  
+    The lookup goes through keyword_set, the hashed form of the 'keywords' list.
 """
 def is_keyword(lexeme):
-    return lexeme in keywords
+    return lexeme in keyword_set
 """
     This function determines the type of character provided.
     It classifies the character as either a letter, digit, dot ('.'), or other.
@@ -118,109 +149,604 @@ def fsm_process(lexeme, transition_table, start_state="q0", accepting_states=("q
     
     return current_state in accepting_states  # Return True if in accepting state
 
-# Lexer function that calls appropriate FSM based on the token
-def lexer(line):
-    tokens = []
-    current_lexeme = ''
-    current_state = "q0"
+# Compiled DFA
+"""
+    The lexer does not walk the transition tables above directly. At import time they are
+    compiled, together with the operator and separator rules, into one minimized DFA whose
+    states and character classes are plain integers:
+
+    - char_class_map maps a character ordinal to its character class (filled lazily for
+      characters outside ASCII), so a whole line is classified by a single str.translate.
+    - dfa_transitions is a flat list indexed by state * NUM_CHAR_CLASSES + char_class;
+      -1 means there is no transition and the current token ends.
+    - dfa_token_kinds gives the kind code of the token produced when a token ends in each state.
+
+    State 0 is the start state. Whitespace keeps the DFA in the start state. Comments are
+    not part of the DFA; scan() skips them when it sees '[' followed by '*'.
+"""
+
+# Character classes
+CLASS_LETTER = 0     # isalpha()
+CLASS_DIGIT = 1      # isdigit()
+CLASS_DOT = 2        # '.'
+CLASS_SPACE = 3      # isspace()
+CLASS_NEWLINE = 4    # '\n' (whitespace that also starts a new line)
+CLASS_SEPARATOR = 5  # ( ) ; : , { } $ @
+CLASS_OPERATOR = 6   # + - * / < > !
+CLASS_EQUALS = 7     # '=' (an operator, and the second half of <=, >=, ==, !=)
+CLASS_ALNUM = 8      # isalnum() but neither a letter nor a digit (e.g. '½')
+CLASS_LBRACKET = 9   # '[' (invalid on its own, starts a comment when followed by '*')
+CLASS_CONTINUATION = 10  # 2nd..4th byte of a UTF-8 character, never produced for str input
+CLASS_OTHER = 11     # everything else
+NUM_CHAR_CLASSES = 12
+
+# Character types used by the FSM transition tables, mapped to character classes
+table_char_classes = {"letter": CLASS_LETTER, "digit": CLASS_DIGIT, ".": CLASS_DOT}
+
+"""
+    This function returns the DFA character class of a single character.
+    The checks are made in the same order the lexer has always used them.
+"""
+def classify_char(char):
+    if char == "\n":
+        return CLASS_NEWLINE
+    elif char.isspace():
+        return CLASS_SPACE
+    elif is_separator(char):
+        return CLASS_SEPARATOR
+    elif char == "=":
+        return CLASS_EQUALS
+    elif is_operator_char(char):
+        return CLASS_OPERATOR
+    elif char == ".":
+        return CLASS_DOT
+    elif char.isalpha():
+        return CLASS_LETTER
+    elif char.isdigit():
+        return CLASS_DIGIT
+    elif char.isalnum():
+        return CLASS_ALNUM
+    elif char == "[":
+        return CLASS_LBRACKET
+    else:
+        return CLASS_OTHER
+
+# Translation table for str.translate: ordinal -> character class ordinal
+class CharClassMap(dict):
+    def __missing__(self, ordinal):
+        # Characters outside ASCII are classified the first time they are seen
+        char_class = classify_char(chr(ordinal))
+        self[ordinal] = char_class
+        return char_class
+
+char_class_map = CharClassMap((ordinal, classify_char(chr(ordinal))) for ordinal in range(128))
+
+# Translation table for bytes.translate over ASCII input: byte -> character class
+byte_class_table = bytes(classify_char(chr(ordinal)) for ordinal in range(128)) + bytes([CLASS_OTHER]) * 128
+
+"""
+    This function minimizes a DFA with Moore's partition refinement algorithm.
+    States start out grouped by the token type they produce (the start state is kept on its own)
+    and groups are split until every state in a group has the same transitions.
+
+    Returns the minimized (transitions, token_kinds) pair with the start state still numbered 0,
+    and state_map: the minimized state each original state was merged into.
+"""
+def minimize_dfa(transitions, token_kinds):
+    num_states = len(token_kinds)
+    groups = {}
+    group_of = [groups.setdefault((state == 0, token_kinds[state]), len(groups)) for state in range(num_states)]
+    while True:
+        signatures = {}
+        refined = []
+        for state in range(num_states):
+            row = transitions[state * NUM_CHAR_CLASSES:(state + 1) * NUM_CHAR_CLASSES]
+            signature = (group_of[state], tuple(group_of[target] if target >= 0 else -1 for target in row))
+            refined.append(signatures.setdefault(signature, len(signatures)))
+        if len(signatures) == len(groups):
+            break
+        groups = signatures
+        group_of = refined
+
+    # Number the groups in order of their first state so the start state stays 0
+    numbering = {}
+    for state in range(num_states):
+        numbering.setdefault(group_of[state], len(numbering))
+    minimized_transitions = [-1] * (len(numbering) * NUM_CHAR_CLASSES)
+    minimized_token_kinds = [None] * len(numbering)
+    for state in range(num_states):
+        new_state = numbering[group_of[state]]
+        minimized_token_kinds[new_state] = token_kinds[state]
+        for char_class in range(NUM_CHAR_CLASSES):
+            target = transitions[state * NUM_CHAR_CLASSES + char_class]
+            minimized_transitions[new_state * NUM_CHAR_CLASSES + char_class] = numbering[group_of[target]] if target >= 0 else -1
+    state_map = [numbering[group_of[state]] for state in range(num_states)]
+    return minimized_transitions, minimized_token_kinds, state_map
+
+"""
+    This function compiles the identifier and integer/float FSM tables, plus the operator
+    and separator rules of the lexer, into one minimized DFA.
+
+    Returns:
+    - transitions: flat list indexed by state * NUM_CHAR_CLASSES + char_class (-1 = no transition).
+    - token_kinds: the kind code of the token that ends in each state.
+    - state_names: a name for each state, made of the FSM states merged into it (e.g. "identifier.q1").
+"""
+def compile_dfa():
+    state_names = ["start"]
+    token_kinds = [None]
+
+    def add_state(name, token_kind):
+        state_names.append(name)
+        token_kinds.append(token_kind)
+        return len(state_names) - 1
+
+    # One DFA state for every FSM state except q0, which is merged into the start state
+    identifier_states = {}
+    for name in identifier_transition_table:
+        if name != "q0":
+            token_kind = KIND_IDENTIFIER if name == "q1" else KIND_INVALID
+            identifier_states[name] = add_state("identifier." + name, token_kind)
+    number_states = {}
+    number_token_kinds = {"q1": KIND_INTEGER, "q3": KIND_REAL}
+    for name in int_float_transition_table:
+        if name != "q0":
+            number_states[name] = add_state("number." + name, number_token_kinds.get(name, KIND_INVALID))
+    operator = add_state("operator", KIND_OPERATOR)
+    operator_equals = add_state("operator=", KIND_OPERATOR)
+    separator = add_state("separator", KIND_SEPARATOR)
+    invalid_char = add_state("invalid", KIND_INVALID)
+
+    transitions = [-1] * (len(state_names) * NUM_CHAR_CLASSES)
+
+    def add_transition(state, char_class, target):
+        transitions[state * NUM_CHAR_CLASSES + char_class] = target
+
+    for table, states in ((identifier_transition_table, identifier_states), (int_float_transition_table, number_states)):
+        for name, moves in table.items():
+            source = 0 if name == "q0" else states[name]
+            for char_type, target in moves.items():
+                add_transition(source, table_char_classes[char_type], states[target])
+
+    # An identifier runs over every alphanumeric character; anything the table
+    # does not accept (e.g. '½') makes the whole lexeme invalid
+    identifier_invalid = identifier_states["qInvalid"]
+    for state in identifier_states.values():
+        add_transition(state, CLASS_ALNUM, identifier_invalid)
+    for char_class in (CLASS_LETTER, CLASS_DIGIT, CLASS_ALNUM):
+        add_transition(identifier_invalid, char_class, identifier_invalid)
+
+    add_transition(0, CLASS_SPACE, 0)
+    add_transition(0, CLASS_NEWLINE, 0)
+    add_transition(0, CLASS_SEPARATOR, separator)
+    add_transition(0, CLASS_OPERATOR, operator)
+    add_transition(0, CLASS_EQUALS, operator)
+    add_transition(operator, CLASS_EQUALS, operator_equals)  # <=, >=, ==, !=
+    add_transition(0, CLASS_ALNUM, invalid_char)
+    add_transition(0, CLASS_LBRACKET, invalid_char)
+    add_transition(0, CLASS_OTHER, invalid_char)
+
+    # The continuation bytes of a UTF-8 character stay in whatever state its first byte reached
+    for state in range(len(state_names)):
+        add_transition(state, CLASS_CONTINUATION, state)
 
-    i = 0
-    while i < len(line):
-        ch = line[i]
+    transitions, token_kinds, state_map = minimize_dfa(transitions, token_kinds)
+    merged_names = [[] for _ in token_kinds]
+    for state, name in enumerate(state_names):
+        merged_names[state_map[state]].append(name)
+    return transitions, token_kinds, ["/".join(names) for names in merged_names]
+
+dfa_transitions, dfa_token_kinds, dfa_state_names = compile_dfa()
+
+# Size of the pieces a buffer is classified in; pieces always end after a newline
+SCAN_CHUNK_SIZE = 1 << 20
+
+"""
+    This function classifies buffer[start:end] for the DFA.
+
+    Returns:
+    - text: the piece as a str, used to slice out lexemes.
+    - codes: bytes holding one character class per buffer position.
+    - char_index: None when positions in the piece and in text are the same; otherwise
+      (UTF-8 input with non-ASCII characters) a list mapping each byte position to a text position.
+"""
+def classify_chunk(buffer, start, end):
+    chunk = buffer[start:end]
+    if isinstance(chunk, str):
+        return chunk, chunk.translate(char_class_map).encode("latin-1"), None
+    if chunk.isascii():
+        return chunk.decode("ascii"), chunk.translate(byte_class_table), None
 
-        if current_state == "q0":
-            if ch.isspace():
+    text = chunk.decode("utf-8", "surrogateescape")
+    codes = bytearray()
+    char_index = []
+    for index, (char, code) in enumerate(zip(text, text.translate(char_class_map))):
+        width = len(char.encode("utf-8", "surrogateescape"))
+        codes.append(ord(code))
+        codes.extend(bytes([CLASS_CONTINUATION]) * (width - 1))
+        char_index.extend([index] * width)
+    char_index.append(len(text))
+    return text, bytes(codes), char_index
+
+"""
+    This function scans a whole buffer in one pass with the compiled DFA.
+
+    Parameters:
+    - buffer: a str, or any bytes-like object with find() (bytes, mmap.mmap) holding UTF-8 text.
+    - comments: when True, [* ... *] comments are skipped; an unterminated comment runs to the end.
+    - start, line, line_start: where to start scanning, its line number and the offset of the start
+      of that line. start must be outside any comment and token (e.g. the start of a token).
+    - chunk_size: characters classified at a time; small chunks suit scans that stop early.
+
+    Yields (kind, lexeme, offset, line, column) for every token, where kind is a KIND_* code.
+    The offset is the position in the buffer (a byte offset for bytes input); line and column
+    start at 1.
+"""
+def scan(buffer, comments=True, start=0, line=1, line_start=0, chunk_size=SCAN_CHUNK_SIZE):
+    text_mode = isinstance(buffer, str)
+    newline, comment_close, star = ("\n", "*]", "*") if text_mode else (b"\n", b"*]", b"*")
+    transitions = dfa_transitions
+    token_kinds = dfa_token_kinds
+    keyword_lookup = keyword_set
+    width = NUM_CHAR_CLASSES
+
+    size = len(buffer)
+    pos = start
+    while pos < size:
+        end = buffer.find(newline, pos + chunk_size)
+        end = size if end < 0 else end + 1
+        text, codes, char_index = classify_chunk(buffer, pos, end)
+        length = end - pos
+
+        i = 0  # position inside the chunk
+        while i < length:
+            code = codes[i]
+            state = transitions[code]  # move out of the start state
+            if state == 0:  # whitespace
                 i += 1
+                if code == CLASS_NEWLINE:
+                    line += 1
+                    line_start = pos + i
                 continue
-            elif is_separator(ch):
-                tokens.append(Token(TokenType.SEPARATOR, ch))
-                i += 1
-            elif is_operator_char(ch):
-                # Handle operators
-                current_lexeme = ch
-                if i + 1 < len(line) and line[i + 1] == '=':  # Check for multi-character operator like <= or >=
-                    current_lexeme += line[i + 1]
-                    i += 2
-                else:
-                    i += 1
-                tokens.append(Token(TokenType.OPERATOR, current_lexeme))
-            elif ch.isalpha():  # Start of identifier or keyword
-                current_lexeme = ch
-                current_state = "identifier"
-                i += 1
-            elif ch.isdigit():  # Start of integer or float
-                current_lexeme = ch
-                current_state = "number"
-                i += 1
-            else:
-                tokens.append(Token(TokenType.INVALID, ch))
-                i += 1
-        elif current_state == "identifier":
-            if ch.isalnum():
-                current_lexeme += ch
-                i += 1
-            else:
-                # Check if it's a keyword or identifier
-                if is_keyword(current_lexeme):
-                    tokens.append(Token(TokenType.KEYWORD, current_lexeme))
-                else:
-                    if fsm_process(current_lexeme, identifier_transition_table):
-                        tokens.append(Token(TokenType.IDENTIFIER, current_lexeme))
-                    else:
-                        tokens.append(Token(TokenType.INVALID, current_lexeme))
-                current_lexeme = ''
-                current_state = "q0"
-        elif current_state == "number":
-            if ch.isdigit():
-                current_lexeme += ch
-                i += 1
-            elif ch == '.':
-                current_lexeme += ch
-                current_state = "float"
-                i += 1
-            else:
-                # Process as an integer
-                if fsm_process(current_lexeme, int_float_transition_table):
-                    tokens.append(Token(TokenType.INTEGER, current_lexeme))
-                else:
-                    tokens.append(Token(TokenType.INVALID, current_lexeme))
-                current_lexeme = ''
-                current_state = "q0"
-        elif current_state == "float":
-            if ch.isdigit():
-                current_lexeme += ch
+            if code == CLASS_LBRACKET and comments and buffer[pos + i + 1:pos + i + 2] == star:
+                # Skip the comment, counting the lines it spans
+                close = buffer.find(comment_close, pos + i + 2)
+                stop = size if close < 0 else close + 2
+                newline_at = buffer.find(newline, pos + i, stop)
+                while newline_at >= 0:
+                    line += 1
+                    line_start = newline_at + 1
+                    newline_at = buffer.find(newline, newline_at + 1, stop)
+                i = stop - pos
+                continue
+            start = i
+            i += 1
+            while i < length:
+                next_state = transitions[state * width + codes[i]]
+                if next_state < 0:
+                    break
+                state = next_state
                 i += 1
+
+            if char_index is None:
+                lexeme = text[start:i]
             else:
-                # Process as a float
-                if fsm_process(current_lexeme, int_float_transition_table):
-                    tokens.append(Token(TokenType.REAL, current_lexeme))
-                else:
-                    tokens.append(Token(TokenType.INVALID, current_lexeme))
-                current_lexeme = ''
-                current_state = "q0"
-
-    # Handle any remaining lexeme after the loop
-    if current_lexeme:
-        if current_state == "identifier":
-            if is_keyword(current_lexeme):
-                tokens.append(Token(TokenType.KEYWORD, current_lexeme))
-            else:
-                if fsm_process(current_lexeme, identifier_transition_table):
-                    tokens.append(Token(TokenType.IDENTIFIER, current_lexeme))
-                else:
-                    tokens.append(Token(TokenType.INVALID, current_lexeme))
-        elif current_state == "number":
-            if fsm_process(current_lexeme, int_float_transition_table):
-                tokens.append(Token(TokenType.INTEGER, current_lexeme))
+                lexeme = text[char_index[start]:char_index[i]]
+            kind = token_kinds[state]
+            if kind == KIND_IDENTIFIER and lexeme in keyword_lookup:
+                kind = KIND_KEYWORD
+            yield kind, lexeme, pos + start, line, pos + start - line_start + 1
+
+        pos += i  # past the chunk, or past a comment that ran beyond it
+
+# Lexer function that runs the compiled DFA over a line
+"""
+    Every character of the line is classified once and fed through the compiled DFA
+    (see scan). A line is lexed on its own, so comment brackets are returned as tokens.
+    With a LineMemo, a line lexed before is taken from it instead.
+"""
+def lexer(line, memo=None):
+    if memo is not None: # Tokens of a line seen before come from the memo
+        return [Token(kind_names[kind], lexeme) for kind, lexeme, offset, line_number, column in memo.tokens(line)]
+    return [Token(kind_names[kind], lexeme) for kind, lexeme, offset, line_number, column in scan(line, comments=False)]
+
+# Memo of lexed lines
+DEFAULT_MEMO_LINES = 1 << 16 # Most lines a LineMemo keeps
+DEFAULT_MEMO_BYTES = 16 << 20 # About the most memory a LineMemo's entries take
+MAX_MEMO_LINE_LENGTH = 256 # Longer lines are lexed without being remembered (they rarely repeat)
+MEMO_TOKEN_BYTES = 128 # About the size of one token tuple and its lexeme object (the characters are counted apart)
+
+"""
+    A LineMemo remembers the tokens of the lines it has lexed, so that a line seen again (generated
+    code repeats many: put (x);, declarations, loop bodies) is not run through the DFA again. It is
+    opt-in: pass one to lexer, scan_memoized or iter_file.
+
+    An entry maps the text of a line to the immutable tuple of records scan yields for the line
+    on its own (offsets and columns within the line, line 1), as lexer lexes it. Entries are
+    evicted least recently used first once there are more than max_lines of them or they take
+    more than about max_bytes. hits and misses count the lines looked up, and hit_tokens and
+    missed_tokens the tokens on them (a memo that only hits short lines saves little); stats()
+    sums them up.
+"""
+class LineMemo:
+    def __init__(self, max_lines=DEFAULT_MEMO_LINES, max_bytes=DEFAULT_MEMO_BYTES):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # line -> (tokens, size in bytes), least recently used first
+        self.size = 0 # Bytes taken by the entries (estimated)
+        self.hits = 0
+        self.misses = 0
+        self.hit_tokens = 0
+        self.missed_tokens = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def tokens(self, line): # (kind, lexeme, offset, 1, column) records of a line (str or bytes)
+        entry = self.entries.get(line)
+        if entry is not None:
+            self.hits += 1
+            self.hit_tokens += len(entry[0])
+            self.entries.move_to_end(line)
+            return entry[0]
+        tokens = tuple(scan(line, comments=False))
+        self.misses += 1
+        self.missed_tokens += len(tokens)
+        if len(line) <= MAX_MEMO_LINE_LENGTH:
+            self.add(line, tokens)
+        return tokens
+
+    def add(self, line, tokens): # Remember the tokens of a line, evicting old entries to stay within bounds
+        size = sys.getsizeof(line) + sys.getsizeof(tokens) + len(tokens) * MEMO_TOKEN_BYTES + len(line)
+        if size > self.max_bytes or self.max_lines < 1:
+            return
+        self.entries[line] = (tokens, size)
+        self.size += size
+        while len(self.entries) > self.max_lines or self.size > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def clear(self): # Forget every entry (the counters are kept)
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self): # Counters and size, to judge whether the memo pays off on some input
+        lookups = self.hits + self.misses
+        tokens = self.hit_tokens + self.missed_tokens
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "hit_tokens": self.hit_tokens, "missed_tokens": self.missed_tokens,
+                "token_hit_rate": self.hit_tokens / tokens if tokens else 0.0,
+                "evictions": self.evictions, "lines": len(self.entries), "bytes": self.size}
+
+"""
+    This function yields the same records as scan(buffer), but takes each line that has no part in
+    a comment from memo (a LineMemo) instead of lexing it. Lines that a comment starts, ends or
+    runs through are scanned together with scan, as are lines longer than MAX_MEMO_LINE_LENGTH.
+"""
+def scan_memoized(buffer, memo):
+    text_mode = isinstance(buffer, str)
+    newline, comment_open, comment_close = ("\n", "[*", "*]") if text_mode else (b"\n", b"[*", b"*]")
+    tokens_of = memo.tokens
+    size = len(buffer)
+    comment = buffer.find(comment_open) # Start of the next comment, -1 when there is none
+    line = 1
+    start = 0 # Start of the current line
+    while start < size:
+        end = buffer.find(newline, start)
+        end = size if end < 0 else end + 1
+        if (comment < 0 or comment >= end) and end - start <= MAX_MEMO_LINE_LENGTH:
+            for kind, lexeme, offset, _, column in tokens_of(buffer[start:end]):
+                yield kind, lexeme, start + offset, line, column
+            line += 1
+            start = end
+            continue
+
+        # Scan the lines up to the end of the comments that touch them (or the long line) as one piece
+        while 0 <= comment < end:
+            close = buffer.find(comment_close, comment + 2)
+            if close < 0: # The comment runs to the end of the buffer
+                end = size
+                break
+            if close + 2 > end:
+                line_end = buffer.find(newline, close + 2)
+                end = size if line_end < 0 else line_end + 1
+            comment = buffer.find(comment_open, close + 2)
+        piece = buffer[start:end]
+        for kind, lexeme, offset, token_line, column in scan(piece, True, 0, line):
+            yield kind, lexeme, start + offset, token_line, column
+        line += piece.count(newline)
+        start = end
+
+"""
+    This function lexes a whole buffer (str, bytes or mmap) in one pass, skipping comments.
+    It yields Token objects that carry their offset, line and column.
+"""
+def lex_buffer(buffer):
+    for kind, lexeme, offset, line, column in scan(buffer):
+        yield Token(kind_names[kind], lexeme, offset, line, column)
+
+# Token stream stored as parallel arrays
+"""
+    A TokenStream holds tokens column by column instead of as Token objects:
+
+    - kinds: KIND_* code of each token (1 byte).
+    - offsets, lengths, lines, columns: where the token is in the source.
+    - symbols: index into strings for interned lexemes, -1 otherwise.
+
+    Keywords, identifiers, operators and separators are interned, so every copy of a name
+    shares one string. Other lexemes (numbers, invalid input) are not stored at all; they
+    are sliced from the source buffer when asked for, so the buffer must stay open while the
+    stream is used. A stream built without a source interns every lexeme.
+"""
+class TokenStream:
+    # Kinds whose lexemes are interned even when a source buffer is available
+    INTERNED_KINDS = (KIND_KEYWORD, KIND_IDENTIFIER, KIND_OPERATOR, KIND_SEPARATOR)
+
+    def __init__(self, source=None):
+        self.source = source
+        self.kinds = array("B")
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.lines = array("I")
+        self.columns = array("I")
+        self.symbols = array("i")
+        self.strings = []  # interned lexemes, indexed by symbol
+        self.string_ids = {}  # interned lexeme -> symbol
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def intern(self, lexeme):
+        # Returns the symbol of the lexeme, adding it to the string table if it is new
+        symbol = self.string_ids.get(lexeme)
+        if symbol is None:
+            symbol = len(self.strings)
+            self.strings.append(lexeme)
+            self.string_ids[lexeme] = symbol
+        return symbol
+
+    def append(self, kind, lexeme, offset=0, line=0, column=0):
+        if self.source is None or kind in self.INTERNED_KINDS:
+            self.symbols.append(self.intern(lexeme))
+        else:
+            self.symbols.append(-1)
+        if isinstance(self.source, str) or lexeme.isascii():
+            length = len(lexeme)
+        else:  # byte length of a UTF-8 lexeme
+            length = len(lexeme.encode("utf-8", "surrogateescape"))
+        self.kinds.append(kind)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.lines.append(line or 0)
+        self.columns.append(column or 0)
+
+    def capture(self, records):
+        # Yields (kind, lexeme, offset, line, column) records unchanged, appending each to the stream
+        # (the same as append, with the per-token work kept to a minimum)
+        if self.source is None:
+            append = self.append
+            for record in records:
+                append(*record)
+                yield record
+            return
+        interned = self.INTERNED_KINDS
+        string_ids = self.string_ids
+        text_mode = isinstance(self.source, str)
+        add_kind, add_offset, add_length = self.kinds.append, self.offsets.append, self.lengths.append
+        add_line, add_column, add_symbol = self.lines.append, self.columns.append, self.symbols.append
+        for record in records:
+            kind, lexeme, offset, line, column = record
+            if kind in interned:
+                symbol = string_ids.get(lexeme)
+                add_symbol(self.intern(lexeme) if symbol is None else symbol)
             else:
-                tokens.append(Token(TokenType.INVALID, current_lexeme))
-        elif current_state == "float":
-            if fsm_process(current_lexeme, int_float_transition_table):
-                tokens.append(Token(TokenType.REAL, current_lexeme))
+                add_symbol(-1)
+            if text_mode or lexeme.isascii():
+                add_length(len(lexeme))
             else:
-                tokens.append(Token(TokenType.INVALID, current_lexeme))
+                add_length(len(lexeme.encode("utf-8", "surrogateescape")))
+            add_kind(kind)
+            add_offset(offset)
+            add_line(line)
+            add_column(column)
+            yield record
+
+    def lexeme(self, index):
+        symbol = self.symbols[index]
+        if symbol >= 0:
+            return self.strings[symbol]
+        offset = self.offsets[index]
+        lexeme = self.source[offset:offset + self.lengths[index]]
+        if not isinstance(lexeme, str):
+            lexeme = lexeme.decode("utf-8", "surrogateescape")
+        return lexeme
+
+    def token(self, index):
+        # Builds a Token object for one entry (positions are None when unknown)
+        return Token(kind_names[self.kinds[index]], self.lexeme(index), self.offsets[index],
+                     self.lines[index] or None, self.columns[index] or None)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self.token(index)
+
+    def records(self, start=0, stop=None):
+        # Yields (kind, lexeme, offset, line, column) records, the same shape scan() produces
+        kinds, offsets, lines, columns = self.kinds, self.offsets, self.lines, self.columns
+        for index in range(start, len(kinds) if stop is None else stop):
+            yield kinds[index], self.lexeme(index), offsets[index], lines[index], columns[index]
+
+    def close(self):
+        # Closes the source buffer when it is a memory map owned by the stream
+        if isinstance(self.source, mmap.mmap):
+            self.source.close()
 
-    return tokens
+    @classmethod
+    def from_buffer(cls, buffer):
+        # Lexes a whole buffer (see scan) straight into a new stream
+        stream = cls(buffer)
+        append = stream.append
+        for kind, lexeme, offset, line, column in scan(buffer):
+            append(kind, lexeme, offset, line, column)
+        return stream
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        # Packs Token objects (e.g. from lexer()) into a new stream
+        stream = cls()
+        for token in tokens:
+            stream.append(token.kind, token.lexeme, token.offset or 0, token.line, token.column)
+        return stream
+
+"""
+    This function memory-maps an open binary file for reading.
+    Empty files cannot be mapped, so b"" is returned for them.
+"""
+def map_file(file):
+    try:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:  # empty files cannot be mapped
+        return b""
+
+"""
+    This function memory-maps an open binary file and returns its TokenStream.
+    The stream keeps the memory map open; call close() on it when done.
+"""
+def lex_file(file):
+    return TokenStream.from_buffer(map_file(file))
+
+"""
+    This function is the generator version of lex_file: it memory-maps an open binary file and
+    yields (kind, lexeme, offset, line, column) records as they are scanned, so nothing but the
+    current token is held in memory. The memory map is closed when the generator finishes.
+    With a LineMemo, repeated lines are taken from it (see scan_memoized).
+"""
+def iter_file(file, memo=None):
+    buffer = map_file(file)
+    if not buffer:
+        return
+    with buffer:
+        yield from scan(buffer) if memo is None else scan_memoized(buffer, memo)
+
+"""
+    This function turns any supported token source into an iterator of
+    (kind, lexeme, offset, line, column) records:
+    - a TokenStream (its records),
+    - an iterable of records, such as scan() or iter_file(),
+    - an iterable of Token objects, such as lexer() or lex_buffer().
+"""
+def token_records(tokens):
+    if isinstance(tokens, TokenStream):
+        return tokens.records()
+    iterator = iter(tokens)
+    for first in iterator:
+        if isinstance(first, Token):
+            return ((token.kind, token.lexeme, token.offset, token.line, token.column)
+                    for token in chain((first,), iterator))
+        return chain((first,), iterator)
+    return iterator
 
 # Main function to handle file I/O
 """
@@ -228,8 +754,9 @@ def lexer(line):
     and writes the tokenized output to an output file.
     
     The output file is created by appending '_output.txt' to the input file's base name.
+    memo is an optional LineMemo for the lines.
 """
-def main():
+def main(memo=None):
     input_filename = input("Enter the input file name: ")
     output_filename = input_filename.rsplit('.', 1)[0] + '_output.txt'
 
@@ -240,7 +767,7 @@ def main():
             output_file.write("-" * 25 + "\n")
             
             for line in file:
-                tokens = lexer(line)
+                tokens = lexer(line, memo)
                 for token in tokens:
                     output_file.write(f"{token}\n")
         print(f"Output file '{output_filename}' created successfully.")
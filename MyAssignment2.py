@@ -7,73 +7,273 @@ according to a specified grammar (Rat24F) while handling errors and generating d
 """
 
 import Assignment1 as lexical
-import re
+import analysis_cache
+from collections import deque
+import gzip
+from itertools import islice
+import rat24f_grammar
+
+# Token kind codes the parser compares against
+KEYWORD = lexical.KIND_KEYWORD
+IDENTIFIER = lexical.KIND_IDENTIFIER
+OPERATOR = lexical.KIND_OPERATOR
+INTEGER = lexical.KIND_INTEGER
+REAL = lexical.KIND_REAL
+SEPARATOR = lexical.KIND_SEPARATOR
+kind_names = lexical.kind_names
+
+# Lexemes the parser tests tokens against
+QUALIFIERS = frozenset(["integer", "real", "boolean"])
+RELOPS = frozenset(["==", "!=", ">", "<", "<=", ">="])
+
+# Number of tokens pulled from the token source at a time
+LOOKAHEAD_SIZE = 64
+
+# Trace levels
+TRACE_OFF = 0 # No trace at all: only pass/fail and errors
+TRACE_PRODUCTIONS = 1 # Production lines only
+TRACE_FULL = 2 # Productions and every matched token
+
+# Number of trace lines collected before they are written out
+TRACE_BUFFER_LINES = 8192
+
+# Error recovery: tokens the parser can resume at after a syntax error
+SYNC_TOKENS = (";", "}", "fi", "@")
+
+def sync_set(*nonterminals, extra=SYNC_TOKENS): # FOLLOW sets of the nonterminals (plus extra) as lexemes and kind codes
+    grammar = rat24f_grammar.grammar
+    keys = set(extra)
+    for nonterminal in nonterminals:
+        keys.update(grammar.lookahead_key(symbol) for symbol in grammar.follow[nonterminal])
+    return frozenset(keys)
+
+STATEMENT_SYNC = sync_set("<Statement>")
+DECLARATION_SYNC = sync_set("<Declaration>")
+PARAMETER_SYNC = sync_set("<Parameter>")
+FUNCTION_SYNC = sync_set("<Function>", extra=())
+PROGRAM_SYNC = frozenset(["@"])
+
+# Number of errors after which a recovering parse gives up
+MAX_ERRORS = 100
+
+class ParseError: # A syntax error and the position of the token it was found at
+    __slots__ = ("message", "line", "column")
+
+    def __init__(self, message, line=None, column=None):
+        self.message = message
+        self.line = line
+        self.column = column
+
+    def __str__(self):
+        if self.line is None:
+            return self.message
+        return f"line {self.line}, column {self.column}: {self.message}"
+
+class ParseAborted(Exception): # Stops a recovering parse (end of input or too many errors)
+    pass
+
+class TraceSink: # Batches trace lines and writes them to a file in large blocks
+    def __init__(self, output_file, buffer_lines=TRACE_BUFFER_LINES):
+        self.output_file = output_file
+        self.buffer_lines = buffer_lines
+        self.lines = []
+
+    def write(self, line): # Add one line (without its newline) to the batch
+        self.lines.append(line)
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def write_lines(self, lines): # Add several lines (e.g. a trace produced elsewhere) to the batch
+        self.lines.extend(lines)
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self): # Write out the lines collected so far
+        if self.lines:
+            self.output_file.write('\n'.join(self.lines) + '\n')
+            self.lines.clear()
+
+    def close(self): # Flush and close the underlying file
+        self.flush()
+        self.output_file.close()
+
+class TraceBuffer(TraceSink): # Keeps the trace lines in memory instead of writing them to a file
+    def __init__(self):
+        super().__init__(None)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def text(self): # The trace as the text a trace file would hold
+        return "".join(line + "\n" for line in self.lines)
+
+    def clear(self): # Empty the buffer so that it can take another trace
+        self.lines.clear()
+
+def open_trace_file(filename, compress=False): # Open a trace file for writing, gzip-compressed if asked
+    if compress:
+        return gzip.open(filename, 'wt', encoding='utf-8')
+    return open(filename, 'w', encoding='utf-8', buffering=1 << 20)
+
+def open_trace(filename, compress=False): # Open a trace file behind a TraceSink
+    return TraceSink(open_trace_file(filename, compress))
 
 class Parser: 
-    def __init__(self, tokens, output_file): # Constructor
-        self.tokens = tokens # List of tokens
+    def __init__(self, tokens, output_file=None, trace=TRACE_FULL, recover=False, max_errors=MAX_ERRORS): # Constructor
+        # With recover set, syntax errors are collected and parsing resumes at a sync token;
+        # otherwise the first error is raised. Either way, errors holds the ParseErrors found.
+        self.recover = recover
+        self.max_errors = max_errors
+        self.lookahead = deque() # Current token first; consumed tokens are dropped
+        self.reset(tokens, output_file, trace)
+
+    def reset(self, tokens, output_file=None, trace=TRACE_FULL):
+        # Start over on new tokens, so that one parser can parse any number of inputs.
+        # tokens can be a TokenStream, a list of Token objects or any iterator of token records
+        # (e.g. the generator from lexical.iter_file); it is read lazily, a few tokens ahead
+        self.token_source = lexical.token_records(tokens)
+        self.lookahead.clear()
+        self.lookahead.extend(islice(self.token_source, LOOKAHEAD_SIZE))
+        if not self.lookahead:
+            raise SyntaxError("No tokens to parse")
         self.current_index = 0
-        self.current_token = self.tokens[self.current_index]
+        self.at_end = False # Set once the last token has been consumed
+        self.current = self.lookahead[0] # Record of the current token: (kind, lexeme, offset, line, column)
+        self.kind = self.current[0] # Kind code of the current token
+        self.lexeme = self.current[1] # Lexeme of the current token
+        # output_file is a TraceSink or any file; no trace is written without one
+        if output_file is not None and not isinstance(output_file, TraceSink):
+            output_file = TraceSink(output_file)
         self.output_file = output_file
+        self.trace = trace if output_file is not None else TRACE_OFF
+        self.trace_tokens = self.trace >= TRACE_FULL
+        if not self.trace: # Productions cost a no-op call and nothing is formatted
+            self.write_output = self.skip_output
+        else:
+            self.__dict__.pop("write_output", None) # Back to the class's write_output after a reset
+        self.errors = []
+        self.error_index = -1 # Index of the token the last error was reported at
 
     def write_output(self, message): # Write output to the file
-        self.output_file.write(message + '\n')
+        self.output_file.write(message)
+
+    def skip_output(self, message): # Used as write_output when tracing is off
+        pass
 
     def advance(self): # Move to the next token
         self.current_index += 1 # Increment the index
-        if self.current_index < len(self.tokens):  # Check if the index is within the bounds
-            self.current_token = self.tokens[self.current_index]
-
-    def match(self, expected_type): # Match the current token with the expected token
-        if self.current_token.token_type == expected_type:
-            self.write_output(f"Token: {str(self.current_token.token_type):<15} Lexeme: {str(self.current_token.lexeme):<20}")
+        lookahead = self.lookahead
+        if len(lookahead) == 1: # Refill the buffer from the token source
+            lookahead.extend(islice(self.token_source, LOOKAHEAD_SIZE))
+        if len(lookahead) > 1:
+            lookahead.popleft()
+            self.current = lookahead[0]
+            self.kind = self.current[0]
+            self.lexeme = self.current[1]
+        else:  # At the end of the input the last token stays current, but cannot be matched again
+            self.at_end = True
+
+    def peek(self, distance=1): # Record of a token further ahead, or None past the end of the input
+        lookahead = self.lookahead
+        if distance >= len(lookahead):
+            lookahead.extend(islice(self.token_source, distance - len(lookahead) + LOOKAHEAD_SIZE))
+        if distance < len(lookahead):
+            return lookahead[distance]
+        return None
+
+    def match(self, expected_kind): # Match the current token with the expected token
+        if self.kind == expected_kind and not self.at_end:
+            if self.trace_tokens:
+                self.write_output(f"Token: {kind_names[self.kind]:<15} Lexeme: {self.lexeme:<20}")
             self.advance()
+        elif self.at_end: # Raise an error if the input ran out
+            raise self.error(f"Unexpected end of input, expected {kind_names[expected_kind]}")
         else: # Raise an error if the token types do not match
-            raise SyntaxError(f"Unexpected token {self.current_token.token_type}, expected {expected_type}, lexeme: {self.current_token.lexeme}")
+            raise self.error(f"Unexpected token {kind_names[self.kind]}, expected {kind_names[expected_kind]}, lexeme: {self.lexeme}")
+
+    def error(self, message): # Record a syntax error at the current token and return the exception to raise
+        if self.current_index != self.error_index: # Only the first error at a token is reported
+            self.errors.append(ParseError(message, self.current[3], self.current[4]))
+            self.error_index = self.current_index
+        return SyntaxError(message)
+
+    def recovering(self, parse, sync, consume=None, repeat=False):
+        # Run parse(); in recovery mode a syntax error skips tokens up to one in sync (a lexeme or kind
+        # code), which is consumed if it is consume. repeat is set when the caller loops on parse, so a
+        # call that failed without consuming anything also skips the offending token.
+        if not self.recover:
+            return parse()
+        start_index = self.current_index
+        try:
+            parse()
+        except SyntaxError:
+            if self.at_end or len(self.errors) >= self.max_errors:
+                raise ParseAborted()
+            if repeat and self.current_index == start_index:
+                self.advance()
+            while not self.at_end and self.lexeme not in sync and self.kind not in sync:
+                self.advance()
+            if self.lexeme == consume and not self.at_end:
+                self.advance()
 
     def parse(self): # Start parsing the input program
-        self.rat24f()
+        try:
+            self.rat24f()
+        except SyntaxError:
+            if not self.recover:
+                raise
+        except ParseAborted: # Recovery ran out of input or reached max_errors
+            pass
+        finally: # Write out the buffered trace, also when parsing fails
+            if self.output_file is not None:
+                self.output_file.flush()
 
     def rat24f(self): # Define the Rat24F grammar
         self.write_output("\t<Rat24F> -> <Opt Function Definitions> @ <Opt Declaration List> <Statement List> @")
         self.opt_function_definitions()
-        self.match("separator")  # Match '@'
+        self.recovering(self.match_end_marker, PROGRAM_SYNC, "@")  # Match '@'
         self.opt_declaration_list()
         self.statement_list()
-        self.match("separator")  # Match '@'
+        self.recovering(self.match_end_marker, PROGRAM_SYNC, "@")  # Match '@'
+
+    def match_end_marker(self): # Match '@'
+        self.match(SEPARATOR)
 
     def opt_function_definitions(self):
-        if self.current_token.lexeme == "function":
+        if self.lexeme == "function":
             self.write_output("\t<Opt Function Definitions> -> <Function Definitions> | ε")
             self.function_definitions()
 
     def function_definitions(self):
         self.write_output("\t<Function Definitions> -> <Function> | <Function> <Function Definitions>")
-        self.function()
-        while self.current_token.lexeme == "function":
-            self.function()
+        self.recovering(self.function, FUNCTION_SYNC)
+        while self.lexeme == "function":
+            self.recovering(self.function, FUNCTION_SYNC)
 
     def function(self):
         self.write_output("\t<Function> -> function <Identifier> ( <Opt Parameter List> ) <Opt Declaration List> <Body>")
-        self.match("keyword")  # Match 'function'
-        self.match("identifier")
-        self.match("separator")  # Match '('
+        self.match(KEYWORD)  # Match 'function'
+        self.match(IDENTIFIER)
+        self.match(SEPARATOR)  # Match '('
         self.opt_parameter_list()
-        self.match("separator")  # Match ')'
+        self.match(SEPARATOR)  # Match ')'
         self.opt_declaration_list()
         self.body()
 
     def opt_parameter_list(self): # Optional parameter list
-        if self.current_token.token_type == "identifier":
+        if self.kind == IDENTIFIER:
             self.write_output("\t<Opt Parameter List> -> <Parameter List> | ε")
             self.parameter_list()
         
     def parameter_list(self): # Parameter list
         self.write_output("\t<Parameter List> -> <Parameter> | <Parameter>, <Parameter List>")
-        self.parameter()
-        while self.current_token.lexeme != ")": # Continue parsing parameters until the closing parenthesis
-            self.match("separator")  # Match ','
-            self.parameter()
+        self.recovering(self.parameter, PARAMETER_SYNC)
+        while self.lexeme != ")": # Continue parsing parameters until the closing parenthesis
+            self.match(SEPARATOR)  # Match ','
+            self.recovering(self.parameter, PARAMETER_SYNC, repeat=True)
 
     def parameter(self): # Parameter
         self.write_output("\t<Parameter> -> <IDs> <Qualifier>")
@@ -81,31 +281,34 @@ class Parser:
         self.qualifier()
 
     def qualifier(self): # Qualifier
-        if self.current_token.lexeme in ["integer", "real", "boolean"]: # Check if the token is a qualifier
-            self.write_output(f"\t<Qualifier> -> {self.current_token.lexeme}")
-            self.match("keyword")
+        if self.lexeme in QUALIFIERS: # Check if the token is a qualifier
+            if self.trace:
+                self.write_output(f"\t<Qualifier> -> {self.lexeme}")
+            self.match(KEYWORD)
         else:
-            raise SyntaxError("Expected a qualifier, but got: " + str(self.current_token.lexeme))
+            raise self.error("Expected a qualifier, but got: " + self.lexeme)
 
     def ids(self): # IDs
         self.write_output("\t<IDs> -> <Identifier> | <Identifier>, <IDs>")
-        self.match("identifier")
-        while self.current_token.lexeme == ",": # Continue parsing IDs until there are no more commas
-            self.match("separator")
-            self.match("identifier")
+        self.match(IDENTIFIER)
+        while self.lexeme == ",": # Continue parsing IDs until there are no more commas
+            self.match(SEPARATOR)
+            self.match(IDENTIFIER)
 
     def opt_declaration_list(self): # Optional declaration list
-        if self.current_token.token_type == "keyword" and self.current_token.lexeme in ["integer", "real", "boolean"]:
+        if self.kind == KEYWORD and self.lexeme in QUALIFIERS:
             self.write_output("\t<Opt Declaration List> -> <Declaration List> | ε")
             self.declaration_list()
 
     def declaration_list(self): # Declaration list
         self.write_output("\t<Declaration List> -> <Declaration>; | <Declaration>;<Declaration List>")
+        self.recovering(self.terminated_declaration, DECLARATION_SYNC, ";")
+        while self.kind == KEYWORD and self.lexeme in QUALIFIERS:
+            self.recovering(self.terminated_declaration, DECLARATION_SYNC, ";")
+
+    def terminated_declaration(self): # <Declaration> ;
         self.declaration()
-        self.match("separator")  # Match ';'
-        while self.current_token.token_type == "keyword" and self.current_token.lexeme in ["integer", "boolean", "real"]:
-            self.declaration()
-            self.match("separator")  # Match ';'
+        self.match(SEPARATOR)  # Match ';'
 
     def declaration(self): # Declaration
         self.write_output("\t<Declaration> -> <Qualifier> <IDs>")
@@ -114,89 +317,89 @@ class Parser:
 
     def body(self): # Body
         self.write_output("\t<Body> -> { <Statement List> }")
-        self.match("separator")  # Match '{'
+        self.match(SEPARATOR)  # Match '{'
         self.statement_list()  # Handle the list of statements inside the body
-        self.match("separator")  # Match '}'
+        self.match(SEPARATOR)  # Match '}'
 
     def statement_list(self): # Statement list
         self.write_output("\t<Statement List> -> <Statement> | <Statement> <Statement List>")
-        self.statement()
-        while self.current_token.token_type in ["identifier", "keyword"]:
-            self.statement()
+        self.recovering(self.statement, STATEMENT_SYNC, ";")
+        while self.kind in (IDENTIFIER, KEYWORD):
+            self.recovering(self.statement, STATEMENT_SYNC, ";", repeat=True)
 
     def statement(self): # Statement
-        if self.current_token.token_type == "identifier":
+        if self.kind == IDENTIFIER:
             self.write_output("\t<Statement> -> <Assign>")
             self.assign()
-        elif self.current_token.lexeme == "if":
+        elif self.lexeme == "if":
             self.write_output("\t<Statement> -> <If>")
             self.if_statement()
-        elif self.current_token.lexeme == "return":
+        elif self.lexeme == "return":
             self.write_output("\t<Statement> -> <Return>")
             self.return_statement()
-        elif self.current_token.lexeme == "put":
+        elif self.lexeme == "put":
             self.write_output("\t<Statement> -> <Print>")
             self.print_statement()
-        elif self.current_token.lexeme == "get":
+        elif self.lexeme == "get":
             self.write_output("\t<Statement> -> <Scan>")
             self.scan_statement()
-        elif self.current_token.lexeme == "while":
+        elif self.lexeme == "while":
             self.write_output("\t<Statement> -> <While>")
             self.while_statement()
-        elif self.current_token.token_type == "separator" and self.current_token.lexeme == "{":
+        elif self.kind == SEPARATOR and self.lexeme == "{":
             self.write_output("\t<Statement> -> <Compound>")
             self.compound_statement()
         else:
-            raise SyntaxError(f"Unexpected statement: {self.current_token.lexeme}")
+            raise self.error(f"Unexpected statement: {self.lexeme}")
 
     def if_statement(self): # If statement
         self.write_output("\t<If> -> if ( <Condition> ) <Statement> fi | if ( <Condition> ) <Statement> else <Statement> fi")
-        self.match("keyword")  # Match "if"
-        self.match("separator")  # Match '('
+        self.match(KEYWORD)  # Match "if"
+        self.match(SEPARATOR)  # Match '('
         self.condition()  # Handle condition expression
-        self.match("separator")  # Match ')'
-        self.statement()  # Handle the body of the if statement
-        if self.current_token.lexeme == "else":
-            self.match("keyword") # Match "else"
-            self.statement()  # Handle the else statement   
-        self.match("keyword")  # Match "fi"
+        self.match(SEPARATOR)  # Match ')'
+        self.recovering(self.statement, STATEMENT_SYNC, ";")  # Handle the body of the if statement
+        if self.lexeme == "else":
+            self.match(KEYWORD) # Match "else"
+            self.recovering(self.statement, STATEMENT_SYNC, ";")  # Handle the else statement   
+        self.match(KEYWORD)  # Match "fi"
 
     def return_statement(self): # Return statement
         self.write_output("\t<Return> -> return ; | return <Expression>;")
-        self.match("keyword")  # Match "return"
-        if self.current_token.lexeme != ";":
+        self.match(KEYWORD)  # Match "return"
+        if self.lexeme != ";":
             self.expression()  # Handle the expression in the return statement
-        self.match("separator")  # Match ';'
+        self.match(SEPARATOR)  # Match ';'
 
     def print_statement(self): # Print statement
         self.write_output("\t<Print> -> put (<Expression>);")
-        self.match("keyword")  # Match "print"
-        self.match("separator")
+        self.match(KEYWORD)  # Match "print"
+        self.match(SEPARATOR)
         self.expression()  # Handle the expression to print
-        self.match("separator")  # Match ')'
-        self.match("separator")  # Match ';'
+        self.match(SEPARATOR)  # Match ')'
+        self.match(SEPARATOR)  # Match ';'
 
     def scan_statement(self): # Scan statement
         self.write_output("\t<Scan> -> get ( <IDs> );")
-        self.match("keyword")  # Match "scan"
-        self.match("separator")  # Match '('
+        self.match(KEYWORD)  # Match "scan"
+        self.match(SEPARATOR)  # Match '('
         self.ids()  # Handle the IDs to scan
-        self.match("separator")  # Match ')'
-        self.match("separator")  # Match ';'
+        self.match(SEPARATOR)  # Match ')'
+        self.match(SEPARATOR)  # Match ';'
 
     def while_statement(self): # While statement
         self.write_output("\t<While> -> while ( <Condition> ) <Statement>")
-        self.match("keyword")  # Match 'while'
-        self.match("separator")  # Match '('
+        self.match(KEYWORD)  # Match 'while'
+        self.match(SEPARATOR)  # Match '('
         self.condition()  # Handle the condition (Expression Relop Expression)
-        self.match("separator")  # Match ')'
-        self.statement()  # Handle the body of the loop
+        self.match(SEPARATOR)  # Match ')'
+        self.recovering(self.statement, STATEMENT_SYNC, ";")  # Handle the body of the loop
 
     def compound_statement(self): # Compound statement
         self.write_output("\t<Compound> -> { <Statement List> }")
-        self.match("separator")  # Match '{'
+        self.match(SEPARATOR)  # Match '{'
         self.statement_list()  # Handle the list of statements inside the compound
-        self.match("separator")  # Match '}'
+        self.match(SEPARATOR)  # Match '}'
 
     def condition(self): # Condition
         self.write_output("\t<Condition> -> <Expression> <Relop> <Expression>")
@@ -206,10 +409,10 @@ class Parser:
 
     def assign(self): # Assignment
         self.write_output("\t<Assign> -> <Identifier> = <Expression>;")
-        self.match("identifier")
-        self.match("operator")  # Match '='
+        self.match(IDENTIFIER)
+        self.match(OPERATOR)  # Match '='
         self.expression()
-        self.match("separator")  # Match ';'
+        self.match(SEPARATOR)  # Match ';'
 
     def expression(self): # Expression
         self.write_output("\t<Expression> -> <Term> <Expression Prime>")
@@ -217,9 +420,10 @@ class Parser:
         self.expression_prime()  # Handle the remaining expression (e.g., + or -)
 
     def expression_prime(self): # Expression prime
-        if self.current_token.lexeme in ["+", "-"]:
-            self.write_output(f"\t<Expression Prime> -> {self.current_token.lexeme} <Term> <Expression Prime>")
-            self.match("operator") # Match '+' or '-'
+        if self.lexeme in ["+", "-"]:
+            if self.trace:
+                self.write_output(f"\t<Expression Prime> -> {self.lexeme} <Term> <Expression Prime>")
+            self.match(OPERATOR) # Match '+' or '-'
             self.term()
             self.expression_prime()
         else:
@@ -231,87 +435,217 @@ class Parser:
         self.term_prime()
 
     def term_prime(self): # Term prime
-        if self.current_token.lexeme in ["*", "/"]:
-            self.write_output(f"\t<Term Prime> -> {self.current_token.lexeme} <Factor> <Term Prime>")
-            self.match("operator") # Match '*' or '/'
+        if self.lexeme in ["*", "/"]:
+            if self.trace:
+                self.write_output(f"\t<Term Prime> -> {self.lexeme} <Factor> <Term Prime>")
+            self.match(OPERATOR) # Match '*' or '/'
             self.factor()
             self.term_prime()
         else:
             self.write_output("\t<Term Prime> -> ε")
 
     def factor(self): # Factor
-        if self.current_token.token_type == "identifier":
+        if self.kind == IDENTIFIER:
             self.write_output("\t<Factor> -> <Identifier>")
-            self.match("identifier")
+            self.match(IDENTIFIER)
             # Check if it's followed by '(' indicating a function call (R28: <Identifier> ( <IDs> ))
-            if self.current_token.lexeme == "(":
+            if self.lexeme == "(":
                 self.write_output("\t<Factor> -> <Identifier> ( <IDs> )")
-                self.match("separator")  # Match '('
+                self.match(SEPARATOR)  # Match '('
                 self.ids()  # Parse the function arguments (IDs)
-                self.match("separator")  # Match ')'
-        elif self.current_token.token_type == "integer":
+                self.match(SEPARATOR)  # Match ')'
+        elif self.kind == INTEGER:
             self.write_output("\t<Factor> -> <Integer>")
-            self.match("integer")
-        elif self.current_token.token_type == "real":  # Handle <Real>
+            self.match(INTEGER)
+        elif self.kind == REAL:  # Handle <Real>
             self.write_output("\t<Factor> -> <Real>")
-            self.match("real")
-        elif self.current_token.lexeme == "true" or self.current_token.lexeme == "false":  # Handle <Boolean>
+            self.match(REAL)
+        elif self.lexeme == "true" or self.lexeme == "false":  # Handle <Boolean>
             self.write_output("\t<Factor> -> <Boolean>")
-            self.match("keyword")
-        elif self.current_token.token_type == "separator" and self.current_token.lexeme == "(":  # Handle parentheses (R28: ( <Expression> ))
+            self.match(KEYWORD)
+        elif self.kind == SEPARATOR and self.lexeme == "(":  # Handle parentheses (R28: ( <Expression> ))
             self.write_output("\t<Factor> -> ( <Expression> )")
-            self.match("separator")  # Match '('
+            self.match(SEPARATOR)  # Match '('
             self.expression()  # Parse the expression inside parentheses
-            self.match("separator")  # Match ')'
+            self.match(SEPARATOR)  # Match ')'
         else:
-            raise SyntaxError("Invalid factor: " + str(self.current_token.lexeme))
+            raise self.error("Invalid factor: " + self.lexeme)
 
     def relop(self): # Relational operator
-        if self.current_token.lexeme in ["==", "!=", ">", "<", "<=", ">="]:
-            self.match("operator") # Match the relational operator
+        if self.lexeme in RELOPS:
+            self.match(OPERATOR) # Match the relational operator
         else:
-            raise SyntaxError(f"Unexpected token {self.current_token.lexeme}, expected a relational operator")
+            raise self.error(f"Unexpected token {self.lexeme}, expected a relational operator")
+
+# Parser methods that parse one nonterminal (or a part of one), e.g. for profiler.py
+NONTERMINAL_METHODS = (
+    "rat24f", "match_end_marker", "opt_function_definitions", "function_definitions", "function",
+    "opt_parameter_list", "parameter_list", "parameter", "qualifier", "ids", "opt_declaration_list",
+    "declaration_list", "terminated_declaration", "declaration", "body", "statement_list", "statement",
+    "if_statement", "return_statement", "print_statement", "scan_statement", "while_statement",
+    "compound_statement", "condition", "assign", "expression", "expression_prime", "term", "term_prime",
+    "factor", "relop",
+)
+
+def trace_filename(input_filename, compress=False): # Name of the trace file written for an input file
+    output_filename = input_filename.rsplit('.', 1)[0] + '_syntax_output.txt'
+    if compress:
+        output_filename += '.gz'
+    return output_filename
+
+def analyze_file(input_filename, output_filename=None, trace=TRACE_FULL, compress=False, recover=False, parser_class=Parser,
+                 cache=True, line_memo=None):
+    # Lex and parse one file, writing its trace to output_filename (nothing is written when it is None
+    # or tracing is off). Returns the list of ParseErrors, which is empty when the file parses;
+    # it holds at most one error unless recover is set. Errors reading the input are raised.
+    # cache is True for the default analysis_cache (unless RAT24F_NO_CACHE is set), False to
+    # analyze without a cache (in constant memory), or an AnalysisCache. line_memo is an optional
+    # lexical.LineMemo that repeated lines are lexed through.
+    if cache is True:
+        cache = analysis_cache.default_cache()
+    if cache:
+        return analyze_file_cached(input_filename, output_filename, trace, compress, recover, parser_class, cache,
+                                   line_memo)
+
+    with open(input_filename, 'rb') as file:
+
+        # Tokenize the (memory-mapped) file lazily while parsing; the lexer skips [* *] comments
+        tokens = lexical.iter_file(file, line_memo)
+        # No trace file is created when tracing is off
+        output_file = open_trace(output_filename, compress) if trace and output_filename is not None else None
+
+        # Reset the index and start parsing
+        try:
+            options = {"recover": True} if recover else {}
+            try:
+                parser = parser_class(tokens, output_file, trace, **options)
+            except SyntaxError as e: # Empty input
+                return [ParseError(str(e))]
+            try:
+                parser.parse()
+            except SyntaxError: # Already recorded in parser.errors
+                pass
+            return parser.errors
+        finally:
+            tokens.close()
+            if output_file is not None:
+                output_file.close()
+
+def analyze_file_cached(input_filename, output_filename, trace, compress, recover, parser_class, cache, line_memo=None):
+    # analyze_file through cache: a hit writes the stored trace without lexing or parsing. A miss
+    # stores the tokens in a TokenStream as the parser reads them and keeps a compressed copy of
+    # the trace, for the cache.
+    if output_filename is None:
+        trace = TRACE_OFF
+    with open(input_filename, 'rb') as file:
+        buffer = lexical.map_file(file)
+        try:
+            key = cache.key(buffer, (trace, recover, parser_class.__name__), parser_class)
+            cached = cache.get(key)
+            if cached is not None:
+                try:
+                    if trace:
+                        with open_trace_file(output_filename, compress) as output_file:
+                            cached.write_trace(output_file)
+                    return [ParseError(*error) for error in cached.errors]
+                except ValueError: # Damaged entry: analyze the file again, rewriting the trace
+                    pass
+
+            tokens = lexical.TokenStream(buffer)
+            records = tokens.capture(lexical.scan(buffer) if line_memo is None else lexical.scan_memoized(buffer, line_memo))
+            recorder = analysis_cache.TraceRecorder(open_trace_file(output_filename, compress) if trace else None,
+                                                    cache.max_entry_bytes)
+            output_file = TraceSink(recorder) if trace else None
+            try:
+                options = {"recover": True} if recover else {}
+                try:
+                    parser = parser_class(records, output_file, trace, **options)
+                    try:
+                        parser.parse()
+                    except SyntaxError: # Already recorded in parser.errors
+                        pass
+                    errors = parser.errors
+                    for _ in records: # Tokens after the end of the parse
+                        pass
+                except SyntaxError as e: # Empty input
+                    errors = [ParseError(str(e))]
+            finally:
+                if output_file is not None:
+                    output_file.close()
+            compressed_trace = recorder.compressed() if trace else None
+            if not trace or compressed_trace is not None:
+                cache.put(key, tokens, [(error.message, error.line, error.column) for error in errors], compressed_trace)
+            return errors
+        finally:
+            if not isinstance(buffer, bytes):
+                buffer.close()
+
+class AnalysisResult: # What analyze() found in one source
+    __slots__ = ("tokens", "errors", "trace")
+
+    def __init__(self, tokens, errors, trace):
+        self.tokens = tokens # TokenStream of the whole source, or None when tokens are not kept
+        self.errors = errors # List of ParseErrors, as analyze_file returns them
+        self.trace = trace # Trace text (what a trace file would hold), or None when tracing is off
+
+    @property
+    def passed(self):
+        return not self.errors
+
+"""
+    Analyzer for sources held in memory: analyze() lexes and parses a str or bytes source and
+    returns an AnalysisResult, without reading or writing any file (not even the analysis cache).
+    One Analyzer can analyze any number of sources. Its parser and trace buffer are reset for each
+    source instead of being built again, which matters when the sources are small; the parser
+    (e.g. a TreeParser with its tree) stays available as analyzer.parser until the next source.
+    Positions are in characters for str sources and in bytes for bytes sources.
+"""
+class Analyzer:
+    def __init__(self, trace=TRACE_FULL, recover=False, parser_class=Parser, tokens=False):
+        self.trace = trace
+        self.recover = recover
+        self.parser_class = parser_class
+        self.keep_tokens = tokens # Whether results hold the TokenStream of their source
+        self.trace_buffer = TraceBuffer() if trace else None
+        self.parser = None # Built for the first source that has tokens, then reset
+
+    def analyze(self, source):
+        stream = lexical.TokenStream(source) if self.keep_tokens else None
+        records = lexical.scan(source) if stream is None else stream.capture(lexical.scan(source))
+        trace_buffer = self.trace_buffer
+        if trace_buffer is not None:
+            trace_buffer.clear()
+        try:
+            if self.parser is None:
+                options = {"recover": True} if self.recover else {}
+                self.parser = self.parser_class(records, trace_buffer, self.trace, **options)
+            else:
+                self.parser.reset(records, trace_buffer, self.trace)
+            try:
+                self.parser.parse()
+            except SyntaxError: # Already recorded in parser.errors
+                pass
+            errors = self.parser.errors
+        except SyntaxError as e: # Empty input
+            errors = [ParseError(str(e))]
+        if stream is not None:
+            for _ in records: # Tokens after the end of the parse
+                pass
+        return AnalysisResult(stream, errors, trace_buffer.text() if trace_buffer is not None else None)
+
+def analyze(source, trace=TRACE_FULL, recover=False, parser_class=Parser, tokens=False):
+    # Lex and parse a source held in memory (str or bytes) and return an AnalysisResult.
+    # Use an Analyzer to analyze many sources.
+    return Analyzer(trace, recover, parser_class, tokens).analyze(source)
 
 #main function
-def main():
-    tokens = [] # List of tokens
+def main(trace=TRACE_FULL, compress=False, recover=False, cache=True, line_memo=None):
     input_filename = input("Enter the input file name: ")
-    output_filename = input_filename.rsplit('.', 1)[0] + '_syntax_output.txt'
+    output_filename = trace_filename(input_filename, compress)
 
     try:
-        # Open files with the correct encoding
-        with open(input_filename, 'r') as file, open(output_filename, 'w', encoding='utf-8') as output_file:
-
-            comment_buffer = ""
-            inside_comment = False
-            # Tokenize input file line by line
-            for line in file:
-
-                if inside_comment:
-                    comment_buffer += line  # Continue adding to the comment buffer
-                    if "*]" in line:  # End of multi-line comment
-                        line = comment_buffer
-                        inside_comment = False
-                        comment_buffer = ""  # Reset the comment buffer after processing
-                    continue  # Skip adding this line to the token list
-                
-                # Check if line starts a comment
-                if "[*" in line:
-                    inside_comment = True
-                    comment_buffer = line  # Start accumulating the comment
-                    if "*]" in line:  # If the comment is on one line
-                        inside_comment = False
-                        comment_buffer = ""  # Reset the comment buffer after processing
-                    continue  # Skip adding this line to the token list
-                # Remove comments and other unnecessary parts here
-                line = re.sub(r'\[\*\s*.*?\s*\*\]', '', line, flags=re.DOTALL)
-                line_tokens = lexical.lexer(line)
-                if line_tokens:
-                    tokens.extend(line_tokens)
-
-            # Reset the index and start parsing
-            parser = Parser(tokens, output_file)
-            parser.parse()
+        for error in analyze_file(input_filename, output_filename, trace, compress, recover, cache=cache, line_memo=line_memo):
+            print(f"Error: {error}")
 
     except Exception as e: # Catch any exceptions
         print(f"Error: {e}")
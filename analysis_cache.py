@@ -0,0 +1,295 @@
+"""Analysis Cache - Compilers CPSC 323
+Description: Content-addressed on-disk cache of analysis results. An entry is keyed by the
+SHA-256 of the file contents, the analyzer code (including the module of the parser class used)
+and the analysis options. It holds the token stream (in the token_file encoding) and the parse
+outcome (the errors and the trace), each compressed, so a hit skips lexing and parsing entirely;
+the tokens are only decoded when asked for. The cache directory is kept under a size limit by
+evicting the least recently used entries.
+
+The cache is used by MyAssignment2.analyze_file (and so by main and batch.py). A miss keeps the
+tokens and the compressed trace in memory until the entry is written, where an uncached analysis
+streams in constant memory. Set RAT24F_NO_CACHE=1 (or pass --no-cache to batch.py) to turn it
+off, and RAT24F_CACHE_DIR to move it.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+# Bump when the lexer or parser output changes in a way the source fingerprint cannot see
+ANALYZER_VERSION = "1"
+
+# Modules whose code determines every analysis result; the modules of the parser class used
+# (and of its base classes) are added to these
+ANALYZER_MODULES = ("Assignment1.py", "MyAssignment2.py", "rat24f_grammar.py", "token_file.py")
+
+# Entry file layout: MAGIC, metadata (JSON), tokens (token file, zlib), trace (zlib), each after its byte length
+MAGIC = b"R24C\x03"
+LENGTH = struct.Struct("<Q")
+ENTRY_SUFFIX = ".entry"
+
+COMPRESS_LEVEL = 1 # Tokens and traces compress well even at the fastest level
+TRACE_PIECE_BYTES = 1 << 16 # Compressed bytes decompressed at a time when a hit writes its trace
+DEFAULT_MAX_BYTES = 256 << 20 # Size limit of the cache directory
+MAX_ENTRY_FRACTION = 8 # Results larger than max_bytes / MAX_ENTRY_FRACTION are not cached
+EVICT_HEADROOM_FRACTION = 4 # Eviction frees max_bytes / EVICT_HEADROOM_FRACTION more than it must, so it runs rarely
+
+def parser_modules(parser_class): # Files of the modules defining parser_class and its base classes
+    paths = []
+    for cls in parser_class.__mro__:
+        path = getattr(sys.modules.get(cls.__module__), "__file__", None)
+        if path is not None and path not in paths:
+            paths.append(path)
+    return paths
+
+def analyzer_fingerprint(parser_class=None): # Digest of the analyzer version and code, part of every key
+    digest = hashlib.sha256(f"{ANALYZER_VERSION} {sys.byteorder}".encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    paths = [os.path.join(directory, name) for name in ANALYZER_MODULES]
+    if parser_class is not None:
+        paths += parser_modules(parser_class)
+    for path in dict.fromkeys(map(os.path.abspath, paths)): # Each file once, in order
+        try:
+            with open(path, "rb") as module_file:
+                digest.update(module_file.read())
+        except OSError:
+            digest.update(path.encode())
+    return digest.hexdigest()
+
+def default_directory(): # RAT24F_CACHE_DIR, or rat24f under the user's cache directory
+    directory = os.environ.get("RAT24F_CACHE_DIR")
+    if directory:
+        return directory
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "rat24f")
+
+def default_cache(): # The shared cache, or None when RAT24F_NO_CACHE is set
+    if os.environ.get("RAT24F_NO_CACHE", "") not in ("", "0"):
+        return None
+    return AnalysisCache()
+
+def compress_trace(text): # Trace text as stored in an entry
+    return zlib.compress(text.encode("utf-8", "surrogateescape"), COMPRESS_LEVEL)
+
+class CachedResult: # What a cache hit returns
+    def __init__(self, errors, compressed_tokens, compressed_trace):
+        self.errors = errors # List of (message, line, column)
+        self.compressed_tokens = compressed_tokens # zlib-compressed token file contents
+        self.compressed_trace = compressed_trace # zlib-compressed trace, None if the analysis had no trace
+
+    @property
+    def tokens(self):
+        # The stored tokens as a token_file.TokenFile (every lexeme interned, so the source is not
+        # needed). Raises ValueError for a damaged entry.
+        import token_file # Not at the top: token_file imports MyAssignment2, which imports this module
+        try:
+            data = zlib.decompress(self.compressed_tokens)
+        except zlib.error as e:
+            raise ValueError(f"Damaged tokens in cache entry: {e}") from None
+        return token_file.TokenFile(data)
+
+    @property
+    def trace(self): # Trace text, None if the analysis had no trace
+        if self.compressed_trace is None:
+            return None
+        return zlib.decompress(self.compressed_trace).decode("utf-8", "surrogateescape")
+
+    def write_trace(self, output_file):
+        # Write the trace to a text file, decompressing it a piece at a time. Raises ValueError
+        # for a damaged trace, possibly after writing part of it.
+        decompressor = zlib.decompressobj()
+        data = self.compressed_trace or b""
+        try:
+            for start in range(0, len(data), TRACE_PIECE_BYTES):
+                piece = decompressor.decompress(data[start:start + TRACE_PIECE_BYTES])
+                output_file.write(piece.decode("utf-8", "surrogateescape"))
+            output_file.write(decompressor.flush().decode("utf-8", "surrogateescape"))
+        except zlib.error as e:
+            raise ValueError(f"Damaged trace in cache entry: {e}") from None
+        if data and not decompressor.eof:
+            raise ValueError("Truncated trace in cache entry")
+
+class TraceRecorder:
+    # File-like object that passes the trace on to output_file (if any) and keeps a compressed
+    # copy for the cache, until the copy grows beyond limit bytes
+    def __init__(self, output_file, limit):
+        self.output_file = output_file
+        self.limit = limit
+        self.compressor = zlib.compressobj(COMPRESS_LEVEL)
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        if self.output_file is not None:
+            self.output_file.write(text)
+        if self.parts is not None:
+            part = self.compressor.compress(text.encode("utf-8", "surrogateescape"))
+            if part:
+                self.size += len(part)
+                if self.size > self.limit:
+                    self.parts = None
+                else:
+                    self.parts.append(part)
+
+    def close(self):
+        if self.output_file is not None:
+            self.output_file.close()
+
+    def compressed(self): # The recorded trace, compressed as compress_trace does, or None if it was too large
+        if self.parts is None:
+            return None
+        self.parts.append(self.compressor.flush())
+        data = b"".join(self.parts)
+        self.parts = [data]
+        return data if len(data) <= self.limit else None
+
+class AnalysisCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // MAX_ENTRY_FRACTION
+        self.fingerprints = {} # analyzer_fingerprint per parser class
+        self.size = None # Estimated bytes in the directory, None until it is scanned
+        self.written = 0 # Bytes written since the directory was last scanned
+
+    def fingerprint(self, parser_class=None):
+        if parser_class not in self.fingerprints:
+            self.fingerprints[parser_class] = analyzer_fingerprint(parser_class)
+        return self.fingerprints[parser_class]
+
+    def key(self, content, options=(), parser_class=None):
+        # Cache key of a source (bytes-like) analyzed with the given options (e.g. trace level) by
+        # parser_class, whose code is part of the key
+        digest = hashlib.sha256(self.fingerprint(parser_class).encode())
+        digest.update(json.dumps(list(options)).encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key): # The CachedResult stored under key, or None
+        path = self.path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                data = entry_file.read()
+            os.utime(path) # Mark as recently used
+        except OSError:
+            return None
+        try:
+            return self.decode(data)
+        except (ValueError, KeyError, zlib.error, struct.error): # Damaged or foreign entry
+            return None
+
+    def put(self, key, tokens, errors, compressed_trace):
+        # Store an analysis: its tokens (a TokenStream, whose source must still be open),
+        # (message, line, column) errors and the trace compressed as compress_trace does (or None).
+        # Returns False when the entry is too large or cannot be written; the cache never makes an
+        # analysis fail.
+        try:
+            data = self.encode(tokens, errors, compressed_trace)
+        except ValueError: # Tokens a token file cannot hold (a source over 4 GiB)
+            return False
+        if len(data) > self.max_entry_bytes:
+            return False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Written to a temporary file and renamed, so concurrent readers never see a partial entry
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return False
+        try:
+            with os.fdopen(descriptor, "wb") as entry_file:
+                entry_file.write(data)
+            os.replace(temporary, self.path(key))
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return False
+        # The directory is only scanned when the estimate crosses the limit, and after every
+        # max_entry_bytes written (other processes may write to the same directory)
+        self.written += len(data)
+        if self.size is None or self.size + self.written > self.max_bytes or self.written > self.max_entry_bytes:
+            self.evict(target=self.max_bytes - self.max_bytes // EVICT_HEADROOM_FRACTION)
+        return True
+
+    def evict(self, max_bytes=None, target=None):
+        # If the cache is larger than max_bytes, remove least recently used entries until it fits
+        # in target (max_bytes by default). Updates the estimate of its size.
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        target = max_bytes if target is None else target
+        entries = []
+        total = 0
+        try:
+            scanner = os.scandir(self.directory)
+        except OSError:
+            return
+        with scanner:
+            for entry in scanner:
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except OSError: # Removed by another process
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        self.size = total
+        self.written = 0
+        if total <= max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            self.size = total
+            if total <= target:
+                break
+
+    def clear(self): # Remove every entry
+        self.evict(0)
+
+    def encode(self, tokens, errors, compressed_trace):
+        import token_file # Not at the top: token_file imports MyAssignment2, which imports this module
+        metadata = {
+            "errors": [list(error) for error in errors],
+            "trace": compressed_trace is not None,
+        }
+        parts = [MAGIC]
+
+        def add(block):
+            parts.append(LENGTH.pack(len(block)))
+            parts.append(block)
+
+        add(json.dumps(metadata).encode("utf-8"))
+        add(zlib.compress(token_file.encode_tokens(tokens), COMPRESS_LEVEL))
+        add(compressed_trace or b"")
+        return b"".join(parts)
+
+    def decode(self, data):
+        if not data.startswith(MAGIC):
+            raise ValueError("Not a cache entry")
+        position = len(MAGIC)
+
+        def block():
+            nonlocal position
+            (length,) = LENGTH.unpack_from(data, position)
+            position += LENGTH.size
+            if position + length > len(data):
+                raise ValueError("Truncated cache entry")
+            position += length
+            return data[position - length:position]
+
+        metadata = json.loads(block())
+        compressed_tokens = block()
+        compressed_trace = block()
+        errors = [tuple(error) for error in metadata["errors"]]
+        return CachedResult(errors, compressed_tokens, compressed_trace if metadata["trace"] else None)
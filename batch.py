@@ -0,0 +1,201 @@
+"""Batch Analyzer - Compilers CPSC 323
+Description: Non-interactive entry point that runs the syntax analyzer over many RAT24F files.
+Files, directories and glob patterns are expanded into a list of inputs that is split across a
+pool of worker processes. Each trace is written to an output directory, and a JSON summary with
+pass/fail and timing per file is printed. The exit code is 0 when every file parses, 1 otherwise.
+
+Usage: python batch.py [options] PATH [PATH ...]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import json
+import os
+import sys
+import time
+
+import analysis_cache
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+import ll1_parser
+
+# Parsers selectable with --engine
+ENGINES = {
+    "recursive": syntax.Parser,
+    "table": ll1_parser.TableParser,
+}
+
+TRACE_LEVELS = {
+    "off": syntax.TRACE_OFF,
+    "productions": syntax.TRACE_PRODUCTIONS,
+    "full": syntax.TRACE_FULL,
+}
+
+# Files picked up when a directory is given
+DEFAULT_PATTERN = "*.txt"
+OUTPUT_SUFFIX = "_syntax_output.txt"
+
+# Exit codes
+EXIT_PASSED = 0
+EXIT_FAILED = 1 # At least one file did not parse or could not be read
+
+def is_trace_file(path): # Trace files written by the analyzer are never taken as input
+    name = os.path.basename(path)
+    return name.endswith(OUTPUT_SUFFIX) or name.endswith(OUTPUT_SUFFIX + ".gz")
+
+def expand_inputs(paths, pattern=DEFAULT_PATTERN):
+    # Turn files, directories (searched recursively for pattern) and globs into (input path, output name)
+    # pairs. Files found under a directory keep their path relative to it in the output name.
+    inputs = []
+    seen = set()
+
+    def add(path, name):
+        key = os.path.abspath(path)
+        if key not in seen and not is_trace_file(path):
+            seen.add(key)
+            inputs.append((path, name))
+
+    for path in paths:
+        if os.path.isdir(path):
+            for found in sorted(glob.glob(os.path.join(path, "**", pattern), recursive=True)):
+                if os.path.isfile(found):
+                    add(found, os.path.relpath(found, path))
+        elif glob.has_magic(path):
+            for found in sorted(glob.glob(path, recursive=True)):
+                if os.path.isfile(found):
+                    add(found, os.path.basename(found))
+        else:
+            add(path, os.path.basename(path))
+    return inputs
+
+def output_path(input_path, name, output_dir, compress=False):
+    # Trace file for an input: next to it, or under output_dir when one is given
+    if output_dir is None:
+        return syntax.trace_filename(input_path, compress)
+    return syntax.trace_filename(os.path.join(output_dir, name), compress)
+
+# AnalysisCache per cache directory (None for the default one), created once per worker process
+caches = {}
+
+def job_cache(options): # The cache a job uses, or False
+    if not options["cache"]:
+        return False
+    directory = options["cache_dir"]
+    if directory not in caches:
+        caches[directory] = analysis_cache.AnalysisCache(directory) if directory else analysis_cache.default_cache()
+    return caches[directory] or False
+
+# LineMemo of the worker process, created by the first job that uses one
+line_memo = None
+MEMO_COUNTERS = ("hits", "misses", "hit_tokens", "missed_tokens")
+
+def job_line_memo(options): # The LineMemo a job lexes through, or None
+    global line_memo
+    if not options["line_memo"]:
+        return None
+    if line_memo is None:
+        line_memo = lexical.LineMemo()
+    return line_memo
+
+def analyze_job(job):
+    # Worker: analyze one file and return its summary entry
+    input_path, output_filename, options = job
+    start = time.perf_counter()
+    entry = {"file": input_path, "output": output_filename if options["trace"] else None}
+    memo = job_line_memo(options)
+    counters = [getattr(memo, name) for name in MEMO_COUNTERS] if memo is not None else None
+    try:
+        if output_filename is not None and options["trace"]:
+            os.makedirs(os.path.dirname(output_filename) or ".", exist_ok=True)
+        errors = syntax.analyze_file(input_path, output_filename, options["trace"], options["compress"],
+                                     options["recover"], ENGINES[options["engine"]], job_cache(options), memo)
+        entry["passed"] = not errors
+        entry["errors"] = [{"message": error.message, "line": error.line, "column": error.column} for error in errors]
+    except Exception as e: # The file could not be read or written
+        entry["passed"] = False
+        entry["errors"] = [{"message": f"{type(e).__name__}: {e}", "line": None, "column": None}]
+    entry["seconds"] = round(time.perf_counter() - start, 6)
+    if memo is not None: # What this file added to the memo's counters
+        entry["line_memo"] = {name: getattr(memo, name) - before for name, before in zip(MEMO_COUNTERS, counters)}
+    return entry
+
+def line_memo_summary(results): # Line memo counters of all the files, with hit rates
+    totals = {name: sum(result["line_memo"][name] for result in results) for name in MEMO_COUNTERS}
+    lines = totals["hits"] + totals["misses"]
+    tokens = totals["hit_tokens"] + totals["missed_tokens"]
+    totals["hit_rate"] = round(totals["hits"] / lines, 6) if lines else 0.0
+    totals["token_hit_rate"] = round(totals["hit_tokens"] / tokens, 6) if tokens else 0.0
+    return totals
+
+def run_batch(inputs, output_dir=None, trace=syntax.TRACE_FULL, compress=False, recover=False,
+              engine="recursive", jobs=None, cache=True, cache_dir=None, line_memo=False):
+    # Analyze (input path, output name) pairs across jobs worker processes (all cores by default)
+    # and return the summary. Results come from the analysis cache (cache_dir, or the default one)
+    # unless cache is False. With line_memo, each worker lexes through a LineMemo and the summary
+    # reports how often it was hit.
+    options = {"trace": trace, "compress": compress, "recover": recover, "engine": engine,
+               "cache": cache, "cache_dir": cache_dir, "line_memo": line_memo}
+    work = [(path, output_path(path, name, output_dir, compress), options) for path, name in inputs]
+    jobs = jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    if jobs == 1 or len(work) <= 1:
+        results = [analyze_job(job) for job in work]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as executor:
+            # Small files are sent in chunks so the pool is not dominated by task overhead
+            chunksize = max(1, len(work) // (jobs * 8))
+            results = list(executor.map(analyze_job, work, chunksize=chunksize))
+    passed = sum(1 for result in results if result["passed"])
+    summary = {
+        "engine": engine,
+        "files": results,
+        "total": len(results),
+        "passed": passed,
+        "failed": len(results) - passed,
+        "seconds": round(time.perf_counter() - start, 6),
+    }
+    if line_memo:
+        summary["line_memo"] = line_memo_summary(results)
+    return summary
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Run the RAT24F syntax analyzer over many files.")
+    arguments.add_argument("paths", nargs="+", help="files, directories or glob patterns to analyze")
+    arguments.add_argument("-o", "--output-dir", help="directory for the trace files (default: next to each input)")
+    arguments.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: number of cores)")
+    arguments.add_argument("--pattern", default=DEFAULT_PATTERN, help=f"file pattern searched in directories (default: {DEFAULT_PATTERN})")
+    arguments.add_argument("--trace", choices=TRACE_LEVELS, default="full", help="trace level (default: full)")
+    arguments.add_argument("--compress", action="store_true", help="gzip the trace files")
+    arguments.add_argument("--recover", action="store_true", help="report every syntax error instead of the first one")
+    arguments.add_argument("--engine", choices=ENGINES, default="recursive", help="parser to use (default: recursive)")
+    arguments.add_argument("--summary", default="-", help="file for the JSON summary (default: standard output)")
+    arguments.add_argument("--no-cache", action="store_true", help="analyze every file, without the analysis cache")
+    arguments.add_argument("--cache-dir", help="directory of the analysis cache (default: RAT24F_CACHE_DIR or ~/.cache/rat24f)")
+    arguments.add_argument("--line-memo", action="store_true", help="lex repeated lines through a memo in each worker and report its hit rate")
+    return arguments
+
+def main(argv=None):
+    arguments = build_argument_parser()
+    args = arguments.parse_args(argv)
+    if args.recover and args.engine != "recursive":
+        arguments.error("--recover is only supported by the recursive engine")
+    if args.jobs is not None and args.jobs < 1:
+        arguments.error("--jobs must be at least 1")
+
+    inputs = expand_inputs(args.paths, args.pattern)
+    if not inputs:
+        arguments.error("no input files found")
+    summary = run_batch(inputs, args.output_dir, TRACE_LEVELS[args.trace], args.compress, args.recover,
+                        args.engine, args.jobs, not args.no_cache, args.cache_dir, args.line_memo)
+
+    text = json.dumps(summary, indent=2)
+    if args.summary == "-":
+        print(text)
+    else:
+        with open(args.summary, "w", encoding="utf-8") as summary_file:
+            summary_file.write(text + "\n")
+    return EXIT_PASSED if summary["failed"] == 0 else EXIT_FAILED
+
+if __name__ == "__main__":
+    sys.exit(main())
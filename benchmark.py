@@ -0,0 +1,302 @@
+"""Benchmark - Compilers CPSC 323
+Description: Times each stage of the analyzer on a generated RAT24F program (see
+program_generator.py) or on given files. For every stage it reports the wall time (best of
+--repeat runs), tokens per second, productions per second for the parsing stages, and the peak
+memory allocated during one extra run under tracemalloc. Results are saved as JSON, and
+--compare checks them against an earlier run so that slowdowns are caught. A file with a syntax
+error is still lexed, but its parsing stages are skipped and the error is reported with its run.
+
+Stages:
+- lexer: Assignment1.lexer over every line (the line-by-line interface)
+- scan: Assignment1.scan over the whole source
+- scan_memoized: Assignment1.scan_memoized with a new LineMemo (pays off when lines repeat)
+- token_stream: building a TokenStream from the source
+- vector_token_stream: the same with vector_lexer (the scalar lexer when NumPy is not installed)
+- parse: MyAssignment2.Parser over a TokenStream, with the full trace
+- parse_untraced: the same with tracing off
+- table_parse: ll1_parser.TableParser with the full trace
+- table_parse_untraced: the same with tracing off
+- end_to_end: MyAssignment2.analyze_file writing the trace file, without the cache
+- end_to_end_cached: analyze_file answered from a warm analysis cache
+
+Usage: python benchmark.py [generator options] [--repeat N] [-o results.json] [--compare baseline.json]
+       python benchmark.py FILE [FILE ...] [options]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import analysis_cache
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+import ll1_parser
+import program_generator
+import vector_lexer
+
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.10 # Slowdown accepted by --compare before a stage counts as a regression
+RESULTS_VERSION = 1
+
+# Exit codes
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+
+class CountingSink(syntax.TraceSink): # Trace sink that counts the lines it is given instead of writing them
+    def __init__(self):
+        super().__init__(None)
+        self.productions = 0
+        self.tokens = 0
+
+    def write(self, line):
+        if line.startswith("\t"):
+            self.productions += 1
+        else:
+            self.tokens += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def count_productions(tokens):
+    # Productions in the full trace of a token stream, and the syntax error that stopped the
+    # parse (None when it parses)
+    sink = CountingSink()
+    try:
+        syntax.Parser(tokens, sink, syntax.TRACE_FULL).parse()
+    except SyntaxError as e:
+        return sink.productions, str(e)
+    return sink.productions, None
+
+class Workload: # The source being benchmarked, with the files and caches the stages use
+    def __init__(self, source, directory):
+        self.source = source
+        self.data = source.encode("utf-8")
+        self.lines = source.splitlines()
+        self.directory = directory
+        self.input_filename = os.path.join(directory, "program.txt")
+        self.output_filename = syntax.trace_filename(self.input_filename)
+        with open(self.input_filename, "wb") as input_file:
+            input_file.write(self.data)
+        self.tokens = lexical.TokenStream.from_buffer(source)
+        self.cache = analysis_cache.AnalysisCache(os.path.join(directory, "cache"))
+        syntax.analyze_file(self.input_filename, self.output_filename, cache=self.cache) # Warm the cache
+
+def stage_lexer(workload):
+    lexer = lexical.lexer
+    for line in workload.lines:
+        lexer(line)
+
+def stage_scan(workload):
+    for _ in lexical.scan(workload.source):
+        pass
+
+def stage_scan_memoized(workload):
+    for _ in lexical.scan_memoized(workload.source, lexical.LineMemo()):
+        pass
+
+def stage_token_stream(workload):
+    lexical.TokenStream.from_buffer(workload.source)
+
+def stage_vector_token_stream(workload):
+    vector_lexer.lex(workload.source)
+
+def stage_parse(workload):
+    syntax.Parser(workload.tokens, CountingSink(), syntax.TRACE_FULL).parse()
+
+def stage_parse_untraced(workload):
+    syntax.Parser(workload.tokens, None, syntax.TRACE_OFF).parse()
+
+def stage_table_parse(workload):
+    ll1_parser.TableParser(workload.tokens, CountingSink(), syntax.TRACE_FULL).parse()
+
+def stage_table_parse_untraced(workload):
+    ll1_parser.TableParser(workload.tokens, None, syntax.TRACE_OFF).parse()
+
+def stage_end_to_end(workload):
+    syntax.analyze_file(workload.input_filename, workload.output_filename, cache=False)
+
+def stage_end_to_end_cached(workload):
+    syntax.analyze_file(workload.input_filename, workload.output_filename, cache=workload.cache)
+
+# Stage name -> (function, whether it parses)
+STAGES = {
+    "lexer": (stage_lexer, False),
+    "scan": (stage_scan, False),
+    "scan_memoized": (stage_scan_memoized, False),
+    "token_stream": (stage_token_stream, False),
+    "vector_token_stream": (stage_vector_token_stream, False),
+    "parse": (stage_parse, True),
+    "parse_untraced": (stage_parse_untraced, True),
+    "table_parse": (stage_table_parse, True),
+    "table_parse_untraced": (stage_table_parse_untraced, True),
+    "end_to_end": (stage_end_to_end, True),
+    "end_to_end_cached": (stage_end_to_end_cached, True),
+}
+
+def time_stage(function, workload, repeat): # Best wall time of repeat runs
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function(workload)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def peak_memory(function, workload): # Peak bytes allocated by Python during one run
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(workload)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_benchmark(source, stages=None, repeat=DEFAULT_REPEAT, memory=True):
+    # Benchmark the given stages (all by default) on a program and return the results as a dict.
+    # The parsing stages are left out when the program has a syntax error (see syntax_error).
+    directory = tempfile.mkdtemp(prefix="rat24f-benchmark-")
+    try:
+        workload = Workload(source, directory)
+        tokens = len(workload.tokens)
+        productions, error = count_productions(workload.tokens)
+        results = {}
+        for name in stages or STAGES:
+            function, parses = STAGES[name]
+            if parses and error is not None:
+                continue
+            seconds = time_stage(function, workload, repeat)
+            result = {
+                "seconds": round(seconds, 6),
+                "tokens_per_second": round(tokens / seconds, 1) if seconds else None,
+                "productions_per_second": round(productions / seconds, 1) if parses and seconds else None,
+            }
+            if memory:
+                result["peak_memory_bytes"] = peak_memory(function, workload)
+            results[name] = result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        "source_bytes": len(workload.data),
+        "lines": len(workload.lines),
+        "tokens": tokens,
+        "productions": productions,
+        "syntax_error": error,
+        "repeat": repeat,
+        "stages": results,
+    }
+
+def environment(): # Where the results were measured
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Compare tokens per second stage by stage with a baseline run. Returns (report lines, regressions),
+    # where a regression is a stage whose throughput fell by more than tolerance.
+    lines = []
+    regressions = []
+    baseline_runs = {run["name"]: run for run in baseline.get("runs", [])}
+    for run in results["runs"]:
+        old_run = baseline_runs.get(run["name"])
+        if old_run is None:
+            lines.append(f"{run['name']}: not in the baseline")
+            continue
+        for stage, result in run["stages"].items():
+            old = old_run["stages"].get(stage)
+            if old is None or not old.get("tokens_per_second") or not result.get("tokens_per_second"):
+                continue
+            ratio = result["tokens_per_second"] / old["tokens_per_second"]
+            status = "ok"
+            if ratio < 1 - tolerance:
+                status = "REGRESSION"
+                regressions.append(f"{run['name']}/{stage}")
+            lines.append(f"{run['name']}/{stage:<18} {old['tokens_per_second']:>14,.0f} -> "
+                         f"{result['tokens_per_second']:>14,.0f} tokens/s  x{ratio:.2f}  {status}")
+    return lines, regressions
+
+def format_table(results): # Human-readable summary of the results
+    lines = []
+    for run in results["runs"]:
+        lines.append(f"{run['name']}: {run['source_bytes']:,} bytes, {run['tokens']:,} tokens, "
+                     f"{run['productions']:,} productions")
+        if run.get("syntax_error"):
+            lines.append(f"  syntax error, parsing stages skipped: {run['syntax_error']}")
+        for stage, result in run["stages"].items():
+            productions = result["productions_per_second"]
+            memory = result.get("peak_memory_bytes")
+            lines.append(f"  {stage:<20} {result['seconds']:>10.4f} s  {result['tokens_per_second']:>14,.0f} tokens/s  "
+                         f"{f'{productions:,.0f}' if productions else '-':>14} productions/s  "
+                         f"{f'{memory / (1 << 20):.1f} MiB' if memory is not None else '-':>10}")
+    return "\n".join(lines)
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Benchmark the RAT24F lexer and parser.")
+    program_generator.add_shape_arguments(arguments)
+    arguments.add_argument("files", nargs="*", help="programs to benchmark (default: a generated program)")
+    arguments.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"runs per stage, the best is kept (default: {DEFAULT_REPEAT})")
+    arguments.add_argument("--stages", nargs="+", choices=STAGES, help="stages to run (default: all)")
+    arguments.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each stage")
+    arguments.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run to compare with")
+    arguments.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                           help=f"slowdown allowed by --compare (default: {DEFAULT_TOLERANCE})")
+    # Generated programs default to a realistic size: about 450 KB
+    arguments.set_defaults(functions=300, statements=20, depth=3)
+    arguments.add_argument("-o", "--output", help="file for the JSON results (default: standard output)")
+    return arguments
+
+def main(argv=None):
+    arguments = build_argument_parser()
+    args = arguments.parse_args(argv)
+    if args.repeat < 1:
+        arguments.error("--repeat must be at least 1")
+
+    if args.files:
+        programs = []
+        for filename in args.files:
+            with open(filename, encoding="utf-8", errors="surrogateescape") as input_file:
+                programs.append((filename, None, input_file.read()))
+    else:
+        shape = program_generator.shape_from_arguments(args)
+        programs = [("generated", shape.as_dict(), program_generator.generate_program(shape))]
+
+    results = {"version": RESULTS_VERSION, "environment": environment(), "runs": []}
+    for name, shape, source in programs:
+        run = {"name": name, "shape": shape}
+        run.update(run_benchmark(source, args.stages, args.repeat, not args.no_memory))
+        results["runs"].append(run)
+
+    print(format_table(results), file=sys.stderr)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        lines, regressions = compare_results(results, baseline, args.tolerance)
+        print("\n".join(lines), file=sys.stderr)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            return EXIT_REGRESSION
+    return EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""Analysis Daemon - Compilers CPSC 323
+Description: Long-running server that keeps the analyzer loaded and answers analysis requests
+over a Unix domain socket or a localhost TCP port, so small files do not pay for starting Python.
+Connections are served with asyncio, and the lexing and parsing run in a pool of worker
+processes, so a huge file occupies one worker while small requests keep being answered.
+
+Any local user who can connect may send requests, so the server only reads files for "path"
+requests when it is started with --root, and then only files under that directory. The Unix
+socket is created readable and writable by its owner only.
+
+Protocol: one JSON object per line in each direction. A connection may send any number of
+requests without waiting; replies carry the request's "id" and come back as they finish.
+
+Request fields:
+- "source" (program text) or "path" (file under the server's --root, relative to it or absolute);
+- "want": list of "tokens", "errors", "trace" (default ["errors"]);
+- "trace": "productions" or "full" (default "full"), "engine": "recursive" or "table",
+  "recover": true to report every syntax error;
+- or {"command": "ping"} to check that the server is up.
+
+Reply fields: "id", "ok" (false when the request could not be handled, with "error" saying why),
+"passed", and the parts asked for: "tokens" as [kind, lexeme, line, column] lists, "errors" as
+{"message", "line", "column"} objects (as in batch.py), and "trace" as text.
+
+Usage: python daemon.py serve [--socket PATH | --port PORT] [-j JOBS] [--root DIR]
+       python daemon.py send [--socket PATH | --port PORT] [--want ...] [--paths] FILE [FILE ...]
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import errno
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import tempfile
+
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+import batch
+
+HOST = "127.0.0.1" # TCP is only served on the loopback interface
+MAX_REQUEST_BYTES = 256 << 20 # Longest request line accepted
+WANTS = ("tokens", "errors", "trace")
+DEFAULT_WANT = ["errors"]
+
+def default_socket_path(): # RAT24F_SOCKET, or a per-user socket in the temporary directory
+    path = os.environ.get("RAT24F_SOCKET")
+    if path:
+        return path
+    user = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return os.path.join(tempfile.gettempdir(), f"rat24f-{user}.sock")
+
+class RequestError(Exception): # A request the server cannot handle, reported in an error reply
+    pass
+
+def error_reply(request_id, message):
+    return {"id": request_id, "ok": False, "error": message}
+
+def server_listening(socket_path): # Whether a server accepts connections on a Unix socket
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError: # Refused: left behind by a server that is gone
+        return False
+    finally:
+        probe.close()
+    return True
+
+def resolve_path(path, root):
+    # The real path of the file a "path" request names, which must lie under root (a real path,
+    # or None when path requests are not allowed). Raises RequestError.
+    if root is None:
+        raise RequestError("'path' requests are not enabled on this server (see serve --root)")
+    real_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([real_path, root]) != root:
+        raise RequestError("'path' is outside the directory this server analyzes")
+    return real_path
+
+def validate_request(request, root=None):
+    # Check a decoded request and return it with the defaults filled in, resolving a "path" under
+    # root (see resolve_path). Raises RequestError.
+    if not isinstance(request, dict):
+        raise RequestError("A request must be a JSON object")
+    if ("source" in request) == ("path" in request):
+        raise RequestError("A request needs exactly one of 'source' and 'path'")
+    if not isinstance(request.get("source", request.get("path")), str):
+        raise RequestError("'source' and 'path' must be strings")
+    want = request.get("want", DEFAULT_WANT)
+    if not isinstance(want, list) or any(part not in WANTS for part in want):
+        raise RequestError(f"'want' must be a list of {', '.join(WANTS)}")
+    trace = request.get("trace", "full")
+    if trace not in ("productions", "full"):
+        raise RequestError("'trace' must be 'productions' or 'full'")
+    engine = request.get("engine", "recursive")
+    if engine not in batch.ENGINES:
+        raise RequestError(f"'engine' must be one of {', '.join(batch.ENGINES)}")
+    recover = bool(request.get("recover", False))
+    if recover and engine != "recursive":
+        raise RequestError("'recover' is only supported by the recursive engine")
+    path = resolve_path(request["path"], root) if "path" in request else None
+    return {"id": request.get("id"), "source": request.get("source"), "path": path,
+            "want": want, "trace": trace, "engine": engine, "recover": recover}
+
+analyzers = {} # Analyzer for each combination of request options, reused by the requests a worker handles
+
+def analyzer_for(request):
+    want = request["want"]
+    trace = batch.TRACE_LEVELS[request["trace"]] if "trace" in want else syntax.TRACE_OFF
+    key = (trace, request["recover"], request["engine"], "tokens" in want)
+    analyzer = analyzers.get(key)
+    if analyzer is None:
+        analyzer = analyzers[key] = syntax.Analyzer(trace, request["recover"], batch.ENGINES[request["engine"]],
+                                                    tokens="tokens" in want)
+    return analyzer
+
+def analyze_request(request):
+    # Worker: lex and parse a validated request and return its reply
+    try:
+        if request["path"] is not None:
+            with open(request["path"], "rb") as input_file:
+                source = input_file.read()
+        else:
+            source = request["source"]
+    except OSError as e:
+        return error_reply(request["id"], f"{type(e).__name__}: {e}")
+
+    want = request["want"]
+    result = analyzer_for(request).analyze(source)
+    reply = {"id": request["id"], "ok": True}
+    if "tokens" in want:
+        reply["tokens"] = [[lexical.kind_names[kind], lexeme, line, column]
+                           for kind, lexeme, offset, line, column in result.tokens.records()]
+    if "errors" in want or "trace" in want:
+        reply["passed"] = result.passed
+        if "errors" in want:
+            reply["errors"] = [{"message": error.message, "line": error.line, "column": error.column}
+                               for error in result.errors]
+        if "trace" in want:
+            reply["trace"] = result.trace
+    return reply
+
+def warm_up(): # Run in each worker as it starts, so the first request does not pay for imports
+    analyze_request(validate_request({"source": "@ x = 1; @"}))
+
+class AnalysisServer:
+    def __init__(self, jobs=None, root=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.root = os.path.realpath(root) if root is not None else None # Directory "path" requests may read
+        self.executor = None
+        self.server = None
+
+    async def start(self, socket_path=None, port=None):
+        # Listen on a Unix domain socket, or on HOST:port when a port is given (0 picks a free one).
+        # Raises OSError when another server is listening on the socket or the port.
+        if port is None:
+            try:
+                mode = os.stat(socket_path).st_mode
+            except FileNotFoundError:
+                mode = None
+            if mode is not None:
+                if not stat.S_ISSOCK(mode):
+                    raise OSError(errno.EEXIST, "File exists and is not a socket", socket_path)
+                if server_listening(socket_path):
+                    raise OSError(errno.EADDRINUSE, "Another server is listening on this socket", socket_path)
+                os.remove(socket_path) # Left behind by a server that did not shut down cleanly
+        self.executor = self.new_executor()
+        try:
+            if port is not None:
+                self.server = await asyncio.start_server(self.handle_connection, HOST, port, limit=MAX_REQUEST_BYTES)
+            else:
+                old_umask = os.umask(0o177) # The socket is created for its owner only
+                try:
+                    self.server = await asyncio.start_unix_server(self.handle_connection, socket_path, limit=MAX_REQUEST_BYTES)
+                finally:
+                    os.umask(old_umask)
+        except BaseException:
+            self.close()
+            raise
+        return self.server.sockets[0].getsockname()
+
+    async def serve_until_stopped(self): # Serve until SIGINT or SIGTERM
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, stop.set)
+            except (NotImplementedError, RuntimeError): # Not supported on this platform
+                pass
+        async with self.server:
+            await stop.wait()
+
+    def new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.jobs, initializer=warm_up)
+
+    def replace_executor(self, broken):
+        # A worker died (e.g. killed for running out of memory on a huge source), which breaks the
+        # whole pool; start a new one so later requests are answered. Every request running on the
+        # broken pool fails with it, and the first of them to get here replaces it.
+        if self.executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self.new_executor()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        lock = asyncio.Lock() # Replies are written whole, one at a time
+        pending = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self.send(writer, lock, error_reply(None, f"Request longer than {MAX_REQUEST_BYTES} bytes"))
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(self.handle_request(line, writer, lock))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def handle_request(self, line, writer, lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict):
+                request_id = request.get("id")
+            if isinstance(request, dict) and request.get("command") == "ping":
+                reply = {"id": request_id, "ok": True}
+            else:
+                request = validate_request(request, self.root)
+                executor = self.executor
+                try:
+                    reply = await asyncio.get_running_loop().run_in_executor(executor, analyze_request, request)
+                except BrokenProcessPool:
+                    self.replace_executor(executor)
+                    reply = error_reply(request_id, "A worker process stopped unexpectedly while analyzing this request")
+        except (ValueError, RequestError) as e: # ValueError covers malformed JSON
+            reply = error_reply(request_id, f"Invalid request: {e}")
+        except Exception as e: # A worker failed; the server keeps running
+            reply = error_reply(request_id, f"{type(e).__name__}: {e}")
+        await self.send(writer, lock, reply)
+
+    async def send(self, writer, lock, reply):
+        async with lock:
+            try:
+                writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+                await writer.drain()
+            except ConnectionError: # The client went away
+                pass
+
+async def serve(socket_path=None, port=None, jobs=None, root=None):
+    server = AnalysisServer(jobs, root)
+    address = await server.start(socket_path, port)
+    print(f"Listening on {address}", file=sys.stderr, flush=True)
+    try:
+        await server.serve_until_stopped()
+    finally:
+        server.close()
+        if port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+async def send_requests(requests, socket_path=None, port=None):
+    # Client: send requests (dicts) on one connection and return the replies in request order
+    if port is not None:
+        reader, writer = await asyncio.open_connection(HOST, port, limit=MAX_REQUEST_BYTES)
+    else:
+        reader, writer = await asyncio.open_unix_connection(socket_path, limit=MAX_REQUEST_BYTES)
+    try:
+        for index, request in enumerate(requests):
+            writer.write(json.dumps(dict(request, id=index)).encode("utf-8") + b"\n")
+        await writer.drain()
+        replies = [None] * len(requests)
+        for _ in requests:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("The server closed the connection")
+            reply = json.loads(line)
+            if isinstance(reply.get("id"), int) and 0 <= reply["id"] < len(replies):
+                replies[reply["id"]] = reply
+        return replies
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Serve RAT24F analyses over a socket, or send requests to the server.")
+    commands = arguments.add_subparsers(dest="command", required=True)
+    serve_command = commands.add_parser("serve", help="run the server")
+    send_command = commands.add_parser("send", help="analyze files with a running server")
+    for command in (serve_command, send_command):
+        address = command.add_mutually_exclusive_group()
+        address.add_argument("--socket", help="Unix domain socket (default: RAT24F_SOCKET or one in the temporary directory)")
+        address.add_argument("--port", type=int, help=f"TCP port on {HOST} instead of a Unix socket")
+    serve_command.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: number of cores)")
+    serve_command.add_argument("--root", help="answer 'path' requests for files under this directory (default: source requests only)")
+    send_command.add_argument("files", nargs="+", help="programs to analyze")
+    send_command.add_argument("--want", nargs="+", choices=WANTS, default=DEFAULT_WANT, help="parts of the reply (default: errors)")
+    send_command.add_argument("--trace", choices=("productions", "full"), default="full")
+    send_command.add_argument("--engine", choices=batch.ENGINES, default="recursive")
+    send_command.add_argument("--recover", action="store_true", help="report every syntax error instead of the first one")
+    send_command.add_argument("--paths", action="store_true", help="send the file paths instead of their contents (the server needs --root)")
+    return arguments
+
+def main(argv=None):
+    arguments = build_argument_parser()
+    args = arguments.parse_args(argv)
+    if args.port is None and not hasattr(socket, "AF_UNIX"):
+        arguments.error("Unix domain sockets are not available here; use --port")
+    socket_path = args.socket or default_socket_path()
+
+    if args.command == "serve":
+        if args.jobs is not None and args.jobs < 1:
+            arguments.error("--jobs must be at least 1")
+        if args.root is not None and not os.path.isdir(args.root):
+            arguments.error(f"--root {args.root} is not a directory")
+        try:
+            asyncio.run(serve(socket_path, args.port, args.jobs, args.root))
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    requests = []
+    for filename in args.files:
+        request = {"want": args.want, "trace": args.trace, "engine": args.engine, "recover": args.recover}
+        if args.paths:
+            request["path"] = os.path.abspath(filename)
+        else:
+            with open(filename, encoding="utf-8", errors="surrogateescape") as input_file:
+                request["source"] = input_file.read()
+        requests.append(request)
+    replies = asyncio.run(send_requests(requests, socket_path, args.port))
+    for filename, reply in zip(args.files, replies):
+        print(json.dumps(dict(reply, file=filename)))
+    return 0 if all(reply["ok"] and reply.get("passed", True) for reply in replies) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
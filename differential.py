@@ -0,0 +1,517 @@
+"""Differential Tester - Compilers CPSC 323
+Description: Checks that every lexer and parser backend behaves exactly like the reference ones.
+Each test case is a RAT24F source: a valid program from program_generator.py, or one broken on
+purpose by deleting, duplicating, swapping or inserting tokens and by inserting stray characters
+(non-ASCII text, unterminated comments, 1.2.3, <==, ...). Every selected backend is run on it:
+
+- lexers are compared with Assignment1.scan record by record (kind, lexeme, offset, line and
+  column, offsets and columns counted in characters); scan itself is compared with
+  Assignment1.lexer run line by line over the source with its comments blanked out;
+- parsers are compared with MyAssignment2.Parser over the scanned tokens: the trace text, and
+  the message, line and column of every syntax error.
+
+A mismatch is shrunk to a small source that still shows it (delta debugging over the tokens and
+the whitespace between them, then over single characters, repeated until nothing more can be
+removed) and reported with the first point
+where the backend differs. Backends that are not installed (the NumPy lexer) are left out, and
+the parallel lexer and parser are only run in worker processes with --parallel (without it, the
+parallel lexer's chunking is still checked with worker threads).
+
+Usage: python differential.py [--cases N] [--seed N] [--broken FRACTION] [--recover]
+                              [--lexers NAME ...] [--parsers NAME ...] [--parallel] [-o DIRECTORY]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import io
+import os
+import random
+import re
+import sys
+
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+import batch
+import incremental
+import ll1_parser
+import parallel_lexer
+import parallel_parse
+import program_generator
+import symbol_table
+import syntax_tree
+import token_file
+import vector_lexer
+
+DEFAULT_CASES = 500
+DEFAULT_BROKEN = 0.5 # Fraction of the cases that are broken on purpose
+SMALL_CHUNK_SIZE = 7 # Chunk size of the chunked scan backends, small enough to split tokens and characters
+MEMO_LINES = 64 # Lines the line memo backends keep, so that entries are evicted during a run
+PARALLEL_CHUNK_SIZE = 40 # Chunk size of the parallel lexer backends, so that most test cases have several chunks
+MAX_SHRINK_RUNS = 2000 # Backend runs allowed for shrinking one mismatch
+MAX_SHRINK_WINDOW = 12 # Longest run of tokens removed at once after delta debugging
+
+# Exit codes
+EXIT_OK = 0
+EXIT_MISMATCH = 1
+
+# Pieces inserted into broken sources
+TOKEN_NOISE = ("function", "if", "fi", "else", "while", "return", "put", "get", "integer", "real", "boolean",
+               "true", "false", "x", "fn0", "12", "3.5", "@", "(", ")", "{", "}", ";", ",", "=", "==", "<",
+               "=>", "+", "*", "[*", "*]", "$")
+CHARACTER_NOISE = ("é", "½", "²", "µ", "#", "_", "[", "]", "!", "!=", "<==", "=<", "1.2.3", "12ab", "ab12", "3.",
+                   ".5", "[* unterminated", "*]", "[*]", "\t", "\r", "\n", "\n\n", " ")
+
+COMMENT = re.compile(r"\[\*.*?(?:\*\]|\Z)", re.S)
+SHRINK_PIECES = re.compile(r"\[\*|\*\]|\w+|\s+|.", re.S)
+
+def encode(source): # The bytes form of a source, as a file holding it would contain
+    return source.encode("utf-8", "surrogateescape")
+
+def text_positions(source, records):
+    # Records lexed from encode(source), with offsets and columns counted in characters of source
+    encoded = encode(source)
+    if len(encoded) == len(source):
+        return records
+    character_at = {}
+    position = 0
+    for index, char in enumerate(source):
+        character_at[position] = index
+        position += len(encode(char))
+    converted = []
+    for kind, lexeme, offset, line, column in records:
+        offset = character_at[offset]
+        converted.append((kind, lexeme, offset, line, offset - source.rfind("\n", 0, offset)))
+    return converted
+
+def error_list(errors): # ParseErrors as comparable (message, line, column) tuples
+    return [(error.message, error.line, error.column) for error in errors]
+
+def run_parser(parser_class, tokens, trace, recover):
+    # Parse tokens with parser_class and return (trace text, error list)
+    output = io.StringIO()
+    options = {"recover": True} if recover else {}
+    try:
+        parser = parser_class(tokens, syntax.TraceSink(output), trace, **options)
+    except SyntaxError as e: # No tokens
+        return "", [(str(e), None, None)]
+    try:
+        parser.parse()
+    except SyntaxError: # Already recorded in parser.errors
+        pass
+    finally:
+        parser.output_file.flush()
+    return output.getvalue(), error_list(parser.errors)
+
+# Reference lexer and parser
+
+def reference_tokens(source):
+    return list(lexical.scan(source))
+
+def reference_parse(source, trace, recover):
+    return run_parser(syntax.Parser, reference_tokens(source), trace, recover)
+
+# Lexer backends: each lexes a str source into (kind, lexeme, offset, line, column) records with
+# character positions; None in a field means the backend does not produce it
+
+def lex_lines(source, memo=None): # Assignment1.lexer line by line, comments blanked out (kinds, lexemes and lines only)
+    blanked = COMMENT.sub(lambda match: re.sub(r"[^\n]", " ", match.group(0)), source)
+    records = []
+    for line_number, line in enumerate(blanked.split("\n"), 1):
+        for token in lexical.lexer(line, memo):
+            records.append((lexical.kind_codes[token.token_type], token.lexeme, None, line_number, None))
+    return records
+
+line_memo = lexical.LineMemo(MEMO_LINES) # Shared by the line memo backends across test cases
+
+def lex_lines_memoized(source): # lex_lines with every line lexed through the line memo
+    return lex_lines(source, line_memo)
+
+def lex_memoized(source):
+    return list(lexical.scan_memoized(source, line_memo))
+
+def lex_memoized_bytes(source):
+    return text_positions(source, list(lexical.scan_memoized(encode(source), line_memo)))
+
+def lex_bytes(source):
+    return text_positions(source, list(lexical.scan(encode(source))))
+
+def lex_chunked(source):
+    return list(lexical.scan(source, chunk_size=SMALL_CHUNK_SIZE))
+
+def lex_chunked_bytes(source):
+    return text_positions(source, list(lexical.scan(encode(source), chunk_size=SMALL_CHUNK_SIZE)))
+
+def lex_token_stream(source):
+    return list(lexical.TokenStream.from_buffer(source).records())
+
+def lex_token_stream_bytes(source):
+    return text_positions(source, list(lexical.TokenStream.from_buffer(encode(source)).records()))
+
+def lex_token_file(source): # Through the binary token file format and back
+    with token_file.TokenFile(token_file.encode_tokens(lexical.TokenStream.from_buffer(encode(source)))) as tokens:
+        records = list(tokens.records())
+    return text_positions(source, records)
+
+def lex_vector(source):
+    return list(vector_lexer.lex(source).records())
+
+def lex_vector_bytes(source):
+    return text_positions(source, list(vector_lexer.lex(encode(source)).records()))
+
+def lex_incremental(source):
+    return list(incremental.analyze(source, syntax.TRACE_OFF).records())
+
+def lex_parallel_chunks(source): # parallel_lexer's chunking and comment repair, with worker threads
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return list(parallel_lexer.lex_parallel(source, 2, executor, PARALLEL_CHUNK_SIZE).records())
+
+def parallel_lexer_backend(executor, jobs):
+    # Lexer backend running parallel_lexer.lex_parallel over the bytes of the source on executor
+    # (a pool of jobs processes)
+    def lex(source):
+        stream = parallel_lexer.lex_parallel(encode(source), jobs, executor, PARALLEL_CHUNK_SIZE)
+        return text_positions(source, list(stream.records()))
+    return lex
+
+# Lexer name -> function
+LEXERS = {
+    "lines": lex_lines,
+    "bytes": lex_bytes,
+    "chunked": lex_chunked,
+    "chunked_bytes": lex_chunked_bytes,
+    "token_stream": lex_token_stream,
+    "token_stream_bytes": lex_token_stream_bytes,
+    "token_file": lex_token_file,
+    "incremental": lex_incremental,
+    "parallel_chunks": lex_parallel_chunks,
+    "lines_memoized": lex_lines_memoized,
+    "memoized": lex_memoized,
+    "memoized_bytes": lex_memoized_bytes,
+}
+if vector_lexer.available():
+    LEXERS["vector"] = lex_vector
+    LEXERS["vector_bytes"] = lex_vector_bytes
+
+# Parser backends: each parses a str source and returns (trace text, [(message, line, column)])
+
+def parse_token_stream(source, trace, recover):
+    return run_parser(syntax.Parser, lexical.TokenStream.from_buffer(source), trace, recover)
+
+def parse_lazy(source, trace, recover): # Tokens read from the scan generator as the parser goes
+    return run_parser(syntax.Parser, lexical.scan(source), trace, recover)
+
+def parse_table(source, trace, recover):
+    return run_parser(ll1_parser.TableParser, lexical.TokenStream.from_buffer(source), trace, recover)
+
+def parse_tree(source, trace, recover):
+    return run_parser(syntax_tree.TreeParser, lexical.TokenStream.from_buffer(source), trace, recover)
+
+def parse_symbols(source, trace, recover):
+    return run_parser(symbol_table.SymbolParser, lexical.TokenStream.from_buffer(source), trace, recover)
+
+def parse_token_file(source, trace, recover):
+    with token_file.TokenFile(token_file.encode_tokens(lexical.TokenStream.from_buffer(source))) as tokens:
+        return run_parser(syntax.Parser, tokens, trace, recover)
+
+def parse_vector(source, trace, recover):
+    return run_parser(syntax.Parser, vector_lexer.lex(source), trace, recover)
+
+analyzers = {} # syntax.Analyzer per (parser class, trace, recover), reused across test cases so that reset is checked
+
+def analyzer_result(parser_class, source, trace, recover):
+    key = (parser_class, trace, recover)
+    analyzer = analyzers.get(key)
+    if analyzer is None:
+        analyzer = analyzers[key] = syntax.Analyzer(trace, recover, parser_class, tokens=True)
+    result = analyzer.analyze(source)
+    return result.trace, error_list(result.errors)
+
+def parse_analyzer(source, trace, recover):
+    return analyzer_result(syntax.Parser, source, trace, recover)
+
+def parse_analyzer_table(source, trace, recover):
+    return analyzer_result(ll1_parser.TableParser, source, trace, recover)
+
+def parse_analyzer_tree(source, trace, recover):
+    return analyzer_result(syntax_tree.TreeParser, source, trace, recover)
+
+def parse_analyzer_symbols(source, trace, recover):
+    return analyzer_result(symbol_table.SymbolParser, source, trace, recover)
+
+def incremental_result(analysis): # (trace text, error list) of an IncrementalAnalysis
+    lines = analysis.trace_lines()
+    return "".join(line + "\n" for line in lines), error_list(analysis.errors)
+
+def parse_incremental(source, trace, recover):
+    return incremental_result(incremental.analyze(source, trace))
+
+def parse_incremental_edit(source, trace, recover):
+    # Analyze the source without its middle third, then edit the middle third back in
+    start, end = len(source) // 3, 2 * len(source) // 3
+    analysis = incremental.analyze(source[:start] + source[end:], trace)
+    return incremental_result(analysis.edit(start, 0, source[start:end]))
+
+def parallel_backend(executor, jobs):
+    # Parser backend running parallel_parse.parse_parallel on executor (a pool of jobs processes)
+    def parse(source, trace, recover):
+        output = io.StringIO()
+        sink = syntax.TraceSink(output)
+        errors = parallel_parse.parse_parallel(source, sink, trace, recover, executor, jobs)
+        sink.flush()
+        return output.getvalue(), error_list(errors)
+    return parse
+
+# Parser name -> (function, whether it supports recover)
+PARSERS = {
+    "token_stream": (parse_token_stream, True),
+    "lazy": (parse_lazy, True),
+    "table": (parse_table, False),
+    "tree": (parse_tree, True),
+    "symbols": (parse_symbols, True),
+    "token_file": (parse_token_file, True),
+    "incremental": (parse_incremental, False),
+    "incremental_edit": (parse_incremental_edit, False),
+    "analyzer": (parse_analyzer, True),
+    "analyzer_table": (parse_analyzer_table, False),
+    "analyzer_tree": (parse_analyzer_tree, True),
+    "analyzer_symbols": (parse_analyzer_symbols, True),
+}
+if vector_lexer.available():
+    PARSERS["vector"] = (parse_vector, True)
+
+# Test cases
+
+def generate_source(rng): # A valid program of random shape
+    shape = program_generator.ProgramShape(
+        functions=rng.randint(0, 3) if rng.random() < 0.8 else rng.randint(8, 12),
+        statements=rng.randint(1, 5),
+        depth=rng.randint(0, 3),
+        expression_terms=rng.randint(1, 4),
+        comment_density=rng.choice((0.0, 0.2, 0.5)),
+        declarations=rng.randint(0, 3),
+        parameters=rng.randint(0, 3),
+        seed=rng.randrange(1 << 31))
+    return program_generator.generate_program(shape)
+
+def mutate(source, rng): # The source with one random token or character level change
+    records = reference_tokens(source)
+    choice = rng.random()
+    if records and choice < 0.6:
+        index = rng.randrange(len(records))
+        _, lexeme, offset, _, _ = records[index]
+        end = offset + len(lexeme)
+        if choice < 0.2: # Delete a token
+            return source[:offset] + source[end:]
+        if choice < 0.3: # Duplicate a token
+            return source[:end] + " " + lexeme + source[end:]
+        if choice < 0.4 and index + 1 < len(records): # Swap a token with the next one
+            _, next_lexeme, next_offset, _, _ = records[index + 1]
+            return (source[:offset] + next_lexeme + source[end:next_offset] + lexeme +
+                    source[next_offset + len(next_lexeme):])
+        return source[:offset] + rng.choice(TOKEN_NOISE) + source[end:] # Replace a token
+    position = rng.randint(0, len(source))
+    noise = rng.choice(TOKEN_NOISE if choice < 0.7 else CHARACTER_NOISE)
+    if choice < 0.7:
+        noise = f" {noise} "
+    return source[:position] + noise + source[position:]
+
+def generate_case(rng, broken=DEFAULT_BROKEN): # A test case source: valid, or broken with probability broken
+    source = generate_source(rng)
+    if rng.random() < broken:
+        for _ in range(rng.choice((1, 1, 1, 2, 3))):
+            source = mutate(source, rng)
+    return source
+
+# Comparison
+
+def describe(value):
+    text = repr(value)
+    return text if len(text) <= 120 else text[:117] + "..."
+
+def lexer_difference(source, name, expected=None):
+    # How LEXERS[name] differs from the reference on source (a short description), or None
+    try:
+        records = LEXERS[name](source)
+    except Exception as e:
+        return f"raised {type(e).__name__}: {e}"
+    expected = reference_tokens(source) if expected is None else expected
+    for index, (record, reference) in enumerate(zip(records, expected)):
+        if any(field is not None and field != wanted for field, wanted in zip(record, reference)):
+            return f"token {index}: expected {describe(reference)}, got {describe(record)}"
+    if len(records) != len(expected):
+        return f"expected {len(expected)} tokens, got {len(records)}"
+    return None
+
+def parser_difference(source, name, trace, recover, expected=None):
+    # How PARSERS[name] differs from the reference on source (a short description), or None
+    function, _ = PARSERS[name]
+    try:
+        output, errors = function(source, trace, recover)
+    except Exception as e:
+        return f"raised {type(e).__name__}: {e}"
+    expected_output, expected_errors = reference_parse(source, trace, recover) if expected is None else expected
+    if errors != expected_errors:
+        return f"errors: expected {describe(expected_errors)}, got {describe(errors)}"
+    if output != expected_output:
+        lines, expected_lines = output.split("\n"), expected_output.split("\n")
+        for number, (line, expected_line) in enumerate(zip(lines, expected_lines), 1):
+            if line != expected_line:
+                return f"trace line {number}: expected {describe(expected_line)}, got {describe(line)}"
+        return f"trace has {len(lines) - 1} lines, expected {len(expected_lines) - 1}"
+    return None
+
+# Shrinking
+
+def shrink_pieces(pieces, fails, budget):
+    # Delta debugging: the smallest sublist of pieces found for which fails("".join(...)) holds
+    granularity = 2
+    while len(pieces) >= 2 and budget[0] > 0:
+        size = -(-len(pieces) // granularity)
+        for start in range(0, len(pieces), size):
+            candidate = pieces[:start] + pieces[start + size:]
+            budget[0] -= 1
+            if fails("".join(candidate)):
+                pieces = candidate
+                granularity = max(granularity - 1, 2)
+                break
+            if budget[0] <= 0:
+                break
+        else:
+            if granularity >= len(pieces):
+                break
+            granularity = min(granularity * 2, len(pieces))
+    return pieces
+
+def remove_windows(pieces, fails, budget):
+    # Remove runs of up to MAX_SHRINK_WINDOW consecutive pieces wherever fails still holds, for
+    # the spots that delta debugging misses (a whole statement that is not aligned with its splits)
+    for size in range(min(MAX_SHRINK_WINDOW, len(pieces) - 1), 0, -1):
+        start = 0
+        while start + size <= len(pieces) and budget[0] > 0:
+            candidate = pieces[:start] + pieces[start + size:]
+            budget[0] -= 1
+            if fails("".join(candidate)):
+                pieces = candidate
+            else:
+                start += 1
+    return pieces
+
+def shrink(source, fails, max_runs=MAX_SHRINK_RUNS):
+    # A small source for which fails(source) still holds: whole tokens and blanks are removed
+    # first, then single characters, until nothing more can be removed
+    budget = [max_runs]
+    while budget[0] > 0:
+        pieces = shrink_pieces(SHRINK_PIECES.findall(source), fails, budget)
+        pieces = remove_windows(pieces, fails, budget)
+        shrunk = "".join(shrink_pieces(list("".join(pieces)), fails, budget))
+        if shrunk == source:
+            break
+        source = shrunk
+    return source
+
+class Mismatch: # A backend that did not behave like the reference on a test case
+    def __init__(self, case, backend, source, difference, reproducer):
+        self.case = case
+        self.backend = backend # "lexer NAME" or "parser NAME"
+        self.source = source
+        self.difference = difference # Description of the first difference on the reproducer
+        self.reproducer = reproducer # Shrunk source
+
+    def __str__(self):
+        return f"case {self.case}: {self.backend}: {self.difference}\n    reproducer: {self.reproducer!r}"
+
+def check_source(source, case=0, lexers=None, parsers=None, trace=syntax.TRACE_FULL, recover=False, reduce=True):
+    # Run the selected backends (default: all) on source. Returns a list of Mismatches.
+    lexers = list(LEXERS) if lexers is None else lexers
+    parsers = list(PARSERS) if parsers is None else parsers
+    mismatches = []
+    expected_tokens = reference_tokens(source)
+    for name in lexers:
+        difference = lexer_difference(source, name, expected_tokens)
+        if difference is not None:
+            mismatches.append(found_mismatch(case, f"lexer {name}", source, difference, reduce,
+                                             lambda text, name=name: lexer_difference(text, name)))
+    expected_parse = reference_parse(source, trace, recover)
+    for name in parsers:
+        if recover and not PARSERS[name][1]:
+            continue
+        difference = parser_difference(source, name, trace, recover, expected_parse)
+        if difference is not None:
+            mismatches.append(found_mismatch(case, f"parser {name}", source, difference, reduce,
+                                             lambda text, name=name: parser_difference(text, name, trace, recover)))
+    return mismatches
+
+def found_mismatch(case, backend, source, difference, reduce, difference_of):
+    # A Mismatch, with the source shrunk by difference_of (text -> description or None) when reduce is set
+    reproducer = source
+    if reduce:
+        reproducer = shrink(source, lambda text: difference_of(text) is not None)
+        difference = difference_of(reproducer) or difference
+    return Mismatch(case, backend, source, difference, reproducer)
+
+def run_cases(cases=DEFAULT_CASES, seed=0, broken=DEFAULT_BROKEN, lexers=None, parsers=None,
+              trace=syntax.TRACE_FULL, recover=False, reduce=True, report=None):
+    # Check cases generated test cases. report (if given) is called with each Mismatch as it is
+    # found. Returns the list of Mismatches.
+    mismatches = []
+    for case in range(cases):
+        source = generate_case(random.Random(seed * 1000003 + case), broken)
+        for mismatch in check_source(source, case, lexers, parsers, trace, recover, reduce):
+            mismatches.append(mismatch)
+            if report is not None:
+                report(mismatch)
+    return mismatches
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Compare every lexer and parser backend with the reference on generated RAT24F sources.")
+    arguments.add_argument("--cases", type=int, default=DEFAULT_CASES, help=f"test cases to run (default: {DEFAULT_CASES})")
+    arguments.add_argument("--seed", type=int, default=0, help="seed of the test cases (default: 0)")
+    arguments.add_argument("--broken", type=float, default=DEFAULT_BROKEN,
+                           help=f"fraction of the cases broken on purpose (default: {DEFAULT_BROKEN})")
+    arguments.add_argument("--lexers", nargs="*", default=None, help=f"lexer backends to check (default: all of {', '.join(LEXERS)})")
+    arguments.add_argument("--parsers", nargs="*", default=None, help="parser backends to check (default: all)")
+    arguments.add_argument("--trace", choices=("productions", "full"), default="full", help="trace level compared (default: full)")
+    arguments.add_argument("--recover", action="store_true", help="parse with error recovery (backends without it are skipped)")
+    arguments.add_argument("--parallel", action="store_true", help="also check the parallel lexer and parser (starts worker processes)")
+    arguments.add_argument("-j", "--jobs", type=int, default=2, help="worker processes of the parallel backends (default: 2)")
+    arguments.add_argument("--no-shrink", action="store_true", help="report mismatches without shrinking them")
+    arguments.add_argument("-o", "--output", help="directory to write each reproducer to")
+    return arguments
+
+def main(argv=None):
+    arguments = build_argument_parser()
+    args = arguments.parse_args(argv)
+    executor = None
+    if args.parallel:
+        if args.jobs < 2:
+            arguments.error("--jobs must be at least 2")
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        LEXERS["parallel"] = parallel_lexer_backend(executor, args.jobs)
+        PARSERS["parallel"] = (parallel_backend(executor, args.jobs), True)
+    for option, names, registry in (("--lexers", args.lexers, LEXERS), ("--parsers", args.parsers, PARSERS)):
+        unknown = [name for name in names or () if name not in registry]
+        if unknown:
+            arguments.error(f"{option}: unknown backend {', '.join(unknown)} (choose from {', '.join(registry)})")
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    def report(mismatch):
+        print(mismatch, flush=True)
+        if args.output:
+            filename = os.path.join(args.output, f"case{mismatch.case}-{mismatch.backend.replace(' ', '-')}.rat")
+            with open(filename, "w", encoding="utf-8", errors="surrogateescape", newline="") as output_file:
+                output_file.write(mismatch.reproducer)
+
+    try:
+        mismatches = run_cases(args.cases, args.seed, args.broken, args.lexers, args.parsers,
+                               batch.TRACE_LEVELS[args.trace], args.recover, not args.no_shrink, report)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    lexers = len(LEXERS) if args.lexers is None else len(args.lexers)
+    parsers = len(PARSERS) if args.parsers is None else len(args.parsers)
+    print(f"{args.cases} cases, {lexers} lexers, {parsers} parsers: {len(mismatches)} mismatches")
+    return EXIT_MISMATCH if mismatches else EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
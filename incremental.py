@@ -0,0 +1,527 @@
+"""Incremental Analysis - Compilers CPSC 323
+Description: Incremental re-lexing and re-parsing for editors. A program is kept as a list of
+top-level units: the program header, each function definition, the first '@' with the
+declarations, each statement of the main statement list and the final '@'. Every unit holds its
+tokens (positioned relative to the unit) and its part of the trace. After an edit, tokens are
+re-lexed from the last token that starts before the edit until the new tokens line up with the
+old ones again, and only the units holding changed tokens are re-parsed, until the parser reaches
+an unchanged unit in the state that unit was parsed in. The trace, errors and tokens are the same
+as analyzing the whole edited source with MyAssignment2.Parser.
+
+Usage:
+    analysis = incremental.analyze(source)
+    analysis = analysis.edit(offset, deleted_length, inserted_text)
+    analysis.errors, analysis.trace_lines(), analysis.records()
+"""
+
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain, islice
+from operator import itemgetter
+
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+from rat24f_grammar import grammar as rat24f_grammar
+
+# Parser states at the start of a top-level unit
+STATE_PROGRAM = "program" # Start of the input: writes the <Rat24F> production
+STATE_FUNCTIONS = "functions" # At a function definition
+STATE_MIDDLE = "middle" # At the first '@', followed by the declarations
+STATE_STATEMENTS = "statements" # At a statement of the main statement list
+STATE_END = "end" # At the final '@'
+
+# Trace lines written between units (see Parser.rat24f)
+RAT24F_TRACE = "\t" + rat24f_grammar.alternatives["<Rat24F>"][0].trace
+OPT_FUNCTIONS_TRACE = "\t" + rat24f_grammar.alternatives["<Opt Function Definitions>"][0].trace
+FUNCTIONS_TRACE = "\t" + rat24f_grammar.alternatives["<Function Definitions>"][0].trace
+STATEMENT_LIST_TRACE = "\t" + rat24f_grammar.alternatives["<Statement List>"][0].trace
+
+# Tokens per unit when a token sequence has not been parsed into units yet
+UNIT_CHUNK_TOKENS = 256
+
+# Most units in one block of a UnitList
+BLOCK_UNITS = 64
+
+# Characters classified at a time while re-lexing after an edit
+RELEX_CHUNK_SIZE = 1 << 12
+
+# Fields of a UnitList entry (unit, tokens, characters, newlines), and of the totals before a unit
+FIELD_UNITS = 0
+FIELD_TOKENS = 1
+FIELD_CHARS = 2
+FIELD_NEWLINES = 3
+
+# Record of an error found at the end of the input, where the parser is on the last token of the
+# source (which can belong to an earlier unit)
+END_OF_INPUT = "end of input"
+
+class Unit: # One top-level piece of the program
+    __slots__ = ("state", "tokens", "trace", "next_state", "valid", "error")
+
+    def __init__(self, state, tokens, trace=(), next_state=None, valid=False, error=None):
+        self.state = state # Parser state the unit starts in (None if unknown)
+        self.tokens = tokens # Token records relative to the unit (see relative_records)
+        self.trace = trace # Trace lines written while parsing the unit
+        self.next_state = next_state # State after the unit, None once the program is complete
+        self.valid = valid # False when the tokens (or the one after them) changed since parsing
+        self.error = error # (message, relative record of the token or END_OF_INPUT) if parsing failed in the unit
+
+def relative_records(records, offset, line, column):
+    # Token records made relative to a unit starting at (offset, line, column): offsets and lines are
+    # differences, and so are columns on the unit's first line
+    return tuple((kind, lexeme, token_offset - offset, token_line - line,
+                  token_column - column if token_line == line else token_column)
+                 for kind, lexeme, token_offset, token_line, token_column in records)
+
+def absolute_records(tokens, offset, line, column): # Inverse of relative_records
+    for kind, lexeme, token_offset, token_line, token_column in tokens:
+        yield (kind, lexeme, offset + token_offset, line + token_line,
+               column + token_column if token_line == 0 else token_column)
+
+def step(parser, state):
+    # Parse the unit that starts in state and return the state after it. Together the states
+    # follow Parser.rat24f: header, functions, '@' and declarations, statements, '@'.
+    if state == STATE_PROGRAM:
+        parser.write_output(RAT24F_TRACE)
+        if parser.lexeme == "function":
+            parser.write_output(OPT_FUNCTIONS_TRACE)
+            parser.write_output(FUNCTIONS_TRACE)
+            return STATE_FUNCTIONS
+        return STATE_MIDDLE
+    if state == STATE_FUNCTIONS:
+        parser.function()
+        return STATE_FUNCTIONS if parser.lexeme == "function" else STATE_MIDDLE
+    if state == STATE_MIDDLE:
+        parser.match_end_marker()
+        parser.opt_declaration_list()
+        parser.write_output(STATEMENT_LIST_TRACE)
+        return STATE_STATEMENTS
+    if state == STATE_STATEMENTS:
+        parser.statement()
+        return STATE_STATEMENTS if parser.kind in (syntax.IDENTIFIER, syntax.KEYWORD) else STATE_END
+    parser.match_end_marker()
+    return None
+
+"""
+    The units of an analysis as (unit, tokens, characters, newlines) entries: a unit's span of
+    characters runs from its start to the next unit's start, so the spans add up to the whole
+    source. Entries are kept in blocks of at most BLOCK_UNITS with the totals of each block, so
+    finding a unit by number, token index or character offset costs a bisection over the blocks
+    and a walk through one block, and replacing a run of units only rebuilds the blocks it
+    touches. Blocks are never changed once built, so a copy shares them with the original.
+"""
+class UnitList:
+    def __init__(self):
+        self.blocks = [] # Tuples of entries
+        self.totals = [[], [], [], []] # Per block, the sum of each field (FIELD_UNITS counts entries)
+        self.starts = None # Per field, the totals before each block (rebuilt after a replace)
+
+    def copy(self):
+        result = UnitList()
+        result.blocks = list(self.blocks)
+        result.totals = [list(totals) for totals in self.totals]
+        result.starts = self.starts
+        return result
+
+    def __len__(self):
+        return self.block_starts()[FIELD_UNITS][-1]
+
+    def block_starts(self):
+        if self.starts is None:
+            self.starts = [list(accumulate(totals, initial=0)) for totals in self.totals]
+        return self.starts
+
+    def seek(self, field, value):
+        # (block, position in the block, totals before) of the last unit (or the end of the list)
+        # whose start, counted in field, is at most value
+        starts = self.block_starts()
+        b = min(max(bisect_right(starts[field], value) - 1, 0), len(self.blocks) - 1)
+        if b < 0:
+            return 0, 0, [0, 0, 0, 0]
+        before = [field_starts[b] for field_starts in starts]
+        i = 0
+        for _, size, span, newlines in self.blocks[b]:
+            if before[field] + (1 if field == FIELD_UNITS else (size, span, newlines)[field - 1]) > value:
+                break
+            before[FIELD_UNITS] += 1
+            before[FIELD_TOKENS] += size
+            before[FIELD_CHARS] += span
+            before[FIELD_NEWLINES] += newlines
+            i += 1
+        return b, i, before
+
+    def find(self, field, value): # (unit, totals before it) of the last unit starting at or before value
+        _, _, before = self.seek(field, value)
+        return before[FIELD_UNITS], before
+
+    def entry(self, u): # (entry of unit u or None at the end, totals before it)
+        b, i, before = self.seek(FIELD_UNITS, u)
+        block = self.blocks[b] if self.blocks else ()
+        return (block[i] if i < len(block) else None), before
+
+    def entries(self, u=0): # The entries from unit u to the end
+        if not self.blocks:
+            return iter(())
+        b, i, _ = self.seek(FIELD_UNITS, u)
+        return chain(islice(self.blocks[b], i, None), chain.from_iterable(islice(self.blocks, b + 1, None)))
+
+    def replace(self, k, q, entries):
+        # Replace the entries of units k .. q - 1 with entries
+        entries = list(entries)
+        if not self.blocks:
+            first, last, merged = 0, 0, entries
+        else:
+            first, i, _ = self.seek(FIELD_UNITS, k)
+            last, j, _ = self.seek(FIELD_UNITS, q)
+            merged = list(self.blocks[first][:i]) + entries + list(self.blocks[last][j:])
+            last += 1
+            if len(merged) < BLOCK_UNITS // 2 and last < len(self.blocks): # Keep blocks from getting small
+                merged += self.blocks[last]
+                last += 1
+        count = -(-len(merged) // BLOCK_UNITS)
+        blocks = [tuple(merged[n * len(merged) // count:(n + 1) * len(merged) // count]) for n in range(count)]
+        self.blocks[first:last] = blocks
+        self.totals[FIELD_UNITS][first:last] = [len(block) for block in blocks]
+        for field in (FIELD_TOKENS, FIELD_CHARS, FIELD_NEWLINES):
+            self.totals[field][first:last] = [sum(map(itemgetter(field), block)) for block in blocks]
+        self.starts = None
+
+class IncrementalAnalysis:
+    """
+        Result of analyzing a source string, which edit() turns into the result for the edited
+        source. Results are not changed by edit(), so older ones stay usable.
+        units is a UnitList of the units with their token counts, spans and newline counts.
+        Units 0 .. end_unit are the parse of the program: end_unit is the unit with the final '@'
+        or the one where parsing failed. Later units only hold tokens.
+    """
+    def __init__(self, source, trace=syntax.TRACE_FULL):
+        self.source = source
+        self.trace = trace
+        self.units = UnitList()
+        self.total = 0 # Number of tokens
+        self.end_unit = 0
+        self.stats = {"relexed_tokens": 0, "reparsed_units": 0, "reparsed_tokens": 0}
+
+    def copy(self, source):
+        result = IncrementalAnalysis(source, self.trace)
+        result.units = self.units.copy()
+        result.total = self.total
+        result.end_unit = self.end_unit
+        return result
+
+    def column_at(self, offset): # Column of a character offset in the source
+        return offset - self.source.rfind("\n", 0, offset)
+
+    def unit_base(self, u): # (offset, line, column) of the start of unit u
+        _, before = self.units.entry(u)
+        offset = before[FIELD_CHARS]
+        return offset, 1 + before[FIELD_NEWLINES], self.column_at(offset)
+
+    def records_from(self, u, index=0, source=None):
+        # Absolute token records from token index of unit u to the end (positions in source,
+        # which defaults to this result's source)
+        source = self.source if source is None else source
+        offset, line, _ = self.unit_base(u)
+        for unit, _, span, newlines in self.units.entries(u):
+            if unit.tokens:
+                column = offset - source.rfind("\n", 0, offset)
+                yield from absolute_records(unit.tokens[index:], offset, line, column)
+            index = 0
+            offset += span
+            line += newlines
+
+    def records(self): # Every token as a (kind, lexeme, offset, line, column) record
+        return self.records_from(0)
+
+    def record_at(self, index): # Absolute record of one token
+        u, first = self.locate(index)
+        return next(self.records_from(u, index - first))
+
+    def trace_lines(self): # The trace of the whole parse
+        units = islice(self.units.entries(), self.end_unit + 1)
+        return list(chain.from_iterable(entry[0].trace for entry in units))
+
+    @property
+    def errors(self): # The syntax error as a list of ParseErrors, like Parser.errors
+        (unit, _, _, _), _ = self.units.entry(self.end_unit)
+        if unit.error is None:
+            return []
+        message, record = unit.error
+        if record is None:
+            return [syntax.ParseError(message)]
+        if record == END_OF_INPUT: # At the last token of the source, wherever its unit is
+            _, _, _, line, column = self.record_at(self.total - 1)
+        else:
+            _, _, _, line, column = next(absolute_records((record,), *self.unit_base(self.end_unit)))
+        return [syntax.ParseError(message, line, column)]
+
+    def load(self, records):
+        # Hold the records of a whole source as unparsed units of UNIT_CHUNK_TOKENS tokens
+        entries = []
+        start = 0
+        line = column = 1
+        for first in range(0, len(records), UNIT_CHUNK_TOKENS):
+            chunk = records[first:first + UNIT_CHUNK_TOKENS]
+            end = records[first + UNIT_CHUNK_TOKENS][2] if first + UNIT_CHUNK_TOKENS < len(records) else len(self.source)
+            entries.append((Unit(None, relative_records(chunk, start, line, column)), len(chunk), end - start,
+                            self.source.count("\n", start, end)))
+            if end < len(self.source):
+                start, line, column = end, records[first + UNIT_CHUNK_TOKENS][3], records[first + UNIT_CHUNK_TOKENS][4]
+        self.units.replace(0, len(self.units), entries)
+        self.total = len(records)
+
+    def settle(self, k, state, chain_end=None, region_end=None):
+        # Follow the parse from unit k, entered in state, through valid units and re-parse where
+        # it breaks, until the program is complete or fails. If the previous parse ran through
+        # unit chain_end and nothing changed from unit region_end on, reaching a unit in between
+        # means the rest of the parse is unchanged.
+        entries = None # The entries from unit k on, while following valid units
+        while True:
+            if chain_end is not None and region_end <= k <= chain_end:
+                self.end_unit = chain_end
+                return
+            if entries is None:
+                entries = self.units.entries(k)
+            entry = next(entries, None)
+            unit = entry[0] if entry is not None else None
+            if unit is not None and unit.valid and unit.state == state:
+                if unit.error is not None or unit.next_state is None:
+                    self.end_unit = k
+                    return
+                state = unit.next_state
+                k += 1
+                continue
+            count = len(self.units)
+            resync = self.walk(k, state)
+            if resync is None:
+                return
+            if chain_end is not None:
+                chain_end += len(self.units) - count
+                region_end += len(self.units) - count
+            k = resync
+            entries = self.units.entries(k)
+            state = self.units.entry(k)[0][0].state
+
+    def walk(self, k, state):
+        # Re-parse from unit k, entered in state, one unit at a time. Returns the index of the
+        # valid unit the parser reached in the state it was parsed in, or None when the program
+        # was completed or failed (end_unit is then set). The units passed are replaced.
+        source = self.source
+        _, before = self.units.entry(k)
+        start_index, start_offset, start_line = before[FIELD_TOKENS], before[FIELD_CHARS], 1 + before[FIELD_NEWLINES]
+        records = [] # Tokens read by the parser, from unit k on
+
+        def read():
+            for record in self.records_from(k):
+                records.append(record)
+                yield record
+
+        # With no tokens left, the parser sits at the end of the input on the last token
+        skip = 1 if start_index == self.total else 0
+        tokens = read()
+        if skip:
+            tokens = chain([self.record_at(self.total - 1)], tokens)
+        collector = syntax.TraceBuffer() # One list of lines for all units
+        parser = syntax.Parser(tokens, collector, self.trace)
+        if skip:
+            parser.advance()
+
+        parsed = [] # (state, first record, end record, trace lines, next state, error)
+        q, q_index, q_offset, q_line = k, start_index, start_offset, start_line # First unit not passed yet
+        later = self.units.entries(k)
+        following = next(later, None) # Entry of unit q
+        passed_size = 0 # Tokens of unit q - 1
+        resync = False
+        while True:
+            first = parser.current_index - skip
+            trace_start = len(collector.lines)
+            try:
+                next_state = step(parser, state)
+            except SyntaxError as e:
+                end = parser.current_index - skip + (0 if parser.at_end else 1)
+                parsed.append((state, first, end, collector.lines[trace_start:], None,
+                               (str(e), END_OF_INPUT if parser.at_end else parser.current)))
+                break
+            end = parser.current_index - skip
+            parsed.append((state, first, end, collector.lines[trace_start:], next_state, None))
+            while following is not None and q_index < start_index + end:
+                _, passed_size, span, newlines = following
+                q_index += passed_size
+                q_offset += span
+                q_line += newlines
+                q += 1
+                following = next(later, None)
+            if next_state is None:
+                break
+            # A unit without tokens is parsed on the lookahead of the units before it, so the parse
+            # only rejoins the old one at a unit with tokens
+            if (following is not None and q_index == start_index + end and following[1]
+                    and following[0].valid and following[0].state == next_state):
+                resync = True
+                break
+            state = next_state
+
+        # Tokens of the last unit passed that lie beyond the parse are kept as an unparsed unit
+        end = start_index + parsed[-1][2]
+        while following is not None and q_index < end:
+            _, passed_size, span, newlines = following
+            q_index += passed_size
+            q_offset += span
+            q_line += newlines
+            q += 1
+            following = next(later, None)
+        tail = []
+        if q_index > end:
+            tail = list(islice(self.records_from(q - 1, end - (q_index - passed_size)), q_index - end))
+        region_end = tail[0][2] if tail else q_offset
+
+        # Build the new units; the first starts where unit k did, the others at their first token
+        new_entries = []
+        starts = []
+        for unit_state, first, last, _, _, _ in parsed:
+            if not starts:
+                starts.append(start_offset)
+            elif last > first:
+                starts.append(records[first][2])
+            else:
+                starts.append(None)
+        starts.append(region_end)
+        for i in range(len(starts) - 2, -1, -1): # A unit without tokens starts where the next one does
+            if starts[i] is None:
+                starts[i] = starts[i + 1]
+        line = start_line
+        for (unit_state, first, last, lines, next_state, error), start, stop in zip(parsed, starts, starts[1:]):
+            column = self.column_at(start)
+            if error is not None and error[1] != END_OF_INPUT:
+                message, record = error
+                error = (message, relative_records((record,), start, line, column)[0])
+            newlines = source.count("\n", start, stop)
+            new_entries.append((Unit(unit_state, relative_records(records[first:last], start, line, column),
+                                     tuple(lines), next_state, True, error), last - first, stop - start, newlines))
+            line += newlines
+        if tail:
+            new_entries.append((Unit(None, relative_records(tail, region_end, tail[0][3], tail[0][4])),
+                                len(tail), q_offset - region_end, q_line - line))
+
+        self.units.replace(k, q, new_entries)
+        self.stats["reparsed_units"] += len(parsed)
+        self.stats["reparsed_tokens"] += sum(entry[1] for entry in new_entries[:len(parsed)])
+        if resync:
+            return k + len(new_entries)
+        self.end_unit = k + len(parsed) - 1
+        return None
+
+    def locate(self, index): # (unit, index of its first token) for a token index
+        u, before = self.units.find(FIELD_TOKENS, index)
+        entry, before = self.units.entry(u)
+        while entry is None or not entry[1]: # Skip units without tokens that start at the same index
+            u -= 1
+            entry, before = self.units.entry(u)
+        return u, before[FIELD_TOKENS]
+
+    def edit(self, offset, deleted, inserted):
+        # Result for the source with deleted characters at offset replaced by inserted
+        old_source = self.source
+        if offset < 0 or deleted < 0 or offset + deleted > len(old_source):
+            raise ValueError(f"Edit outside the source: offset {offset}, deleted {deleted}")
+        source = old_source[:offset] + inserted + old_source[offset + deleted:]
+        if not self.total:
+            return analyze(source, self.trace)
+        units = self.units
+
+        # Re-lex from the last token that starts before the edit: tokens are never inside comments,
+        # and the edit may extend that token
+        ua, _ = units.find(FIELD_CHARS, offset - 1)
+        ua = min(ua, len(units) - 1)
+        restart = None
+        while ua >= 0:
+            (unit, _, _, _), before = units.entry(ua)
+            if unit.tokens:
+                i = bisect_left(unit.tokens, offset - before[FIELD_CHARS], key=itemgetter(2)) - 1
+                if i >= 0:
+                    restart = before[FIELD_TOKENS] + i
+                    break
+            ua -= 1
+        if restart is None:
+            ua, restart = 0, 0
+            position = (0, 1, 1)
+            ua_start = 0
+        else:
+            ua_start = before[FIELD_TOKENS]
+            _, _, position_offset, position_line, position_column = next(self.records_from(ua, restart - ua_start))
+            position = (position_offset, position_line, position_column)
+        # The unit before also changes if its lookahead (the first token of ua) does
+        r, r_start = ua, units.entry(ua)[1]
+        while r > 0 and r_start[FIELD_TOKENS] == restart:
+            r -= 1
+            _, r_start = units.entry(r)
+
+        # New tokens until one starts, after the inserted text, where an old token started
+        inserted_end = offset + len(inserted)
+        delta = len(inserted) - deleted
+        relexed = []
+        old_tokens = self.records_from(ua, restart - ua_start)
+        old_index = restart
+        old_record = next(old_tokens, None)
+        resync_index = self.total
+        restart_offset, restart_line, restart_column = position
+        for record in lexical.scan(source, True, restart_offset, restart_line, restart_offset - restart_column + 1, RELEX_CHUNK_SIZE):
+            if record[2] >= inserted_end:
+                target = record[2] - delta
+                while old_record is not None and old_record[2] < target:
+                    old_index += 1
+                    old_record = next(old_tokens, None)
+                if old_record is not None and old_record[2] == target:
+                    resync_index = old_index
+                    break
+            relexed.append(record)
+
+        # Units r .. ub hold every changed token and character; they become one unparsed unit
+        ub = units.find(FIELD_TOKENS, resync_index - 1)[0] if resync_index > restart else ua
+        if deleted:
+            ub = max(ub, units.find(FIELD_CHARS, offset + deleted - 1)[0])
+        ub = min(max(ub, ua), len(units) - 1)
+        _, ub_end = units.entry(ub + 1)
+        line_delta = inserted.count("\n") - old_source.count("\n", offset, offset + deleted)
+        old_end_column = offset + deleted - old_source.rfind("\n", 0, offset + deleted)
+        new_end_column = inserted_end - source.rfind("\n", 0, inserted_end)
+
+        def shifted(records): # Old records after the edit, in new positions
+            same_line = True
+            for kind, lexeme, token_offset, token_line, token_column in records:
+                if same_line and old_source.find("\n", offset + deleted, token_offset) >= 0:
+                    same_line = False
+                yield (kind, lexeme, token_offset + delta, token_line + line_delta,
+                       token_column + new_end_column - old_end_column if same_line else token_column)
+
+        first_token = r_start[FIELD_TOKENS]
+        before = list(islice(self.records_from(r), restart - first_token))
+        after = shifted(islice(self.records_from(r, 0), resync_index - first_token, ub_end[FIELD_TOKENS] - first_token))
+        merged = before + relexed + list(after)
+        start = r_start[FIELD_CHARS]
+        start_line = 1 + r_start[FIELD_NEWLINES]
+        result = self.copy(source)
+        merged_unit = Unit(units.entry(r)[0][0].state, relative_records(merged, start, start_line, result.column_at(start)))
+        result.units.replace(r, ub + 1, [(merged_unit, len(merged), ub_end[FIELD_CHARS] - start + delta,
+                                          ub_end[FIELD_NEWLINES] - r_start[FIELD_NEWLINES] + line_delta)])
+        result.total = self.total - (resync_index - restart) + len(relexed)
+        result.stats["relexed_tokens"] = len(relexed)
+        if not result.total:
+            return analyze(source, self.trace)
+
+        # Re-parse, unless the parse ended before the changed units
+        if self.end_unit >= r:
+            chain_end = self.end_unit - (ub - r) if self.end_unit > ub else None
+            state = units.entry(r - 1)[0][0].next_state if r > 0 else STATE_PROGRAM
+            result.settle(r, state, chain_end, r + 1)
+        return result
+
+def analyze(source, trace=syntax.TRACE_FULL): # Lex and parse a source string into an IncrementalAnalysis
+    analysis = IncrementalAnalysis(source, trace)
+    records = list(lexical.scan(source))
+    if not records:
+        analysis.units.replace(0, 0, [(Unit(STATE_PROGRAM, (), error=("No tokens to parse", None)), 0, len(source),
+                                       source.count("\n"))])
+        return analysis
+    analysis.load(records)
+    analysis.settle(0, STATE_PROGRAM)
+    return analysis
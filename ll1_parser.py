@@ -0,0 +1,174 @@
+"""LL(1) Parser - Compilers CPSC 323
+Description: Table-driven, non-recursive parser for RAT24F. The parse table is generated from
+the grammar in rat24f_grammar, and the parser keeps its own stack of grammar symbols instead of
+calling one Python method per nonterminal, so nesting depth is limited only by memory.
+It writes the same trace and raises the same errors as MyAssignment2.Parser.
+"""
+
+from itertools import islice
+
+import MyAssignment2 as syntax
+from rat24f_grammar import grammar as rat24f_grammar
+
+kind_names = syntax.kind_names
+
+class ParseTable:
+    """
+        The grammar compiled into integer form for the parsing loop:
+        - symbols 0 .. len(nonterminals) - 1 are nonterminals, the rest are terminals;
+        - terminal_kinds[symbol - first_terminal] is the kind code a terminal matches;
+        - a lookahead token is a column: its kind code, or for a lexeme the grammar names (a keyword,
+          separator or operator) the column lexeme_columns gives it, so that one dictionary
+          lookup per token replaces a lookup by lexeme and another by kind per expansion;
+        - actions[nonterminal * width + column] is the production number for a lookahead, or -1
+          when there is none (a syntax error); a lexeme's column falls back to its kind's entry,
+          and then to the nonterminal's default production;
+        - productions[number] is (symbols to push, in reverse order, trace line or None);
+        - expansions[nonterminal * width + column] is what expanding the nonterminal comes to
+          before the lookahead is matched: every production chosen for the same lookahead is
+          applied in one step, until a terminal is on top or nothing was pushed. It is (trace
+          lines, symbols to push, nonterminal that has no production for the lookahead or None,
+          kind of the terminal on top, which is matched next, or None); the terminal itself is
+          not pushed.
+    """
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.nonterminals = list(grammar.nonterminals)
+        symbol_ids = {name: index for index, name in enumerate(self.nonterminals)}
+        self.first_terminal = len(self.nonterminals)
+        self.terminal_kinds = []
+        self.terminal_names = []
+
+        def symbol_id(symbol):
+            if symbol not in symbol_ids:
+                symbol_ids[symbol] = self.first_terminal + len(self.terminal_kinds)
+                self.terminal_kinds.append(grammar.terminal_kind(symbol))
+                self.terminal_names.append(symbol)
+            return symbol_ids[symbol]
+
+        production_ids = {}
+        self.productions = []
+        for production in grammar.productions:
+            production_ids[id(production)] = len(self.productions)
+            pushed = tuple(symbol_id(symbol) for symbol in reversed(production.rhs))
+            self.productions.append((pushed, production.trace))
+
+        # Lexemes get the columns after the kind codes, each with the kind the lexer gives it
+        lexemes = sorted({key for name in self.nonterminals for key in grammar.table[name] if isinstance(key, str)})
+        self.lexeme_columns = {lexeme: len(kind_names) + index for index, lexeme in enumerate(lexemes)}
+        lexeme_kinds = [grammar.terminal_kind(f"'{lexeme}'") for lexeme in lexemes]
+        self.width = len(kind_names) + len(lexemes)
+        self.actions = []
+        for name in self.nonterminals:
+            row = {key: production_ids[id(production)] for key, production in grammar.table[name].items()}
+            default = production_ids[id(grammar.defaults[name])] if grammar.defaults[name] is not None else -1
+            by_kind = [row.get(kind, default) for kind in range(len(kind_names))]
+            self.actions.extend(by_kind)
+            self.actions.extend(row.get(lexeme, by_kind[kind]) for lexeme, kind in zip(lexemes, lexeme_kinds))
+        self.errors = [grammar.errors.get(name) for name in self.nonterminals]
+        self.start = symbol_ids[grammar.start]
+        self.expected_kinds = [None] * self.first_terminal + self.terminal_kinds # Kind each terminal matches, by symbol
+        self.expansions = [self.expand(nonterminal, column) for nonterminal in range(len(self.nonterminals))
+                           for column in range(self.width)]
+
+    def expand(self, nonterminal, column): # The expansions entry of a nonterminal and lookahead column
+        lines = []
+        stack = [nonterminal]
+        while stack and stack[-1] < self.first_terminal:
+            symbol = stack.pop()
+            number = self.actions[symbol * self.width + column]
+            if number < 0:
+                return tuple(lines), (), symbol, None
+            pushed, trace_line = self.productions[number]
+            if trace_line is not None:
+                lines.append("\t" + trace_line)
+            stack.extend(pushed)
+        expected_kind = self.expected_kinds[stack.pop()] if stack else None
+        return tuple(lines), tuple(stack), None, expected_kind
+
+# The RAT24F parse table, built once
+parse_table = ParseTable(rat24f_grammar)
+
+class TableParser(syntax.Parser):
+    """
+        Drop-in replacement for MyAssignment2.Parser (same tokens, trace levels and output)
+        that parses with an explicit stack and the LL(1) parse table. It stops at the first
+        syntax error; panic-mode recovery is only done by the recursive parser, so asking for
+        it (recover=True) raises ValueError.
+    """
+    def __init__(self, tokens, output_file=None, trace=syntax.TRACE_FULL, recover=False, max_errors=syntax.MAX_ERRORS,
+                 table=parse_table):
+        if recover:
+            raise ValueError("Error recovery is not supported by TableParser")
+        super().__init__(tokens, output_file, trace, recover, max_errors)
+        self.table = table
+
+    def rat24f(self): # Parse the whole program from the start symbol
+        self.run(self.table.start)
+
+    def run(self, start_symbol): # Expand start_symbol with the parse table until its stack is empty
+        table = self.table
+        expected_kinds = table.expected_kinds
+        expansions = table.expansions
+        width = table.width
+        lexeme_columns = table.lexeme_columns
+        trace = self.trace
+        trace_tokens = self.trace_tokens
+        write_output = self.write_output
+        lookahead = self.lookahead
+        token_source = self.token_source
+
+        # The current token is kept in locals, and stored back in the parser's attributes (which
+        # error() reads) when the loop ends or fails
+        current, index, at_end = self.current, self.current_index, self.at_end
+        kind, lexeme = current[0], current[1]
+        column = lexeme_columns.get(lexeme, kind) # Lookahead column of the current token
+        stack = [start_symbol]
+        pop = stack.pop
+        extend = stack.extend
+        while stack:
+            symbol = pop()
+            expected_kind = expected_kinds[symbol]
+            if expected_kind is None: # Nonterminal: apply every production the lookahead chooses before it is matched
+                lines, pushed, failed, expected_kind = expansions[symbol * width + column]
+                if trace:
+                    for line in lines:
+                        write_output(line)
+                if failed is not None:
+                    raise self.token_error(table.errors[failed].format(lexeme=lexeme), current, index, at_end)
+                extend(pushed)
+                if expected_kind is None: # Nothing to match yet
+                    continue
+
+            # Terminal: match the current token by kind
+            if at_end:
+                raise self.token_error(f"Unexpected end of input, expected {kind_names[expected_kind]}",
+                                       current, index, at_end)
+            if kind != expected_kind:
+                raise self.token_error(f"Unexpected token {kind_names[kind]}, expected {kind_names[expected_kind]}, lexeme: {lexeme}",
+                                       current, index, at_end)
+            if trace_tokens:
+                write_output(f"Token: {kind_names[kind]:<15} Lexeme: {lexeme:<20}")
+            # advance(), inlined
+            index += 1
+            if len(lookahead) == 1:
+                lookahead.extend(islice(token_source, syntax.LOOKAHEAD_SIZE))
+            if len(lookahead) > 1:
+                lookahead.popleft()
+                current = lookahead[0]
+                kind, lexeme = current[0], current[1]
+                column = lexeme_columns.get(lexeme, kind)
+            else:
+                at_end = True
+        self.store_token(current, index, at_end)
+
+    def store_token(self, current, index, at_end): # Set the current token, as advance() leaves it
+        self.current = current
+        self.current_index = index
+        self.at_end = at_end
+        self.kind = current[0]
+        self.lexeme = current[1]
+
+    def token_error(self, message, current, index, at_end): # store_token, then error()
+        self.store_token(current, index, at_end)
+        return self.error(message)
@@ -0,0 +1,238 @@
+"""Parallel Lexer - Compilers CPSC 323
+Description: Lexes large sources on several cores. The source is cut into chunks at line
+boundaries, so no token is ever split (tokens never contain a newline), and the chunks are lexed
+in a pool of worker processes, each as if it started outside any comment. Workers lexing a file
+map it themselves, so only the positions of their chunk are sent to them.
+
+The main process joins the chunks in order into one TokenStream. A chunk that really starts
+inside a [* *] comment left open by the chunks before it is repaired: the main process scans it
+again from the end of that comment until the scan reaches a token the worker also found, from
+where the worker's tokens are the right ones (a scan that reaches the start of a token is in the
+same state whatever came before). The result is the TokenStream that
+Assignment1.TokenStream.from_buffer builds, array for array and with the same string table.
+
+Usage: python parallel_lexer.py FILE [FILE ...] [-j JOBS] [--chunk-size BYTES] [--check]
+"""
+
+import argparse
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import os
+import sys
+import time
+
+import Assignment1 as lexical
+import vector_lexer
+
+MIN_CHUNK_SIZE = 1 << 20 # Sources up to this size are lexed in one piece
+CHUNKS_PER_JOB = 4 # The source is cut into about this many chunks per worker
+REPAIR_CHUNK_SIZE = 1 << 12 # Chunk size of the repair scans, which usually stop after a few tokens
+
+def markers(buffer): # Newline, comment opening and comment closing in the type of buffer
+    return ("\n", "[*", "*]") if isinstance(buffer, str) else (b"\n", b"[*", b"*]")
+
+def count_newlines(buffer, start, end):
+    if isinstance(buffer, mmap.mmap): # mmap has no count()
+        return buffer[start:end].count(b"\n")
+    return buffer.count(markers(buffer)[0], start, end)
+
+def inside_comment(buffer, position, end):
+    # Whether a scan that is outside any comment at position and finds no token before end is
+    # inside an unterminated comment at end
+    _, comment_open, comment_close = markers(buffer)
+    while True:
+        opening = buffer.find(comment_open, position, end)
+        if opening < 0:
+            return False
+        closing = buffer.find(comment_close, opening + 2, end)
+        if closing < 0:
+            return True
+        position = closing + 2
+
+def chunk_bounds(buffer, chunk_size):
+    # (start, end) of consecutive chunks of about chunk_size covering buffer, cut after newlines
+    newline = markers(buffer)[0]
+    size = len(buffer)
+    bounds = []
+    start = 0
+    while start < size:
+        end = size
+        if start + chunk_size < size:
+            cut = buffer.find(newline, start + chunk_size - 1)
+            if cut >= 0:
+                end = cut + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+def lex_chunk(piece, start, line):
+    # Worker: lex piece, the chunk of a source that starts at offset start and line line, as if it
+    # started outside any comment. Returns the chunk's TokenStream (offsets in the whole source,
+    # source buffer left out so it is not sent back) and whether the chunk ends inside a comment.
+    stream = lexical.TokenStream(piece)
+    for _ in stream.capture(lexical.scan(piece, True, 0, line, 0)):
+        pass
+    last_end = stream.offsets[-1] + stream.lengths[-1] if len(stream) else 0
+    open_comment = inside_comment(piece, last_end, len(piece))
+    if start:
+        stream.offsets = array("Q", [offset + start for offset in stream.offsets])
+    stream.source = None
+    return stream, open_comment
+
+def lex_file_chunk(filename, start, end, line): # Worker: lex_chunk for bytes start..end of a file
+    with open(filename, "rb") as file:
+        buffer = lexical.map_file(file)
+    try:
+        piece = buffer[start:end]
+    finally:
+        if not isinstance(buffer, bytes):
+            buffer.close()
+    return lex_chunk(piece, start, line)
+
+def repair_chunk(stream, buffer, start, end, line, chunk):
+    # Append to stream the tokens of a chunk that starts inside a comment, scanning from the end of
+    # the comment until the scan meets one of the worker's tokens. Returns the index of that token
+    # in chunk (len(chunk) when there is none), or None when the chunk ends inside a comment.
+    newline, _, comment_close = markers(buffer)
+    closing = buffer.find(comment_close, start, end)
+    if closing < 0: # The whole chunk is inside the comment
+        return None
+    position = closing + 2
+    line += count_newlines(buffer, start, position)
+    line_start = buffer.rfind(newline, 0, position) + 1
+    offsets = chunk.offsets
+    for kind, lexeme, offset, line, column in lexical.scan(buffer, True, position, line, line_start, REPAIR_CHUNK_SIZE):
+        if offset >= end:
+            break
+        index = bisect_left(offsets, offset)
+        if index < len(offsets) and offsets[index] == offset:
+            return index
+        stream.append(kind, lexeme, offset, line, column)
+        position = offset + stream.lengths[-1]
+    return None if inside_comment(buffer, position, end) else len(chunk)
+
+def append_chunk(stream, chunk, first=0):
+    # Append the tokens of a worker's chunk from token first on, interning their lexemes in stream
+    if first >= len(chunk):
+        return
+    for name in ("kinds", "offsets", "lengths", "lines", "columns"):
+        values = getattr(chunk, name)
+        getattr(stream, name).extend(values[first:] if first else values)
+    strings = chunk.strings
+    if first: # Some of the chunk's strings may only be used by the tokens left out
+        intern = stream.intern
+        stream.symbols.extend(array("i", [intern(strings[symbol]) if symbol >= 0 else -1
+                                          for symbol in chunk.symbols[first:]]))
+        return
+    # The chunk's strings are in the order they first appear, so they are interned in that order
+    remap = [stream.intern(string) for string in strings]
+    if remap == list(range(len(remap))):
+        stream.symbols.extend(chunk.symbols)
+    else:
+        remap.append(-1) # Symbol -1 (lexeme in the source) stays -1
+        stream.symbols.extend(array("i", map(remap.__getitem__, chunk.symbols)))
+
+def lex_parallel(buffer, jobs=None, executor=None, chunk_size=None, filename=None):
+    # Lex a whole buffer (str, bytes or mmap) into a TokenStream, like TokenStream.from_buffer, with
+    # its chunks lexed on executor (or a new pool of jobs processes). When filename (the file that
+    # buffer maps) is given, workers read their chunks from it instead of being sent them.
+    jobs = jobs or os.cpu_count() or 1
+    size = len(buffer)
+    if chunk_size is None:
+        chunk_size = max(MIN_CHUNK_SIZE, -(-size // (jobs * CHUNKS_PER_JOB)))
+    if jobs < 2 or size <= chunk_size:
+        return lexical.TokenStream.from_buffer(buffer)
+
+    own_executor = None
+    if executor is None:
+        executor = own_executor = ProcessPoolExecutor(max_workers=jobs)
+    futures = []
+    try:
+        bounds = chunk_bounds(buffer, chunk_size)
+        lines = []
+        line = 1
+        for start, end in bounds:
+            lines.append(line)
+            if filename is not None:
+                futures.append(executor.submit(lex_file_chunk, filename, start, end, line))
+                line += count_newlines(buffer, start, end)
+            else:
+                piece = buffer[start:end]
+                futures.append(executor.submit(lex_chunk, piece, start, line))
+                line += piece.count(markers(piece)[0])
+
+        stream = lexical.TokenStream(buffer)
+        open_comment = False
+        for (start, end), line, future in zip(bounds, lines, futures):
+            chunk, chunk_open_comment = future.result()
+            first = 0
+            if open_comment:
+                first = repair_chunk(stream, buffer, start, end, line, chunk)
+                if first is None: # Still inside the comment at the end of the chunk
+                    continue
+                if first == len(chunk): # The repair scan found every token of the chunk
+                    open_comment = False
+                    continue
+            append_chunk(stream, chunk, first)
+            open_comment = chunk_open_comment
+        return stream
+    finally:
+        for future in futures:
+            future.cancel()
+        if own_executor is not None:
+            own_executor.shutdown()
+
+def lex_file_parallel(filename, jobs=None, executor=None, chunk_size=None):
+    # Memory-map a file and lex it with lex_parallel. The stream keeps the memory map open; call
+    # close() on it when done.
+    with open(filename, "rb") as file:
+        buffer = lexical.map_file(file)
+    try:
+        return lex_parallel(buffer, jobs, executor, chunk_size, filename)
+    except BaseException:
+        if not isinstance(buffer, bytes):
+            buffer.close()
+        raise
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Lex RAT24F programs in chunks on several cores.")
+    arguments.add_argument("files", nargs="+", help="programs to lex")
+    arguments.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: number of cores)")
+    arguments.add_argument("--chunk-size", type=int, default=None,
+                           help=f"bytes per chunk (default: the file split {CHUNKS_PER_JOB} ways per job, at least {MIN_CHUNK_SIZE})")
+    arguments.add_argument("--check", action="store_true", help="check the tokens against the scalar lexer")
+    return arguments
+
+def main(argv=None):
+    arguments = build_argument_parser()
+    args = arguments.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        arguments.error("--jobs must be at least 1")
+    if args.chunk_size is not None and args.chunk_size < 1:
+        arguments.error("--chunk-size must be at least 1")
+    jobs = args.jobs or os.cpu_count() or 1
+    status = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for filename in args.files:
+            started = time.perf_counter()
+            stream = lex_file_parallel(filename, jobs, executor, args.chunk_size)
+            elapsed = time.perf_counter() - started
+            try:
+                print(f"{filename}: {len(stream)} tokens in {elapsed:.3f} s ({jobs} jobs)")
+                if args.check:
+                    with open(filename, "rb") as file:
+                        expected = lexical.lex_file(file)
+                    try:
+                        if not vector_lexer.same_tokens(stream, expected):
+                            print(f"{filename}: tokens differ from the scalar lexer")
+                            status = 1
+                    finally:
+                        expected.close()
+            finally:
+                stream.close()
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
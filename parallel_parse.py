@@ -0,0 +1,328 @@
+"""Parallel Parser - Compilers CPSC 323
+Description: Lexes and parses the function definitions of a RAT24F program concurrently in a pool
+of worker processes. Every function before the first '@' is parsed on its own, so the source is
+cut before each 'function' keyword that a text search finds (no lexing is needed to find them),
+and batches of functions are sent to the workers as slices of the source. A worker lexes its
+slice, parses each function in it, and returns the tokens as well as the traces.
+
+The main process runs the ordinary Parser over the whole program at the same time, reading the
+workers' tokens instead of lexing the source again, except that when it reaches a function it
+takes the function's trace from its worker and skips over its tokens. The main process lexes
+only what no worker did: the text before the first function and after the functions, and any
+slice whose tokens are not those of one lexer run over the whole source (a slice that ends in
+the middle of a comment, or follows one), until its own lexer is back in step with the next slice.
+
+A worker's trace is only used when the function starts at exactly one of the planned boundaries
+and parsed without error up to the next one; otherwise (a syntax error, or a boundary that was
+not a function boundary after all) the main process parses that function itself, and takes the
+workers' traces again from the next function that starts at a planned boundary. The trace and
+the errors are therefore always those of a sequential parse.
+
+Usage: python parallel_parse.py FILE [-j JOBS] [--trace LEVEL] [--recover]
+"""
+
+import argparse
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+import os
+import sys
+
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+import batch
+
+MIN_PARALLEL_FUNCTIONS = 8 # Programs with fewer functions are parsed sequentially
+BATCHES_PER_JOB = 4 # Functions are sent in about this many batches per worker
+
+SENTINELS = {str: "\n@", bytes: b"\n@"} # Appended to a slice: lexed as a token unless the slice ends inside a comment
+
+def function_starts(buffer):
+    # Offsets of the 'function' keywords that may start the function definitions, and the offset of
+    # the first '@' (None when there is none), found by searching the text rather than by lexing it.
+    # Each is preceded by whitespace, so the text before it is a whole number of tokens unless it
+    # ends inside a comment; the workers and the main process check every boundary.
+    keyword, end_mark = ("function", "@") if isinstance(buffer, str) else (b"function", b"@")
+    end = buffer.find(end_mark)
+    while end > 0 and not buffer[end - 1:end].isspace():
+        end = buffer.find(end_mark, end + 1)
+    if end <= 0:
+        return [], None
+    starts = []
+    start = buffer.find(keyword, 0, end)
+    while start >= 0:
+        after = start + len(keyword)
+        if (start == 0 or buffer[start - 1:start].isspace()) and buffer[after:after + 1].isspace():
+            starts.append(start)
+        start = buffer.find(keyword, after, end)
+    return starts, end
+
+def plan_batches(starts, end, batches):
+    # Group consecutive functions into about batches groups of similar sizes.
+    # Returns lists of function numbers.
+    total = end - starts[0]
+    target = max(1, total // batches)
+    groups = [[]]
+    size = 0
+    for number, start in enumerate(starts):
+        if size >= target:
+            groups.append([])
+            size = 0
+        groups[-1].append(number)
+        size += (starts[number + 1] if number + 1 < len(starts) else end) - start
+    return groups
+
+def parse_functions(piece, start, line, line_start, function_offsets, trace):
+    # Worker: lex a slice of the source (found at offset start, on line line, which starts at offset
+    # line_start) holding consecutive function definitions that start at function_offsets, and
+    # parse each of them. Returns (tokens, clean, results):
+    # - tokens: (kinds, symbols, strings, offsets, lines, columns) of every token of the slice;
+    # - clean: whether the slice ended outside any comment, so that the tokens after it can be
+    #   lexed on their own;
+    # - results: (trace lines, token count) of each function, or None for a function that had an
+    #   error or did not end exactly where the next one starts.
+    records = list(lexical.scan(piece + SENTINELS[type(piece)], True, 0, line, line_start - start))
+    clean = bool(records) and records[-1][2] == len(piece) + 1
+    if clean:
+        records.pop()
+    string_ids = {}
+    tokens = (array("B", [record[0] for record in records]),
+              array("I", [string_ids.setdefault(record[1], len(string_ids)) for record in records]),
+              list(string_ids),
+              array("Q", [record[2] + start for record in records]),
+              array("I", [record[3] for record in records]),
+              array("I", [record[4] for record in records]))
+
+    # Token index where each function starts, or None when no 'function' keyword starts there
+    offsets = [record[2] for record in records]
+    indices = []
+    for offset in function_offsets:
+        index = bisect_left(offsets, offset - start)
+        found = index < len(records) and offsets[index] == offset - start and records[index][1] == "function"
+        indices.append(index if found else None)
+    indices.append(len(records) if clean else None)
+
+    results = []
+    for first, stop in zip(indices, indices[1:]):
+        if first is None or stop is None:
+            results.append(None)
+            continue
+        output = syntax.TraceBuffer()
+        parser = syntax.Parser(records[first:stop], output, trace)
+        try:
+            parser.function()
+        except SyntaxError:
+            results.append(None)
+            continue
+        if not parser.at_end: # Ended before the next 'function'
+            results.append(None)
+            continue
+        results.append((output.lines, stop - first))
+    return tokens, clean, results
+
+"""
+    The batches of functions sent to the workers, and the token records of the whole program put
+    together from the workers' tokens and the main process's own lexing. bounds holds the
+    (offset, line, line start) where each batch starts, and then where the functions end.
+"""
+class Batches:
+    def __init__(self, buffer, starts, end, groups, executor, trace):
+        self.buffer = buffer
+        self.bounds = []
+        self.futures = []
+        self.results = [None] * len(groups) # Each batch's function results, once its worker's result is taken
+        self.locations = {} # Offset of each function -> (batch number, position in the batch)
+        newline = "\n" if isinstance(buffer, str) else b"\n"
+        line = 1 + buffer[:starts[0]].count(newline)
+        for batch_number, group in enumerate(groups):
+            first, last = starts[group[0]], (starts[group[-1] + 1] if group[-1] + 1 < len(starts) else end)
+            line_start = buffer.rfind(newline, 0, first) + 1
+            self.bounds.append((first, line, line_start))
+            piece = buffer[first:last]
+            function_offsets = [starts[number] for number in group]
+            self.futures.append(executor.submit(parse_functions, piece, first, line, line_start, function_offsets,
+                                                trace))
+            for position, number in enumerate(group):
+                self.locations[starts[number]] = (batch_number, position)
+            line += piece.count(newline)
+        self.bounds.append((end, line, buffer.rfind(newline, 0, end) + 1))
+
+    def take(self, batch_number): # (tokens, clean) of a batch, waiting for its worker; None if the worker failed
+        future = self.futures[batch_number]
+        self.futures[batch_number] = None
+        try:
+            tokens, clean, self.results[batch_number] = future.result()
+        except Exception: # The worker failed
+            self.results[batch_number] = []
+            return None
+        return tokens, clean
+
+    def records(self):
+        # The (kind, lexeme, offset, line, column) record of every token of the program, the same as
+        # scan(buffer): a batch's tokens come from its worker when the lexer is known to start the
+        # batch's slice outside any token or comment, and from the main process's own scan otherwise,
+        # until a token of that scan starts exactly where a later batch does
+        return chain.from_iterable(self.pieces())
+
+    def pieces(self): # The iterables of records that records() chains
+        own = lexical.scan(self.buffer) if self.bounds[0][0] > 0 else None # Own scan, while not in step
+        for batch_number, (start, line, line_start) in enumerate(self.bounds):
+            if own is not None:
+                reached = [] # The first record of the own scan at or after start
+                yield self.before(own, start, reached)
+                if not reached:
+                    return
+                if reached[0][2] != start or batch_number == len(self.futures): # Not in step, or past the functions
+                    yield reached
+                    continue
+                own = None
+            if batch_number == len(self.futures):
+                own = lexical.scan(self.buffer, True, start, line, line_start)
+                break
+            taken = self.take(batch_number)
+            if taken is None or not taken[1]: # The next slice may start inside a comment
+                own = lexical.scan(self.buffer, True, start, line, line_start)
+                continue
+            kinds, symbols, strings, offsets, lines, columns = taken[0]
+            yield zip(kinds, map(strings.__getitem__, symbols), offsets, lines, columns)
+        if own is not None:
+            yield own
+
+    @staticmethod
+    def before(records, offset, reached): # Yields the records before offset, and appends the next one to reached
+        for record in records:
+            if record[2] >= offset:
+                reached.append(record)
+                return
+            yield record
+
+    def function(self, offset):
+        # (trace lines, token count) of the function starting at offset, or None if it cannot be used
+        location = self.locations.pop(offset, None)
+        if location is None:
+            return None
+        batch_number, position = location
+        if self.futures[batch_number] is not None: # Lexed by the main process; only the traces are needed
+            self.take(batch_number)
+        results = self.results[batch_number]
+        return results[position] if position < len(results) else None
+
+    def cancel(self): # Cancel the batches that are no longer needed
+        for future in self.futures:
+            if future is not None:
+                future.cancel()
+
+class SkeletonParser(syntax.Parser):
+    """
+        The Parser run by the main process: it parses everything but the function definitions,
+        which it takes from the workers' results. A function whose result cannot be used, or that
+        does not start at a planned boundary, is parsed here.
+    """
+    def __init__(self, output_file, trace, recover, batches):
+        options = {"recover": True} if recover else {}
+        super().__init__(batches.records(), output_file, trace, **options)
+        self.batches = batches
+
+    def function(self):
+        result = self.batches.function(self.current[2])
+        if result is None:
+            return syntax.Parser.function(self)
+        trace, count = result
+        if self.output_file is not None:
+            self.output_file.write_lines(trace)
+        self.skip(count)
+
+    def skip(self, count):
+        # advance count times; the token skipped to (a 'function' or the '@') always exists
+        lookahead = self.lookahead
+        if count < len(lookahead):
+            for _ in range(count):
+                self.advance()
+            return
+        dropped = count - len(lookahead) # Tokens dropped from the source without being buffered
+        lookahead.clear()
+        next(islice(self.token_source, dropped, dropped), None)
+        lookahead.extend(islice(self.token_source, syntax.LOOKAHEAD_SIZE))
+        self.current_index += count
+        self.current = lookahead[0]
+        self.kind = self.current[0]
+        self.lexeme = self.current[1]
+
+def parse_parallel(buffer, output_file=None, trace=syntax.TRACE_FULL, recover=False, executor=None, jobs=None):
+    # Parse a program (bytes-like or str) with its function definitions spread over executor (or a
+    # new pool of jobs processes), writing the trace to output_file. Returns the list of ParseErrors.
+    if output_file is not None and not isinstance(output_file, syntax.TraceSink):
+        output_file = syntax.TraceSink(output_file)
+    trace = trace if output_file is not None else syntax.TRACE_OFF
+    jobs = jobs or os.cpu_count() or 1
+    starts, end = function_starts(buffer)
+    options = {"recover": True} if recover else {}
+    if len(starts) < MIN_PARALLEL_FUNCTIONS or jobs == 1:
+        try:
+            parser = syntax.Parser(lexical.scan(buffer), output_file, trace, **options)
+        except SyntaxError as e: # No tokens
+            return [syntax.ParseError(str(e))]
+        try:
+            parser.parse()
+        except SyntaxError: # Already recorded in parser.errors
+            pass
+        return parser.errors
+
+    own_executor = None
+    if executor is None:
+        executor = own_executor = ProcessPoolExecutor(max_workers=jobs)
+    batches = Batches(buffer, starts, end, plan_batches(starts, end, jobs * BATCHES_PER_JOB), executor, trace)
+    try:
+        try:
+            parser = SkeletonParser(output_file, trace, recover, batches)
+        except SyntaxError as e: # No tokens (the whole program is a comment)
+            return [syntax.ParseError(str(e))]
+        try:
+            parser.parse()
+        except SyntaxError: # Already recorded in parser.errors
+            pass
+    finally:
+        batches.cancel()
+        if own_executor is not None:
+            own_executor.shutdown()
+    return parser.errors
+
+def analyze_file_parallel(input_filename, output_filename=None, trace=syntax.TRACE_FULL, compress=False, recover=False,
+                          jobs=None, executor=None):
+    # analyze_file with parallel function parsing: same trace file and errors
+    with open(input_filename, "rb") as file:
+        buffer = lexical.map_file(file)
+        output_file = syntax.open_trace(output_filename, compress) if trace and output_filename is not None else None
+        try:
+            return parse_parallel(buffer, output_file, trace, recover, executor, jobs)
+        finally:
+            if output_file is not None:
+                output_file.close()
+            if not isinstance(buffer, bytes):
+                buffer.close()
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Parse a RAT24F program with its functions parsed in parallel.")
+    arguments.add_argument("file", help="program to parse")
+    arguments.add_argument("-o", "--output", help="trace file (default: next to the input)")
+    arguments.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: number of cores)")
+    arguments.add_argument("--trace", choices=batch.TRACE_LEVELS, default="full", help="trace level (default: full)")
+    arguments.add_argument("--compress", action="store_true", help="gzip the trace file")
+    arguments.add_argument("--recover", action="store_true", help="report every syntax error instead of the first one")
+    return arguments
+
+def main(argv=None):
+    arguments = build_argument_parser()
+    args = arguments.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        arguments.error("--jobs must be at least 1")
+    output_filename = args.output or syntax.trace_filename(args.file, args.compress)
+    errors = analyze_file_parallel(args.file, output_filename, batch.TRACE_LEVELS[args.trace], args.compress,
+                                   args.recover, args.jobs)
+    for error in errors:
+        print(f"Error: {error}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""Profiler - Compilers CPSC 323
+Description: Optional instrumentation of the lexer and the recursive descent parser. While a
+Profile is enabled it counts:
+- every scan of the lexer, the tokens it produced and the time spent producing them, and an
+  approximate count of how often each state of the compiled DFA was entered (see count_states);
+- every call to each Parser nonterminal method (statement, expression, factor, ...) and to match,
+  with the cumulative time (including the methods it calls) and the self time (excluding them,
+  and excluding the lexing done on demand for the parser).
+
+The counters work by replacing Assignment1.scan and the Parser methods with counting wrappers
+while the profile is enabled, and putting the originals back afterwards, so the lexer and parser
+have no profiling code of their own and run at full speed when no profile is enabled.
+
+Usage: with Profile() as profile:
+           MyAssignment2.analyze_file("test1.txt", cache=False)
+       profile.stats()   # or profile.dump(file), profile.report()
+
+       python profiler.py FILE [FILE ...] [--json stats.json]
+"""
+
+import argparse
+import json
+import sys
+from time import perf_counter
+
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+
+class Profile:
+    def __init__(self, parser_class=syntax.Parser):
+        self.parser_class = parser_class # Class whose methods are counted (subclasses inherit the counting)
+        self.originals = [] # (owner, name, original or None if owner inherited it) of every replaced attribute
+        self.reset()
+
+    def reset(self): # Clear the counters
+        self.scans = 0
+        self.tokens = 0
+        self.lexer_seconds = 0.0
+        self.state_counts = [0] * len(lexical.dfa_token_kinds)
+        self.counters = {} # Method name -> [calls, cumulative seconds, self seconds]
+        self.match_kinds = [0] * len(lexical.kind_names) # match calls by expected kind
+        self.frames = [] # Time spent in the callees of each active call
+        self.depths = {} # Method name -> active calls, so recursion is not counted twice in the cumulative time
+
+    @property
+    def enabled(self):
+        return bool(self.originals)
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.replace(lexical, "scan", self.counting_scan(lexical.scan))
+        for name in syntax.NONTERMINAL_METHODS:
+            self.replace(self.parser_class, name, self.timed(name, getattr(self.parser_class, name)))
+        self.replace(self.parser_class, "match", self.timed("match", self.counting_match(self.parser_class.match)))
+
+    def disable(self):
+        # Put back the attributes each owner had itself, and remove the ones set on a subclass
+        # over an inherited method, so that the subclass inherits again
+        while self.originals:
+            owner, name, original = self.originals.pop()
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def replace(self, owner, name, replacement):
+        self.originals.append((owner, name, vars(owner).get(name)))
+        setattr(owner, name, replacement)
+
+    def timed(self, name, function): # Wrapper of a Parser method that counts its calls and time
+        counter = self.counters.setdefault(name, [0, 0.0, 0.0])
+        frames = self.frames
+        depths = self.depths
+
+        def wrapper(*args, **kwargs):
+            counter[0] += 1
+            frames.append(0.0)
+            depths[name] = depths.get(name, 0) + 1
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                counter[2] += elapsed - frames.pop()
+                depths[name] -= 1
+                if not depths[name]: # Outermost call: recursive calls are already part of its time
+                    counter[1] += elapsed
+                if frames:
+                    frames[-1] += elapsed
+
+        wrapper.__name__ = name
+        return wrapper
+
+    def counting_match(self, match):
+        match_kinds = self.match_kinds
+
+        def counted_match(parser, expected_kind):
+            match_kinds[expected_kind] += 1
+            return match(parser, expected_kind)
+
+        return counted_match
+
+    def counting_scan(self, scan): # Replacement for Assignment1.scan
+        profile = self
+
+        def counted_scan(*args, **kwargs):
+            profile.scans += 1
+            records = scan(*args, **kwargs)
+            frames = profile.frames
+            while True:
+                # Counting the states is timed with the scan, so the profiler's own cost is lexer time
+                # and not self time of the parser method that asked for the token
+                start = perf_counter()
+                record = next(records, None)
+                if record is not None:
+                    profile.count_states(record[1])
+                elapsed = perf_counter() - start
+                profile.lexer_seconds += elapsed
+                if frames: # Lexing done for the parser is not part of the parser's self time
+                    frames[-1] += elapsed
+                if record is None:
+                    return
+                profile.tokens += 1
+                yield record
+
+        return counted_scan
+
+    def count_states(self, lexeme):
+        # An approximation: the lexeme of each token is replayed through the DFA rather than the
+        # scan reporting the states it actually entered. The DFA is deterministic, so a token's own
+        # characters enter the same states again (the start state is counted once per token), but
+        # the whitespace and comments the scan skips between tokens are never counted
+        transitions = lexical.dfa_transitions
+        width = lexical.NUM_CHAR_CLASSES
+        counts = self.state_counts
+        codes = lexical.classify_chunk(lexeme, 0, len(lexeme))[1]
+        counts[0] += 1
+        state = 0
+        for code in codes:
+            state = transitions[state * width + code]
+            if state < 0:
+                break
+            counts[state] += 1
+
+    def stats(self): # The counters as a dict (the JSON dump)
+        names = lexical.dfa_state_names
+        return {
+            "lexer": {
+                "scans": self.scans,
+                "tokens": self.tokens,
+                "seconds": self.lexer_seconds,
+                "states": {names[state]: count for state, count in enumerate(self.state_counts)},
+            },
+            "parser": {
+                name: {"calls": calls, "seconds": seconds, "self_seconds": self_seconds}
+                for name, (calls, seconds, self_seconds) in self.counters.items() if calls
+            },
+            "match_kinds": {lexical.kind_names[kind]: count for kind, count in enumerate(self.match_kinds) if count},
+        }
+
+    def dump(self, file): # Write the stats as JSON to a file object
+        json.dump(self.stats(), file, indent=2)
+        file.write("\n")
+
+    def report(self): # The stats as a table, parser methods sorted by self time
+        stats = self.stats()
+        lexer = stats["lexer"]
+        lines = [f"Lexer: {lexer['scans']} scans, {lexer['tokens']} tokens, {lexer['seconds']:.4f} s"]
+        for name, count in lexer["states"].items():
+            lines.append(f"  {name:<28} {count:>12,}")
+        lines.append(f"{'Parser method':<30} {'calls':>12} {'cumulative s':>13} {'self s':>10}")
+        for name, counter in sorted(stats["parser"].items(), key=lambda item: -item[1]["self_seconds"]):
+            lines.append(f"  {name:<28} {counter['calls']:>12,} {counter['seconds']:>13.4f} {counter['self_seconds']:>10.4f}")
+        lines.append("match by expected kind: " + ", ".join(f"{kind} {count:,}" for kind, count in stats["match_kinds"].items()))
+        return "\n".join(lines)
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Profile the RAT24F lexer and parser on some files.")
+    arguments.add_argument("files", nargs="+", help="programs to analyze")
+    arguments.add_argument("--json", help="file for the JSON stats (default: print a table)")
+    arguments.add_argument("--trace", action="store_true", help="write the trace files, as analyze_file does")
+    return arguments
+
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    with Profile() as profile:
+        for filename in args.files:
+            output_filename = syntax.trace_filename(filename) if args.trace else None
+            for error in syntax.analyze_file(filename, output_filename, cache=False):
+                print(f"{filename}: Error: {error}", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            profile.dump(json_file)
+    else:
+        print(profile.report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""RAT24F Program Generator - Compilers CPSC 323
+Description: Generates grammatically valid RAT24F programs of a chosen size and shape, for
+benchmarking the lexer and parser at realistic sizes. The shape is set by the number of
+functions, the statements per block, the nesting depth, the length of expressions and the
+density of [* *] comments. The same shape and seed always give the same program.
+
+Usage: python program_generator.py [options] -o program.txt
+"""
+
+import argparse
+import random
+
+QUALIFIERS = ("integer", "real", "boolean")
+RELOPS = ("==", "!=", ">", "<", "<=", ">=")
+ARITHMETIC_OPERATORS = ("+", "-", "*", "/")
+VARIABLES = tuple(f"v{number}" for number in range(8)) + ("count", "total", "rate", "flag")
+COMMENT_WORDS = ("compute", "the", "next", "value", "loop", "until", "done", "check", "input", "result")
+
+class ProgramShape:
+    def __init__(self, functions=10, statements=12, depth=2, expression_terms=4, comment_density=0.1,
+                 declarations=3, parameters=2, seed=0):
+        self.functions = functions # Function definitions before the first '@'
+        self.statements = statements # Statements per block (function bodies, main program, compounds)
+        self.depth = depth # Deepest nesting of if / while / compound statements
+        self.expression_terms = expression_terms # Most factors in an expression
+        self.comment_density = comment_density # Chance of a comment before each statement
+        self.declarations = declarations # Declarations per function and in the main program
+        self.parameters = parameters # Most parameters per function
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+class ProgramGenerator:
+    """
+        Writes a program as a list of text pieces. Every construct is one the parser accepts:
+        in a statement list only the first statement may be a compound statement, because the
+        list continues only while the next token is an identifier or a keyword.
+    """
+    def __init__(self, shape):
+        self.shape = shape
+        self.random = random.Random(shape.seed)
+        self.parts = []
+        self.function_names = [f"fn{number}" for number in range(shape.functions)]
+
+    def generate(self): # The whole program as a string
+        shape = self.shape
+        write = self.parts.append
+        for name in self.function_names:
+            self.function(name)
+        write("@\n")
+        self.declaration_list(shape.declarations, "")
+        self.statement_list(shape.statements, 0, "")
+        write("@\n")
+        return "".join(self.parts)
+
+    def function(self, name):
+        write = self.parts.append
+        parameters = ", ".join(f"{variable} {self.random.choice(QUALIFIERS)}" for variable in
+                               self.random.sample(VARIABLES, self.random.randint(0, self.shape.parameters)))
+        write(f"function {name} ({parameters})\n")
+        self.declaration_list(self.random.randint(0, self.shape.declarations), "")
+        write("{\n")
+        self.statement_list(self.shape.statements, 1, "    ")
+        write("}\n")
+
+    def declaration_list(self, count, indent):
+        for _ in range(count):
+            names = ", ".join(self.random.sample(VARIABLES, self.random.randint(1, 3)))
+            self.parts.append(f"{indent}{self.random.choice(QUALIFIERS)} {names};\n")
+
+    def statement_list(self, count, level, indent):
+        for index in range(max(count, 1)):
+            self.comment(indent)
+            self.statement(level, indent, compound_allowed=index == 0)
+            self.parts.append("\n")
+
+    def comment(self, indent):
+        if self.random.random() < self.shape.comment_density:
+            words = " ".join(self.random.choice(COMMENT_WORDS) for _ in range(self.random.randint(2, 12)))
+            if self.random.random() < 0.3: # Some comments span lines
+                words = words.replace(" ", "\n" + indent + "   ", 1)
+            self.parts.append(f"{indent}[* {words} *]\n")
+
+    def statement(self, level, indent, compound_allowed=True):
+        write = self.parts.append
+        choice = self.random.random()
+        if level < self.shape.depth and choice < 0.3: # Nested statements
+            if choice < 0.12:
+                write(f"{indent}if ({self.condition()})\n")
+                self.statement(level + 1, indent + "    ")
+                if self.random.random() < 0.5:
+                    write(f"\n{indent}else\n")
+                    self.statement(level + 1, indent + "    ")
+                write(f"\n{indent}fi")
+                return
+            if choice < 0.22 or not compound_allowed:
+                write(f"{indent}while ({self.condition()})\n")
+                self.statement(level + 1, indent + "    ")
+                return
+            write(f"{indent}{{\n")
+            self.statement_list(max(1, self.shape.statements // 3), level + 1, indent + "    ")
+            write(f"{indent}}}")
+            return
+        if choice < 0.7:
+            write(f"{indent}{self.random.choice(VARIABLES)} = {self.expression()};")
+        elif choice < 0.8:
+            write(f"{indent}put ({self.expression()});")
+        elif choice < 0.9:
+            write(f"{indent}get ({', '.join(self.random.sample(VARIABLES, self.random.randint(1, 3)))});")
+        elif self.random.random() < 0.3:
+            write(f"{indent}return;")
+        else:
+            write(f"{indent}return {self.expression()};")
+
+    def condition(self):
+        return f"{self.expression()} {self.random.choice(RELOPS)} {self.expression()}"
+
+    def expression(self, terms=None, nested=0):
+        terms = self.random.randint(1, self.shape.expression_terms) if terms is None else terms
+        pieces = [self.factor(nested)]
+        for _ in range(terms - 1):
+            pieces.append(self.random.choice(ARITHMETIC_OPERATORS))
+            pieces.append(self.factor(nested))
+        return " ".join(pieces)
+
+    def factor(self, nested):
+        choice = self.random.random()
+        if choice < 0.45:
+            return self.random.choice(VARIABLES)
+        if choice < 0.65:
+            return str(self.random.randint(0, 99999))
+        if choice < 0.75:
+            return f"{self.random.randint(0, 999)}.{self.random.randint(0, 99)}"
+        if choice < 0.8:
+            return self.random.choice(("true", "false"))
+        if choice < 0.9 and self.function_names:
+            arguments = ", ".join(self.random.sample(VARIABLES, self.random.randint(1, 3)))
+            return f"{self.random.choice(self.function_names)}({arguments})"
+        if nested < 2:
+            return f"({self.expression(self.random.randint(1, 3), nested + 1)})"
+        return self.random.choice(VARIABLES)
+
+def generate_program(shape=None, **options): # A program for a ProgramShape, or for ProgramShape(**options)
+    return ProgramGenerator(shape or ProgramShape(**options)).generate()
+
+def add_shape_arguments(arguments): # Options for each ProgramShape field (shared with benchmark.py)
+    defaults = ProgramShape()
+    arguments.add_argument("--functions", type=int, default=defaults.functions)
+    arguments.add_argument("--statements", type=int, default=defaults.statements, help="statements per block")
+    arguments.add_argument("--depth", type=int, default=defaults.depth, help="deepest statement nesting")
+    arguments.add_argument("--expression-terms", type=int, default=defaults.expression_terms, help="most factors per expression")
+    arguments.add_argument("--comment-density", type=float, default=defaults.comment_density, help="chance of a comment before a statement")
+    arguments.add_argument("--declarations", type=int, default=defaults.declarations)
+    arguments.add_argument("--parameters", type=int, default=defaults.parameters)
+    arguments.add_argument("--seed", type=int, default=defaults.seed)
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Generate a valid RAT24F program.")
+    add_shape_arguments(arguments)
+    arguments.add_argument("-o", "--output", help="output file (default: standard output)")
+    return arguments
+
+def shape_from_arguments(args):
+    return ProgramShape(args.functions, args.statements, args.depth, args.expression_terms, args.comment_density,
+                        args.declarations, args.parameters, args.seed)
+
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    program = generate_program(shape_from_arguments(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(program)
+    else:
+        print(program, end="")
+
+if __name__ == "__main__":
+    main()
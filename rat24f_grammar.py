@@ -0,0 +1,366 @@
+"""RAT24F Grammar - Compilers CPSC 323
+Description: Machine-readable RAT24F grammar, used to build the LL(1) parse table for the
+table-driven parser. The grammar is written with the same production names the recursive
+parser (MyAssignment2.Parser) writes to its trace, and the parse table is generated from its
+FIRST and FOLLOW sets.
+"""
+
+import Assignment1 as lexical
+
+"""
+    Grammar notation:
+
+    <Name> ::= symbols => "trace line"  [options]
+             | symbols => "trace line"  [options]
+             ! "error message"
+
+    - <Name> is a nonterminal, 'x' a terminal matched by the token kind of x (keyword,
+      separator or operator), and identifier / integer / real a terminal matched by kind.
+      ε is the empty alternative.
+    - The trace line is written when the alternative is chosen; alternatives without one
+      write nothing.
+    - [predict a b ...] replaces the FIRST/FOLLOW prediction set of the alternative.
+      A lookahead is either a 'lexeme' or a token kind (identifier, keyword, ...).
+    - [default] chooses the alternative for every lookahead no other alternative claims.
+      A nonterminal with a single alternative always uses it.
+    - ! gives the error raised when no alternative matches ({lexeme} is the current lexeme).
+
+    Where the recursive parser decides with a looser test than FIRST/FOLLOW (for example,
+    a parameter list continues until ')'), the grammar says so with [predict] / [default] so
+    both parsers accept and reject exactly the same token sequences.
+"""
+RAT24F_GRAMMAR = r'''
+<Rat24F> ::= <Opt Function Definitions> '@' <Opt Declaration List> <Statement List> '@'
+             => "<Rat24F> -> <Opt Function Definitions> @ <Opt Declaration List> <Statement List> @"
+
+<Opt Function Definitions> ::= <Function Definitions> => "<Opt Function Definitions> -> <Function Definitions> | ε"
+                             | ε [default]
+<Function Definitions> ::= <Function> <More Functions>
+                           => "<Function Definitions> -> <Function> | <Function> <Function Definitions>"
+<More Functions> ::= <Function> <More Functions>
+                   | ε [default]
+<Function> ::= 'function' identifier '(' <Opt Parameter List> ')' <Opt Declaration List> <Body>
+               => "<Function> -> function <Identifier> ( <Opt Parameter List> ) <Opt Declaration List> <Body>"
+
+<Opt Parameter List> ::= <Parameter List> => "<Opt Parameter List> -> <Parameter List> | ε"
+                       | ε [default]
+<Parameter List> ::= <Parameter> <More Parameters>
+                     => "<Parameter List> -> <Parameter> | <Parameter>, <Parameter List>"
+<More Parameters> ::= ',' <Parameter> <More Parameters> [default]
+                    | ε [predict ')']
+<Parameter> ::= <IDs> <Qualifier> => "<Parameter> -> <IDs> <Qualifier>"
+<Qualifier> ::= 'integer' => "<Qualifier> -> integer"
+              | 'real' => "<Qualifier> -> real"
+              | 'boolean' => "<Qualifier> -> boolean"
+              ! "Expected a qualifier, but got: {lexeme}"
+<Body> ::= '{' <Statement List> '}' => "<Body> -> { <Statement List> }"
+
+<Opt Declaration List> ::= <Declaration List> => "<Opt Declaration List> -> <Declaration List> | ε"
+                         | ε [default]
+<Declaration List> ::= <Declaration> ';' <More Declarations>
+                       => "<Declaration List> -> <Declaration>; | <Declaration>;<Declaration List>"
+<More Declarations> ::= <Declaration> ';' <More Declarations>
+                      | ε [default]
+<Declaration> ::= <Qualifier> <IDs> => "<Declaration> -> <Qualifier> <IDs>"
+<IDs> ::= identifier <More IDs> => "<IDs> -> <Identifier> | <Identifier>, <IDs>"
+<More IDs> ::= ',' identifier <More IDs>
+             | ε [default]
+
+<Statement List> ::= <Statement> <More Statements>
+                     => "<Statement List> -> <Statement> | <Statement> <Statement List>"
+<More Statements> ::= <Statement> <More Statements> [predict identifier keyword]
+                    | ε [default]
+<Statement> ::= <Compound> => "<Statement> -> <Compound>"
+              | <Assign> => "<Statement> -> <Assign>"
+              | <If> => "<Statement> -> <If>"
+              | <Return> => "<Statement> -> <Return>"
+              | <Print> => "<Statement> -> <Print>"
+              | <Scan> => "<Statement> -> <Scan>"
+              | <While> => "<Statement> -> <While>"
+              ! "Unexpected statement: {lexeme}"
+<Compound> ::= '{' <Statement List> '}' => "<Compound> -> { <Statement List> }"
+<Assign> ::= identifier '=' <Expression> ';' => "<Assign> -> <Identifier> = <Expression>;"
+<If> ::= 'if' '(' <Condition> ')' <Statement> <Else> 'fi'
+         => "<If> -> if ( <Condition> ) <Statement> fi | if ( <Condition> ) <Statement> else <Statement> fi"
+<Else> ::= 'else' <Statement>
+         | ε [default]
+<Return> ::= 'return' <Return Value> ';' => "<Return> -> return ; | return <Expression>;"
+<Return Value> ::= <Expression> [default]
+                 | ε [predict ';']
+<Print> ::= 'put' '(' <Expression> ')' ';' => "<Print> -> put (<Expression>);"
+<Scan> ::= 'get' '(' <IDs> ')' ';' => "<Scan> -> get ( <IDs> );"
+<While> ::= 'while' '(' <Condition> ')' <Statement> => "<While> -> while ( <Condition> ) <Statement>"
+<Condition> ::= <Expression> <Relop> <Expression> => "<Condition> -> <Expression> <Relop> <Expression>"
+<Relop> ::= '==' | '!=' | '>' | '<' | '<=' | '>='
+          ! "Unexpected token {lexeme}, expected a relational operator"
+
+<Expression> ::= <Term> <Expression Prime> => "<Expression> -> <Term> <Expression Prime>"
+<Expression Prime> ::= '+' <Term> <Expression Prime> => "<Expression Prime> -> + <Term> <Expression Prime>"
+                     | '-' <Term> <Expression Prime> => "<Expression Prime> -> - <Term> <Expression Prime>"
+                     | ε [default] => "<Expression Prime> -> ε"
+<Term> ::= <Factor> <Term Prime> => "<Term> -> <Factor> <Term Prime>"
+<Term Prime> ::= '*' <Factor> <Term Prime> => "<Term Prime> -> * <Factor> <Term Prime>"
+               | '/' <Factor> <Term Prime> => "<Term Prime> -> / <Factor> <Term Prime>"
+               | ε [default] => "<Term Prime> -> ε"
+<Factor> ::= identifier <Call> => "<Factor> -> <Identifier>"
+           | integer => "<Factor> -> <Integer>"
+           | real => "<Factor> -> <Real>"
+           | 'true' => "<Factor> -> <Boolean>"
+           | 'false' => "<Factor> -> <Boolean>"
+           | '(' <Expression> ')' => "<Factor> -> ( <Expression> )"
+           ! "Invalid factor: {lexeme}"
+<Call> ::= '(' <IDs> ')' => "<Factor> -> <Identifier> ( <IDs> )"
+         | ε [default]
+'''
+
+EPSILON = "ε"
+
+# Terminals written as token kinds, and the kind code they match
+kind_terminals = {lexical.kind_names[code]: code for code in range(len(lexical.kind_names))}
+
+# A production: lhs nonterminal, right-hand side symbols, trace line (or None),
+# predict override (or None) and whether it is the default alternative
+class Production:
+    def __init__(self, lhs, rhs, trace=None, predict=None, default=False):
+        self.lhs = lhs
+        self.rhs = rhs
+        self.trace = trace
+        self.predict = predict
+        self.default = default
+
+    def __repr__(self):
+        return f"{self.lhs} ::= {' '.join(self.rhs) or EPSILON}"
+
+class GrammarError(Exception): # Raised for malformed grammars and LL(1) conflicts
+    pass
+
+"""
+    This function splits one alternative into its symbols, trace line and options.
+"""
+def parse_alternative(lhs, text):
+    trace = None
+    predict = None
+    default = False
+    if "=>" in text:
+        text, trace_text = text.split("=>", 1)
+        trace_text = trace_text.strip()
+        trace_end = trace_text.index('"', 1)
+        trace = trace_text[1:trace_end]
+        text += " " + trace_text[trace_end + 1:]  # options written after the trace line
+    symbols = []
+    tokens = tokenize_alternative(text)
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token == "[default]":
+            default = True
+        elif token == "[predict":
+            predict = []
+            index += 1
+            while tokens[index] != "]":
+                predict.append(tokens[index])
+                index += 1
+        elif token != EPSILON:
+            symbols.append(token)
+        index += 1
+    return Production(lhs, tuple(symbols), trace, predict, default)
+
+"""
+    This function splits alternative text into symbols: <Names>, 'terminals', bare words,
+    and the option brackets [default] / [predict ... ].
+"""
+def tokenize_alternative(text):
+    tokens = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char.isspace():
+            index += 1
+        elif char == "<":
+            end = text.index(">", index) + 1
+            tokens.append(text[index:end])
+            index = end
+        elif char == "'":
+            end = text.index("'", index + 1) + 1
+            tokens.append(text[index:end])
+            index = end
+        elif text.startswith("[default]", index):
+            tokens.append("[default]")
+            index += len("[default]")
+        elif text.startswith("[predict", index):
+            tokens.append("[predict")
+            index += len("[predict")
+        elif char == "]":
+            tokens.append("]")
+            index += 1
+        else:
+            end = index
+            while end < len(text) and not text[end].isspace() and text[end] != "]":
+                end += 1
+            tokens.append(text[index:end])
+            index = end
+    return tokens
+
+"""
+    This function reads grammar text (see RAT24F_GRAMMAR) into a Grammar.
+"""
+def load_grammar(text=RAT24F_GRAMMAR):
+    productions = []
+    errors = {}
+    rules = []  # (lhs, definition text)
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith("<") and "::=" in stripped:
+            lhs, definition = stripped.split("::=", 1)
+            rules.append([lhs.strip(), definition])
+        elif rules:
+            rules[-1][1] += " " + stripped
+        else:
+            raise GrammarError(f"Text before the first rule: {stripped}")
+
+    for lhs, definition in rules:
+        if '! "' in definition:
+            definition, message = definition.rsplit('! "', 1)
+            errors[lhs] = message.rstrip().rstrip('"')
+        for alternative in split_alternatives(definition):
+            productions.append(parse_alternative(lhs, alternative))
+    return Grammar(productions, errors)
+
+"""
+    This function splits a definition on the '|' that separate alternatives
+    (a '|' inside a "trace line" or a 'terminal' does not count).
+"""
+def split_alternatives(definition):
+    alternatives = []
+    current = []
+    quote = None
+    for char in definition:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "|":
+            alternatives.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    alternatives.append("".join(current))
+    return alternatives
+
+class Grammar:
+    def __init__(self, productions, errors):
+        self.productions = productions
+        self.errors = errors  # nonterminal -> error message template
+        self.start = productions[0].lhs
+        self.nonterminals = []
+        self.alternatives = {}  # nonterminal -> list of productions
+        for production in productions:
+            if production.lhs not in self.alternatives:
+                self.nonterminals.append(production.lhs)
+                self.alternatives[production.lhs] = []
+            self.alternatives[production.lhs].append(production)
+        for production in productions:
+            for symbol in production.rhs:
+                if symbol.startswith("<") and symbol not in self.alternatives:
+                    raise GrammarError(f"Undefined nonterminal {symbol} in {production}")
+                if not symbol.startswith("<") and self.terminal_kind(symbol) is None:
+                    raise GrammarError(f"Unknown terminal {symbol} in {production}")
+        self.first = self.compute_first()
+        self.follow = self.compute_follow()
+        self.table, self.defaults = self.build_table()
+
+    def is_nonterminal(self, symbol):
+        return symbol.startswith("<")
+
+    def terminal_kind(self, symbol):
+        # Kind code a terminal (or a lookahead in [predict]) matches
+        if symbol.startswith("'"):
+            scanned = list(lexical.scan(symbol[1:-1], comments=False))
+            return scanned[0][0] if len(scanned) == 1 else None
+        return kind_terminals.get(symbol)
+
+    def lookahead_key(self, symbol):
+        # Parse table key of a terminal: the lexeme for 'x', the kind code otherwise
+        return symbol[1:-1] if symbol.startswith("'") else kind_terminals[symbol]
+
+    def first_of(self, symbols, first=None):
+        # FIRST set of a sequence of symbols; EPSILON is included when all of it can be empty
+        first = self.first if first is None else first
+        result = set()
+        for symbol in symbols:
+            if not self.is_nonterminal(symbol):
+                result.add(symbol)
+                return result
+            result |= first[symbol] - {EPSILON}
+            if EPSILON not in first[symbol]:
+                return result
+        result.add(EPSILON)
+        return result
+
+    def compute_first(self):
+        first = {nonterminal: set() for nonterminal in self.nonterminals}
+        changed = True
+        while changed:
+            changed = False
+            for production in self.productions:
+                symbols = self.first_of(production.rhs, first)
+                if not symbols <= first[production.lhs]:
+                    first[production.lhs] |= symbols
+                    changed = True
+        return first
+
+    def compute_follow(self):
+        follow = {nonterminal: set() for nonterminal in self.nonterminals}
+        changed = True
+        while changed:
+            changed = False
+            for production in self.productions:
+                for index, symbol in enumerate(production.rhs):
+                    if not self.is_nonterminal(symbol):
+                        continue
+                    rest = self.first_of(production.rhs[index + 1:])
+                    symbols = rest - {EPSILON}
+                    if EPSILON in rest:
+                        symbols |= follow[production.lhs]
+                    if not symbols <= follow[symbol]:
+                        follow[symbol] |= symbols
+                        changed = True
+        return follow
+
+    def predict_set(self, production):
+        # Lookaheads that select a production: FIRST of its right side, plus FOLLOW of its
+        # left side when the right side can be empty, unless the grammar overrides it
+        if production.predict is not None:
+            return set(production.predict)
+        symbols = self.first_of(production.rhs)
+        if EPSILON in symbols:
+            symbols = (symbols - {EPSILON}) | self.follow[production.lhs]
+        return symbols
+
+    def build_table(self):
+        # table[nonterminal][lookahead key] -> production; defaults[nonterminal] -> production or None
+        table = {}
+        defaults = {}
+        for nonterminal in self.nonterminals:
+            row = {}
+            alternatives = self.alternatives[nonterminal]
+            default = None
+            for production in alternatives:
+                if production.default or len(alternatives) == 1:
+                    if default is not None:
+                        raise GrammarError(f"Two default alternatives for {nonterminal}")
+                    default = production
+                for symbol in self.predict_set(production):
+                    key = self.lookahead_key(symbol)
+                    if key in row and row[key] is not production:
+                        raise GrammarError(f"LL(1) conflict in {nonterminal} on {symbol}: {row[key]} / {production}")
+                    row[key] = production
+            table[nonterminal] = row
+            defaults[nonterminal] = default
+        return table, defaults
+
+# The RAT24F grammar, loaded once
+grammar = load_grammar()
@@ -0,0 +1,304 @@
+"""Symbol Table - Compilers CPSC 323
+Description: Scoped symbol table for RAT24F, filled in while the program is parsed. Identifiers
+are interned as integer IDs, and every scope (the global scope, one per function and one per
+compound statement) maps name IDs to the Symbols declared in it: functions, parameters with
+their qualifiers, and declared variables. Every use of a name is resolved as it is parsed, so
+undeclared and duplicate names are reported in the same pass, without walking a tree afterwards.
+
+Names must be declared before they are used, except functions: calls are checked once the whole
+program has been read, so a function can call one defined after it.
+
+Usage: python symbol_table.py FILE [--json]
+"""
+
+import argparse
+import json
+import sys
+
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+
+# Scope kinds
+SCOPE_GLOBAL = "global"
+SCOPE_FUNCTION = "function"
+SCOPE_BLOCK = "block"
+
+# Symbol kinds
+SYMBOL_FUNCTION = "function"
+SYMBOL_PARAMETER = "parameter"
+SYMBOL_VARIABLE = "variable"
+
+# What the parser is matching identifiers for
+ROLE_USE = 0
+ROLE_FUNCTION = 1 # The name of a function being defined
+ROLE_PARAMETER = 2
+ROLE_DECLARATION = 3
+
+class SemanticError(syntax.ParseError): # A name that is undeclared, declared twice or used as the wrong kind
+    __slots__ = ()
+
+class Symbol:
+    __slots__ = ("name", "kind", "qualifier", "line", "column", "scope", "uses")
+
+    def __init__(self, name, kind, qualifier, line, column, scope):
+        self.name = name # Name ID
+        self.kind = kind # SYMBOL_FUNCTION, SYMBOL_PARAMETER or SYMBOL_VARIABLE
+        self.qualifier = qualifier # integer, real or boolean (None for functions)
+        self.line = line
+        self.column = column
+        self.scope = scope # Index of the scope it is declared in
+        self.uses = [] # (line, column) of every use
+
+class Scope:
+    __slots__ = ("kind", "name", "parent", "symbols")
+
+    def __init__(self, kind, name, parent):
+        self.kind = kind
+        self.name = name # Function name of a function scope, None otherwise
+        self.parent = parent # Index of the enclosing scope, None for the global scope
+        self.symbols = {} # Name ID -> Symbol
+
+class SymbolTable:
+    def __init__(self):
+        self.names = [] # Interned names, indexed by name ID
+        self.name_ids = {} # Name -> name ID
+        self.scopes = [Scope(SCOPE_GLOBAL, None, None)]
+        self.open_scopes = [0] # Indices of the open scopes, innermost last
+        self.errors = [] # SemanticErrors
+        self.calls = [] # (name ID, line, column, scope) of calls, checked by finish()
+
+    def intern(self, name): # The name ID of a name, adding it if it is new
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def report(self, message, line, column):
+        self.errors.append(SemanticError(message, line, column))
+
+    def open_scope(self, kind, name=None):
+        self.scopes.append(Scope(kind, name, self.open_scopes[-1]))
+        self.open_scopes.append(len(self.scopes) - 1)
+
+    def close_scope(self):
+        if len(self.open_scopes) > 1: # The global scope stays open
+            self.open_scopes.pop()
+
+    def lookup(self, name, scope=None): # The Symbol a name refers to from a scope (the innermost open one by default)
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            return None
+        scope = self.open_scopes[-1] if scope is None else scope
+        while scope is not None:
+            symbol = self.scopes[scope].symbols.get(name_id)
+            if symbol is not None:
+                return symbol
+            scope = self.scopes[scope].parent
+        return None
+
+    def declare(self, name, kind, qualifier, line, column, scope=None):
+        # Add a Symbol to a scope (the innermost open one by default); a name declared twice in
+        # the same scope is reported and keeps its first declaration
+        scope = self.open_scopes[-1] if scope is None else scope
+        symbols = self.scopes[scope].symbols
+        name_id = self.intern(name)
+        first = symbols.get(name_id)
+        if first is not None:
+            self.report(f"Duplicate declaration of {name} (first declared at line {first.line}, column {first.column})",
+                        line, column)
+            return first
+        symbol = symbols[name_id] = Symbol(name_id, kind, qualifier, line, column, scope)
+        return symbol
+
+    def use(self, name, line, column): # A variable or parameter used at a position
+        symbol = self.lookup(name)
+        if symbol is None:
+            self.report(f"Undeclared identifier: {name}", line, column)
+        elif symbol.kind == SYMBOL_FUNCTION:
+            self.report(f"{name} is a function, not a variable", line, column)
+            symbol.uses.append((line, column))
+        else:
+            symbol.uses.append((line, column))
+
+    def call(self, name, line, column): # A function called at a position (checked by finish)
+        self.calls.append((self.intern(name), line, column, self.open_scopes[-1]))
+
+    def finish(self):
+        # Check the calls and sort the errors by position; called once the program has been parsed
+        for name_id, line, column, scope in self.calls:
+            name = self.names[name_id]
+            symbol = self.lookup(name, scope)
+            if symbol is None:
+                self.report(f"Call of undeclared function: {name}", line, column)
+            else:
+                if symbol.kind != SYMBOL_FUNCTION:
+                    self.report(f"{name} is not a function", line, column)
+                symbol.uses.append((line, column))
+        self.calls = []
+        self.errors.sort(key=lambda error: (error.line or 0, error.column or 0))
+
+    def symbols(self): # Every Symbol, scope by scope
+        for scope in self.scopes:
+            yield from scope.symbols.values()
+
+    def to_dict(self):
+        return {
+            "scopes": [
+                {
+                    "kind": scope.kind,
+                    "name": scope.name,
+                    "parent": scope.parent,
+                    "symbols": [
+                        {"name": self.names[symbol.name], "kind": symbol.kind, "qualifier": symbol.qualifier,
+                         "line": symbol.line, "column": symbol.column, "uses": [list(use) for use in symbol.uses]}
+                        for symbol in scope.symbols.values()
+                    ],
+                }
+                for scope in self.scopes
+            ],
+            "errors": [{"message": error.message, "line": error.line, "column": error.column} for error in self.errors],
+        }
+
+"""
+    A Parser that fills in a SymbolTable as it parses. The nonterminal methods that introduce
+    names set the role identifiers are matched for (function name, parameter, declaration),
+    and match hands every identifier to the table: declared for those roles, and otherwise
+    used, or called when it is followed by '('. Parsing, tracing and error recovery are those
+    of MyAssignment2.Parser.
+"""
+class SymbolParser(syntax.Parser):
+    def __init__(self, tokens, output_file=None, trace=syntax.TRACE_OFF, recover=False, max_errors=syntax.MAX_ERRORS,
+                 symbols=None):
+        super().__init__(tokens, output_file, trace, recover, max_errors)
+        if symbols is not None:
+            self.symbols = symbols
+
+    def reset(self, tokens, output_file=None, trace=syntax.TRACE_OFF): # Start over on new tokens, with a new table
+        super().reset(tokens, output_file, trace)
+        self.symbols = SymbolTable()
+        self.role = ROLE_USE
+        self.declared_qualifier = None # Qualifier of the declaration being parsed
+        self.parameter_names = [] # (name, line, column) of a parameter, declared at its qualifier
+
+    def parse(self):
+        try:
+            super().parse()
+        finally:
+            self.symbols.finish()
+
+    def match(self, expected_kind):
+        kind, lexeme, _, line, column = self.current
+        super().match(expected_kind)
+        if kind == syntax.IDENTIFIER:
+            self.identifier(lexeme, line, column)
+        elif kind == syntax.KEYWORD and lexeme in syntax.QUALIFIERS:
+            self.declared_qualifier = lexeme
+            if self.role == ROLE_PARAMETER:
+                self.declare_parameters()
+
+    def identifier(self, name, line, column): # Record a matched identifier according to the role
+        role = self.role
+        if role == ROLE_USE:
+            if self.lexeme == "(" and not self.at_end:
+                self.symbols.call(name, line, column)
+            else:
+                self.symbols.use(name, line, column)
+        elif role == ROLE_DECLARATION:
+            self.symbols.declare(name, SYMBOL_VARIABLE, self.declared_qualifier, line, column)
+        elif role == ROLE_PARAMETER:
+            self.parameter_names.append((name, line, column))
+        else: # The function's name goes in the global scope, its parameters and body in a new scope
+            self.symbols.declare(name, SYMBOL_FUNCTION, None, line, column, 0)
+            self.symbols.open_scope(SCOPE_FUNCTION, name)
+            self.role = ROLE_USE
+
+    def declare_parameters(self):
+        for name, line, column in self.parameter_names:
+            self.symbols.declare(name, SYMBOL_PARAMETER, self.declared_qualifier, line, column)
+        self.parameter_names = []
+
+    def in_role(self, role, parse): # Run a Parser method with identifiers matched for role
+        previous = self.role
+        self.role = role
+        try:
+            parse(self)
+        finally:
+            self.role = previous
+
+    def function(self):
+        open_scopes = len(self.symbols.open_scopes)
+        try:
+            self.in_role(ROLE_FUNCTION, syntax.Parser.function)
+        finally:
+            while len(self.symbols.open_scopes) > open_scopes:
+                self.symbols.close_scope()
+
+    def parameter(self):
+        self.declared_qualifier = None
+        try:
+            self.in_role(ROLE_PARAMETER, syntax.Parser.parameter)
+        finally: # Names whose qualifier was missing are still declared, to avoid follow-on errors
+            self.declare_parameters()
+
+    def declaration(self):
+        self.declared_qualifier = None
+        self.in_role(ROLE_DECLARATION, syntax.Parser.declaration)
+
+    def compound_statement(self):
+        self.symbols.open_scope(SCOPE_BLOCK)
+        try:
+            super().compound_statement()
+        finally:
+            self.symbols.close_scope()
+
+def check_symbols(tokens, recover=False):
+    # Parse tokens (anything Parser accepts) and build their SymbolTable. Returns
+    # (symbol table, syntax errors); the semantic errors are in the table's errors.
+    parser = SymbolParser(tokens, recover=recover)
+    try:
+        parser.parse()
+    except SyntaxError: # Already recorded in parser.errors
+        pass
+    return parser.symbols, parser.errors
+
+def format_table(table): # The scopes and their symbols as text
+    lines = []
+    for index, scope in enumerate(table.scopes):
+        title = f"{scope.kind} scope" + (f" {scope.name}" if scope.name else "")
+        if scope.parent is not None:
+            title += f" (in scope {scope.parent})"
+        lines.append(f"[{index}] {title}")
+        for symbol in scope.symbols.values():
+            lines.append(f"    {table.names[symbol.name]:<20} {symbol.kind:<10} {symbol.qualifier or '':<8} "
+                         f"line {symbol.line}, column {symbol.column}, {len(symbol.uses)} uses")
+    return "\n".join(lines)
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Check the names declared and used in a RAT24F program.")
+    arguments.add_argument("file", help="program to check")
+    arguments.add_argument("--json", action="store_true", help="print the symbol table as JSON")
+    arguments.add_argument("--recover", action="store_true", help="continue after syntax errors")
+    return arguments
+
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    with open(args.file, "rb") as input_file:
+        tokens = lexical.lex_file(input_file)
+        try:
+            if not len(tokens):
+                print("Error: No tokens to parse", file=sys.stderr)
+                return 1
+            table, errors = check_symbols(tokens, args.recover)
+        finally:
+            tokens.close()
+    if args.json:
+        print(json.dumps(table.to_dict(), indent=2))
+    else:
+        print(format_table(table))
+    for error in errors + table.errors:
+        print(f"Error: {error}", file=sys.stderr)
+    return 1 if errors or table.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""Syntax Tree - Compilers CPSC 323
+Description: Compact syntax tree built by the recursive descent parser, for tools that need the
+structure of a program without reading the text trace back in. Nodes are not Python objects:
+a SyntaxTree is a set of parallel arrays indexed by node number,
+
+- kinds: what the node is (a nonterminal such as <Statement>, or a token of some kind);
+- first_child, next_sibling: the tree links, -1 when there is none;
+- tokens: index in the token stream of a token node, or of the first token of a nonterminal.
+
+Node 0 is the <Rat24F> root, and nodes are numbered in preorder. Nonterminals that derive
+ε (e.g. an empty <Opt Declaration List>) are left out. Lexemes and positions come from the
+TokenStream the tree refers to.
+
+Usage: python syntax_tree.py FILE [--json] [-o tree_file]
+"""
+
+import argparse
+from array import array
+import json
+import struct
+import sys
+
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+
+# Parser method -> the nonterminal its node stands for. Methods not listed (match_end_marker,
+# terminated_declaration) only group work inside another node and get no node of their own.
+METHOD_NODES = {
+    "rat24f": "<Rat24F>",
+    "opt_function_definitions": "<Opt Function Definitions>",
+    "function_definitions": "<Function Definitions>",
+    "function": "<Function>",
+    "opt_parameter_list": "<Opt Parameter List>",
+    "parameter_list": "<Parameter List>",
+    "parameter": "<Parameter>",
+    "qualifier": "<Qualifier>",
+    "ids": "<IDs>",
+    "opt_declaration_list": "<Opt Declaration List>",
+    "declaration_list": "<Declaration List>",
+    "declaration": "<Declaration>",
+    "body": "<Body>",
+    "statement_list": "<Statement List>",
+    "statement": "<Statement>",
+    "if_statement": "<If>",
+    "return_statement": "<Return>",
+    "print_statement": "<Print>",
+    "scan_statement": "<Scan>",
+    "while_statement": "<While>",
+    "compound_statement": "<Compound>",
+    "condition": "<Condition>",
+    "assign": "<Assign>",
+    "expression": "<Expression>",
+    "expression_prime": "<Expression Prime>",
+    "term": "<Term>",
+    "term_prime": "<Term Prime>",
+    "factor": "<Factor>",
+    "relop": "<Relop>",
+}
+
+# Node kind codes: nonterminals first, then FIRST_TOKEN_NODE + the KIND_* code of a token
+NODE_NAMES = list(METHOD_NODES.values())
+FIRST_TOKEN_NODE = len(NODE_NAMES)
+NODE_CODES = {name: code for code, name in enumerate(NODE_NAMES)}
+for kind, kind_name in enumerate(lexical.kind_names):
+    NODE_NAMES.append(kind_name)
+    NODE_CODES[kind_name] = FIRST_TOKEN_NODE + kind
+
+# Serialized tree layout: MAGIC, metadata (JSON), tree arrays, token arrays, each after its byte length
+MAGIC = b"R24T\x01"
+LENGTH = struct.Struct("<Q")
+TREE_ARRAYS = ("kinds", "first_child", "next_sibling", "tokens")
+TOKEN_ARRAYS = ("kinds", "offsets", "lengths", "lines", "columns", "symbols")
+
+class SyntaxTree:
+    def __init__(self, token_stream=None):
+        self.token_stream = token_stream if token_stream is not None else lexical.TokenStream()
+        self.kinds = array("B")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.tokens = array("i")
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind_name(self, node): # Nonterminal ("<Statement>") or token kind ("identifier") of a node
+        return NODE_NAMES[self.kinds[node]]
+
+    def is_token(self, node):
+        return self.kinds[node] >= FIRST_TOKEN_NODE
+
+    def lexeme(self, node): # Lexeme of a token node, or of the first token of a nonterminal
+        return self.token_stream.lexeme(self.tokens[node])
+
+    def position(self, node): # (line, column) of the node's token
+        index = self.tokens[node]
+        return self.token_stream.lines[index], self.token_stream.columns[index]
+
+    def children(self, node):
+        child = self.first_child[node]
+        next_sibling = self.next_sibling
+        while child >= 0:
+            yield child
+            child = next_sibling[child]
+
+    def walk(self, node=0):
+        # Yields (node, depth) for node and everything below it, in preorder (the order nodes are numbered in)
+        if not len(self.kinds):
+            return
+        first_child, next_sibling = self.first_child, self.next_sibling
+        stack = [(node, 0)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, depth = pop()
+            yield node, depth
+            child = first_child[node]
+            if child >= 0:
+                siblings = []
+                while child >= 0:
+                    siblings.append(child)
+                    child = next_sibling[child]
+                for child in reversed(siblings):
+                    push((child, depth + 1))
+
+    def find(self, name): # Every node of a kind ("<Assign>", "identifier", ...), in preorder
+        code = bytes([NODE_CODES[name]])
+        kinds = self.kinds.tobytes()
+        node = kinds.find(code)
+        while node >= 0:
+            yield node
+            node = kinds.find(code, node + 1)
+
+    def to_dict(self, node=0):
+        # Nested dicts: {"kind", "children"} for nonterminals, {"kind", "lexeme", "line", "column"} for tokens
+        def convert(node):
+            if self.is_token(node):
+                line, column = self.position(node)
+                return {"kind": self.kind_name(node), "lexeme": self.lexeme(node), "line": line, "column": column}
+            return {"kind": self.kind_name(node), "children": []}
+
+        root = convert(node)
+        stack = [(node, root)]
+        while stack:
+            node, converted = stack.pop()
+            for child in self.children(node):
+                converted_child = convert(child)
+                converted["children"].append(converted_child)
+                if not self.is_token(child):
+                    stack.append((child, converted_child))
+        return root
+
+    def to_bytes(self):
+        # Self-contained binary form, with the lexemes of every token (the source is not needed to load it)
+        tokens = self.token_stream
+        symbols = array("i", tokens.symbols)
+        strings = list(tokens.strings)
+        string_ids = dict(tokens.string_ids)
+        for index, symbol in enumerate(symbols):
+            if symbol < 0: # Lexeme kept in the source buffer
+                lexeme = tokens.lexeme(index)
+                symbol = string_ids.get(lexeme)
+                if symbol is None:
+                    symbol = string_ids[lexeme] = len(strings)
+                    strings.append(lexeme)
+                symbols[index] = symbol
+        metadata = {"nodes": NODE_NAMES, "strings": strings}
+        parts = [MAGIC]
+
+        def add(block):
+            parts.append(LENGTH.pack(len(block)))
+            parts.append(block)
+
+        add(json.dumps(metadata).encode("utf-8"))
+        for name in TREE_ARRAYS:
+            add(getattr(self, name).tobytes())
+        for name in TOKEN_ARRAYS:
+            add((symbols if name == "symbols" else getattr(tokens, name)).tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data.startswith(MAGIC):
+            raise ValueError("Not a syntax tree file")
+        position = len(MAGIC)
+
+        def block():
+            nonlocal position
+            (length,) = LENGTH.unpack_from(data, position)
+            position += LENGTH.size
+            if position + length > len(data):
+                raise ValueError("Truncated syntax tree file")
+            position += length
+            return data[position - length:position]
+
+        metadata = json.loads(block())
+        if metadata["nodes"] != NODE_NAMES:
+            raise ValueError("Syntax tree file written for a different set of node kinds")
+        tree = cls()
+        for name in TREE_ARRAYS:
+            getattr(tree, name).frombytes(block())
+        tokens = tree.token_stream
+        for name in TOKEN_ARRAYS:
+            getattr(tokens, name).frombytes(block())
+        tokens.strings = metadata["strings"]
+        tokens.string_ids = {lexeme: symbol for symbol, lexeme in enumerate(tokens.strings)}
+        return tree
+
+    def save(self, filename):
+        with open(filename, "wb") as tree_file:
+            tree_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as tree_file:
+            return cls.from_bytes(tree_file.read())
+
+"""
+    A Parser that also builds a SyntaxTree. Each nonterminal method opens a node, and each
+    matched token adds a token node to the open one. A nonterminal's node is only added to the
+    tree when its first token is matched, so nonterminals that derive ε never get one.
+    Parsing, tracing and error recovery are those of MyAssignment2.Parser; after a syntax error
+    without recovery the tree holds what was parsed up to the error. The plain Parser stays
+    free of tree building.
+"""
+class TreeParser(syntax.Parser):
+    def __init__(self, tokens, output_file=None, trace=syntax.TRACE_OFF, recover=False, max_errors=syntax.MAX_ERRORS):
+        super().__init__(tokens, output_file, trace, recover, max_errors)
+
+    def reset(self, tokens, output_file=None, trace=syntax.TRACE_OFF): # Start over on new tokens, with a new tree
+        if not isinstance(tokens, lexical.TokenStream): # Keep the tokens the tree refers to
+            token_stream = lexical.TokenStream()
+            tokens = token_stream.capture(lexical.token_records(tokens))
+        else:
+            token_stream = tokens
+        self.tree = SyntaxTree(token_stream)
+        self.open_nodes = [] # [kind code, node or -1 until added, last child or -1] of each open nonterminal
+        self.added = 0 # Open nonterminals (from the outermost) whose nodes are in the tree
+        super().reset(tokens, output_file, trace)
+
+    def add_node(self, code, token): # Append a node to the tree and link it to the innermost added nonterminal
+        tree = self.tree
+        node = len(tree.kinds)
+        tree.kinds.append(code)
+        tree.first_child.append(-1)
+        tree.next_sibling.append(-1)
+        tree.tokens.append(token)
+        if self.added:
+            parent = self.open_nodes[self.added - 1]
+            if parent[2] < 0:
+                tree.first_child[parent[1]] = node
+            else:
+                tree.next_sibling[parent[2]] = node
+            parent[2] = node
+        return node
+
+    def match(self, expected_kind):
+        index = self.current_index
+        syntax.Parser.match(self, expected_kind)
+        open_nodes = self.open_nodes
+        while self.added < len(open_nodes): # Open nonterminals without a node start at this token
+            entry = open_nodes[self.added]
+            entry[1] = self.add_node(entry[0], index)
+            self.added += 1
+        self.add_node(FIRST_TOKEN_NODE + expected_kind, index)
+
+def tree_method(name, code): # Nonterminal method of TreeParser: the Parser method inside a node
+    parse = getattr(syntax.Parser, name)
+
+    def method(self):
+        open_nodes = self.open_nodes
+        open_nodes.append([code, -1, -1])
+        try:
+            parse(self)
+        finally:
+            open_nodes.pop()
+            if self.added > len(open_nodes):
+                self.added = len(open_nodes)
+
+    method.__name__ = name
+    return method
+
+for name, node_name in METHOD_NODES.items():
+    setattr(TreeParser, name, tree_method(name, NODE_CODES[node_name]))
+
+def parse_tree(tokens, recover=False):
+    # Parse tokens (anything Parser accepts) into a SyntaxTree. Returns (tree, errors), where errors
+    # is the list of ParseErrors; without recover, the first error ends the parse.
+    parser = TreeParser(tokens, recover=recover)
+    try:
+        parser.parse()
+    except SyntaxError: # Already recorded in parser.errors
+        pass
+    return parser.tree, parser.errors
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Build the syntax tree of a RAT24F program.")
+    arguments.add_argument("file", help="program to parse")
+    arguments.add_argument("-o", "--output", help="write the tree in binary form to this file")
+    arguments.add_argument("--json", action="store_true", help="print the tree as JSON")
+    arguments.add_argument("--recover", action="store_true", help="continue after syntax errors")
+    return arguments
+
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    with open(args.file, "rb") as input_file:
+        tokens = lexical.lex_file(input_file)
+        try:
+            if not len(tokens):
+                print("Error: No tokens to parse", file=sys.stderr)
+                return 1
+            tree, errors = parse_tree(tokens, args.recover)
+            for error in errors:
+                print(f"Error: {error}", file=sys.stderr)
+            if args.output:
+                tree.save(args.output)
+            if args.json:
+                print(json.dumps(tree.to_dict(), indent=1))
+        finally:
+            tokens.close()
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Incremental Analysis Tests - Compilers CPSC 323
+Description: Checks that every IncrementalAnalysis.edit() gives the same tokens, trace and errors
+as analyzing the edited source from scratch with incremental.analyze().
+
+Usage: python -m unittest test_incremental
+"""
+
+import random
+import unittest
+
+import incremental
+import program_generator
+
+EDIT_PIECES = ("x", "1", " ", "\n", ";", "=", "+", "(", ")", "{", "}", "@", "[*", "*]", " if ", " fi ",
+               " while ", "function ", " integer ")
+
+def error_list(analysis): # The errors as (message, line, column) tuples
+    return [(error.message, error.line, error.column) for error in analysis.errors]
+
+def random_edit(generator, source): # (offset, deleted, inserted) of a small edit, or a pasted piece of the source
+    offset = generator.randint(0, len(source))
+    deleted = generator.randint(0, min(len(source) - offset, generator.choice((0, 1, 2, 5, 20))))
+    if generator.random() < 0.2:
+        start = generator.randint(0, len(source))
+        return offset, deleted, source[start:start + generator.randint(0, 40)]
+    return offset, deleted, "".join(generator.choice(EDIT_PIECES) for _ in range(generator.randint(0, 3)))
+
+class IncrementalEditTest(unittest.TestCase):
+    def assert_same_as_full(self, analysis):
+        full = incremental.analyze(analysis.source)
+        self.assertEqual(list(analysis.records()), list(full.records()))
+        self.assertEqual(analysis.trace_lines(), full.trace_lines())
+        self.assertEqual(error_list(analysis), error_list(full))
+
+    def check_edits(self, source, edits, seed):
+        generator = random.Random(seed)
+        analysis = incremental.analyze(source)
+        for _ in range(edits):
+            offset, deleted, inserted = random_edit(generator, analysis.source)
+            with self.subTest(source=analysis.source, edit=(offset, deleted, inserted)):
+                analysis = analysis.edit(offset, deleted, inserted)
+                self.assert_same_as_full(analysis)
+
+    def test_error_at_end_after_edit(self):
+        source = "@\ninteger v7, total;\n[*integer v0, total, count;\ninteger flag, v7;\nv5 = total * v1;\n@\n"
+        analysis = incremental.analyze(source).edit(66, 5, "")
+        self.assertEqual(error_list(analysis), [("Unexpected statement: ;", 2, 18)])
+        self.assert_same_as_full(analysis)
+
+    def test_edits_of_generated_programs(self):
+        for seed in range(6):
+            source = program_generator.generate_program(functions=seed, statements=8, seed=seed)
+            self.check_edits(source, 40, seed)
+
+    def test_edits_of_long_programs(self): # Enough top-level units to fill several blocks of a UnitList
+        for seed in range(2):
+            source = program_generator.generate_program(functions=150, statements=3, depth=0, seed=seed)
+            self.check_edits(source, 40, seed)
+
+    def test_undone_edits(self): # Each edit followed by the edit that undoes it
+        source = program_generator.generate_program(functions=150, statements=3, depth=0, seed=7)
+        generator = random.Random(7)
+        analysis = incremental.analyze(source)
+        for _ in range(40):
+            offset, deleted, inserted = random_edit(generator, source)
+            changed = analysis.edit(offset, deleted, inserted)
+            self.assert_same_as_full(changed)
+            analysis = changed.edit(offset, len(inserted), source[offset:offset + deleted])
+            self.assertEqual(analysis.source, source)
+            self.assert_same_as_full(analysis)
+
+if __name__ == "__main__":
+    unittest.main()
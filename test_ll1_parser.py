@@ -0,0 +1,50 @@
+"""LL(1) Parser Tests - Compilers CPSC 323
+Description: Checks the options TableParser shares with MyAssignment2.Parser: it parses like the
+recursive parser, and asking it for error recovery fails clearly instead of with a TypeError.
+
+Usage: python -m unittest test_ll1_parser
+"""
+
+import os
+import tempfile
+import unittest
+
+import Assignment1 as lexical
+import ll1_parser
+import MyAssignment2 as syntax
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+def read_test_file(name):
+    with open(os.path.join(DIRECTORY, name), encoding="utf-8") as input_file:
+        return input_file.read()
+
+class TableParserOptionsTest(unittest.TestCase):
+    def test_same_result_as_recursive_parser(self):
+        for name in ("test1.txt", "test2.txt", "test3.txt"):
+            source = read_test_file(name)
+            expected = syntax.analyze(source)
+            result = syntax.analyze(source, parser_class=ll1_parser.TableParser)
+            self.assertEqual(result.trace, expected.trace, name)
+            self.assertEqual([str(error) for error in result.errors], [str(error) for error in expected.errors], name)
+
+    def test_analyze_with_recover(self):
+        with self.assertRaisesRegex(ValueError, "recovery is not supported by TableParser"):
+            syntax.analyze(read_test_file("test3.txt"), recover=True, parser_class=ll1_parser.TableParser)
+
+    def test_analyze_file_with_recover(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_filename = os.path.join(directory, "trace.txt")
+            with self.assertRaisesRegex(ValueError, "recovery is not supported by TableParser"):
+                syntax.analyze_file(os.path.join(DIRECTORY, "test3.txt"), output_filename, recover=True,
+                                    parser_class=ll1_parser.TableParser)
+
+    def test_options_without_recovery(self):
+        tokens = lexical.TokenStream.from_buffer(read_test_file("test1.txt"))
+        parser = ll1_parser.TableParser(tokens, None, syntax.TRACE_OFF, recover=False, max_errors=5)
+        parser.parse()
+        self.assertEqual(parser.errors, [])
+        self.assertEqual(parser.max_errors, 5)
+
+if __name__ == "__main__":
+    unittest.main()
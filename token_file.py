@@ -0,0 +1,290 @@
+"""Token File - Compilers CPSC 323
+Description: Binary token file, so that lexing and parsing can run as separate stages (or on
+separate machines): a program is lexed once into a token file, and the file can be parsed any
+number of times without lexing again. The file is self-contained; the source is not needed to
+read it.
+
+Layout (all integers little-endian):
+- a header: MAGIC, format version, flags, record count, fields per record, string count and
+  string table size;
+- the records, RECORD_FIELDS uint32 each: kind, symbol, offset, length, line, column;
+- the string table: string count + 1 uint32 byte offsets, then the UTF-8 strings they delimit.
+
+Every lexeme is interned, and a record's symbol is the index of its lexeme in the string table.
+Offsets and lengths are in bytes, or in characters when the tokens were lexed from a str
+(FLAG_TEXT_OFFSETS).
+
+A TokenFile reads a token file through a memory map without copying the records: its kinds,
+symbols, offsets, lengths, lines and columns are views into the file, like the arrays of a
+TokenStream, and iterating it yields the (kind, lexeme, offset, line, column) records the
+Parser reads.
+
+Usage: python token_file.py lex FILE [-o FILE.tok]
+       python token_file.py dump FILE.tok
+       python token_file.py parse FILE.tok [-o trace_file] [--trace LEVEL] [--recover]
+"""
+
+import argparse
+from array import array
+from itertools import islice
+import mmap
+import struct
+import sys
+
+import Assignment1 as lexical
+import MyAssignment2 as syntax
+import batch
+
+MAGIC = b"R24K"
+VERSION = 1 # Bump when the layout changes; readers reject other versions
+HEADER = struct.Struct("<4sHHIIII") # magic, version, flags, records, fields per record, strings, string bytes
+RECORD_FIELDS = 6 # kind, symbol, offset, length, line, column
+FIELD_NAMES = ("kinds", "symbols", "offsets", "lengths", "lines", "columns")
+FIELD_SIZE = 4
+
+# Header flags
+FLAG_TEXT_OFFSETS = 1 # Offsets and lengths count characters of a str source, not bytes
+
+class TokenFileError(ValueError): # Not a token file, a truncated or corrupt one, or one of another version
+    pass
+
+def little_endian(values): # array in file byte order (a copy on big-endian machines)
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+def encode_tokens(tokens):
+    # The token file contents of tokens (a TokenStream, or anything Parser accepts), as bytes
+    if not isinstance(tokens, lexical.TokenStream):
+        stream = lexical.TokenStream()
+        for _ in stream.capture(lexical.token_records(tokens)):
+            pass
+        tokens = stream
+    count = len(tokens)
+    strings = list(tokens.strings)
+    string_ids = dict(tokens.string_ids)
+    symbols = array("I", bytes(count * FIELD_SIZE))
+    for index, symbol in enumerate(tokens.symbols):
+        if symbol < 0: # Lexeme kept in the source buffer
+            lexeme = tokens.lexeme(index)
+            symbol = string_ids.get(lexeme)
+            if symbol is None:
+                symbol = string_ids[lexeme] = len(strings)
+                strings.append(lexeme)
+        symbols[index] = symbol
+
+    # Interleave the columns of the stream into rows of RECORD_FIELDS
+    records = array("I", bytes(count * RECORD_FIELDS * FIELD_SIZE))
+    try:
+        for field, name in enumerate(FIELD_NAMES):
+            values = symbols if name == "symbols" else getattr(tokens, name)
+            records[field::RECORD_FIELDS] = values if values.typecode == "I" else array("I", values)
+    except OverflowError:
+        raise TokenFileError("Sources over 4 GiB cannot be stored in a token file") from None
+
+    encoded = [string.encode("utf-8", "surrogateescape") for string in strings]
+    string_offsets = array("I", [0])
+    for string in encoded:
+        string_offsets.append(string_offsets[-1] + len(string))
+    flags = FLAG_TEXT_OFFSETS if isinstance(tokens.source, str) else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, count, RECORD_FIELDS, len(strings), string_offsets[-1])
+    return b"".join([header, little_endian(records).tobytes(), little_endian(string_offsets).tobytes()] + encoded)
+
+def write_token_file(tokens, filename): # Store tokens (see encode_tokens) in a token file
+    data = encode_tokens(tokens)
+    with open(filename, "wb") as token_file:
+        token_file.write(data)
+
+def lex_to_file(input_filename, output_filename):
+    # Lex a program straight into a token file. Returns the number of tokens.
+    with open(input_filename, "rb") as input_file:
+        tokens = lexical.lex_file(input_file)
+        try:
+            write_token_file(tokens, output_filename)
+            return len(tokens)
+        finally:
+            tokens.close()
+
+"""
+    Reader of a token file held in a buffer (a memory map, bytes, ...). The records are not
+    copied: kinds, symbols, offsets, lengths, lines and columns are memoryviews of the buffer,
+    indexed by token number like the arrays of a TokenStream, and only the string table is
+    decoded. A TokenFile can be passed to Parser as it is. Close it (or use it as a context
+    manager) to release the buffer; views taken from it cannot be used afterwards.
+"""
+class TokenFile:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.views = [] # Every memoryview of the buffer, released by close()
+        if len(buffer) < HEADER.size:
+            raise TokenFileError("Not a token file")
+        magic, version, self.flags, count, fields, string_count, string_bytes = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise TokenFileError("Not a token file")
+        if version != VERSION or fields != RECORD_FIELDS:
+            raise TokenFileError(f"Token file version {version} is not supported (expected version {VERSION})")
+        records_end = HEADER.size + count * RECORD_FIELDS * FIELD_SIZE
+        strings_start = records_end + (string_count + 1) * FIELD_SIZE
+        if len(buffer) != strings_start + string_bytes:
+            raise TokenFileError("Truncated token file")
+
+        records = self.view(HEADER.size, records_end)
+        for field, name in enumerate(FIELD_NAMES):
+            setattr(self, name, self.keep(records[field::RECORD_FIELDS]))
+        string_offsets = self.view(records_end, strings_start)
+        try:
+            self.check(string_offsets, string_count, string_bytes)
+        except TokenFileError:
+            self.close_views()
+            raise
+        data = bytes(buffer[strings_start:])
+        self.strings = [data[string_offsets[symbol]:string_offsets[symbol + 1]].decode("utf-8", "surrogateescape")
+                        for symbol in range(string_count)]
+        self.string_ids = {lexeme: symbol for symbol, lexeme in enumerate(self.strings)}
+
+    def check(self, string_offsets, string_count, string_bytes):
+        # Reject a corrupt file whose string table or records point outside the file
+        if string_offsets[0] != 0 or string_offsets[string_count] != string_bytes:
+            raise TokenFileError("Corrupt token file: string table offsets do not match its size")
+        if any(start > end for start, end in zip(string_offsets, islice(string_offsets, 1, None))):
+            raise TokenFileError("Corrupt token file: string table offsets are out of order")
+        if max(self.symbols, default=-1) >= string_count:
+            raise TokenFileError("Corrupt token file: a token's symbol is outside the string table")
+        if max(self.kinds, default=-1) >= len(lexical.kind_names):
+            raise TokenFileError("Corrupt token file: a token has an unknown kind")
+
+    def view(self, start, end): # The uint32 values between two byte offsets of the buffer
+        view = self.keep(memoryview(self.buffer)[start:end])
+        if sys.byteorder != "little": # Native order is needed to read the values; copy them
+            values = array("I")
+            values.frombytes(view)
+            values.byteswap()
+            return values
+        return self.keep(view.cast("I"))
+
+    def keep(self, view): # Remember a memoryview for close (copies made on big-endian machines need no release)
+        if isinstance(view, memoryview):
+            self.views.append(view)
+        return view
+
+    @classmethod
+    def open(cls, filename): # Memory-map a token file
+        with open(filename, "rb") as token_file:
+            buffer = lexical.map_file(token_file)
+        try:
+            return cls(buffer)
+        except TokenFileError:
+            if not isinstance(buffer, bytes):
+                buffer.close()
+            raise
+
+    @property
+    def text_offsets(self): # Whether offsets and lengths count characters rather than bytes
+        return bool(self.flags & FLAG_TEXT_OFFSETS)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def lexeme(self, index):
+        return self.strings[self.symbols[index]]
+
+    def token(self, index): # Token object for one entry
+        return lexical.Token(lexical.kind_names[self.kinds[index]], self.lexeme(index), self.offsets[index],
+                             self.lines[index] or None, self.columns[index] or None)
+
+    def records(self, start=0, stop=None):
+        # Yields (kind, lexeme, offset, line, column) records, the same shape scan() produces
+        records = zip(self.kinds, map(self.strings.__getitem__, self.symbols), self.offsets, self.lines, self.columns)
+        return islice(records, start, stop) if start or stop is not None else records
+
+    def __iter__(self):
+        return self.records()
+
+    def to_stream(self):
+        # A TokenStream holding copies of the tokens (every lexeme interned), for code that needs one
+        stream = lexical.TokenStream()
+        for name in FIELD_NAMES:
+            getattr(stream, name).extend(getattr(self, name))
+        stream.strings = list(self.strings)
+        stream.string_ids = dict(self.string_ids)
+        return stream
+
+    def close_views(self): # Release every memoryview of the buffer
+        while self.views:
+            self.views.pop().release()
+
+    def close(self):
+        self.close_views()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def parse_token_file(filename, output_file=None, trace=syntax.TRACE_FULL, recover=False, parser_class=syntax.Parser):
+    # Parse the tokens of a token file, writing the trace to output_file (a file or TraceSink, or None).
+    # Returns the list of ParseErrors, as analyze_file does.
+    with TokenFile.open(filename) as tokens:
+        options = {"recover": True} if recover else {}
+        try:
+            parser = parser_class(tokens, output_file, trace, **options)
+        except SyntaxError as e: # No tokens
+            return [syntax.ParseError(str(e))]
+        try:
+            parser.parse()
+        except SyntaxError: # Already recorded in parser.errors
+            pass
+        finally:
+            if parser.output_file is not None:
+                parser.output_file.flush()
+        return parser.errors
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Store RAT24F tokens in a binary token file, and read or parse one.")
+    commands = arguments.add_subparsers(dest="command", required=True)
+    lex_command = commands.add_parser("lex", help="lex a program into a token file")
+    lex_command.add_argument("file", help="program to lex")
+    lex_command.add_argument("-o", "--output", help="token file (default: the program's name with .tok)")
+    dump_command = commands.add_parser("dump", help="print the tokens of a token file")
+    dump_command.add_argument("file", help="token file")
+    parse_command = commands.add_parser("parse", help="parse the tokens of a token file")
+    parse_command.add_argument("file", help="token file")
+    parse_command.add_argument("-o", "--output", help="trace file (default: no trace)")
+    parse_command.add_argument("--trace", choices=batch.TRACE_LEVELS, default="full", help="trace level (default: full)")
+    parse_command.add_argument("--recover", action="store_true", help="report every syntax error instead of the first one")
+    return arguments
+
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    try:
+        if args.command == "lex":
+            output_filename = args.output or args.file.rsplit(".", 1)[0] + ".tok"
+            count = lex_to_file(args.file, output_filename)
+            print(f"{count} tokens written to {output_filename}")
+            return 0
+        if args.command == "dump":
+            with TokenFile.open(args.file) as tokens:
+                print(f"{'Token':<12} {'Lexeme'}")
+                print("-" * 25)
+                for index in range(len(tokens)):
+                    print(tokens.token(index))
+            return 0
+        output_file = syntax.open_trace(args.output) if args.output else None
+        try:
+            errors = parse_token_file(args.file, output_file, batch.TRACE_LEVELS[args.trace], args.recover)
+        finally:
+            if output_file is not None:
+                output_file.close()
+    except (OSError, TokenFileError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for error in errors:
+        print(f"Error: {error}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
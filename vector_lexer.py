@@ -0,0 +1,361 @@
+"""Vector Lexer - Compilers CPSC 323
+Description: Optional NumPy backend of the lexer for large inputs. Instead of running the DFA
+one character at a time, it reads the source as a uint8 array and
+- classifies every byte at once through a 256-entry table of character classes;
+- finds the [* *] comments from the positions of every '[*' and '*]', and masks them out;
+- decides for every position whether it continues the token before it, from its class and the
+  class of the position before it (identifiers, numbers and two-character operators), so that
+  the token starts, ends and kinds come out of a few whole-array operations;
+- computes lines and columns from the newline positions, and interns the lexemes by grouping
+  equal ones (operators and separators by their bytes, identifiers by a hash of their bytes).
+
+The result is the TokenStream that Assignment1.TokenStream.from_buffer builds, array for array.
+Spots where the token boundaries cannot be decided from neighbouring characters alone (non-ASCII
+text, runs of three or more operator characters, numbers such as 1.2.3) are lexed by the scalar
+DFA, a line piece at a time. Without NumPy, lex() simply calls TokenStream.from_buffer.
+
+Usage: python vector_lexer.py FILE [FILE ...] [--check]
+"""
+
+import argparse
+import sys
+import time
+
+try:
+    import numpy
+except ImportError: # The backend is optional; lex() falls back to the scalar lexer
+    numpy = None
+
+import Assignment1 as lexical
+
+MAX_VECTOR_LENGTH = 32 # Longer identifiers are interned one at a time
+HASH_MULTIPLIER = 0x100000001B3 # Identifiers are grouped by a hash of their bytes (and the groups checked)
+
+if numpy is not None:
+    # Whole-buffer lookups go through bytes.translate, which is faster than NumPy indexing, so
+    # the tables are bytes objects of 256 entries
+    def class_table(classes): # 1 for the given classes, 0 for the others
+        return bytes(1 if code in classes else 0 for code in range(256))
+
+    def pair_table(pairs): # 1 for the given (previous class, class) pairs, indexed by previous class * 16 + class
+        codes = {previous << 4 | current for previous, current in pairs}
+        return bytes(1 if code in codes else 0 for code in range(256))
+
+    WORD_CLASSES = (lexical.CLASS_LETTER, lexical.CLASS_DIGIT)
+    OPERATOR_CLASSES = (lexical.CLASS_OPERATOR, lexical.CLASS_EQUALS)
+    # Class of every byte; bytes outside ASCII get CLASS_CONTINUATION, which ASCII never has
+    CLASS_TABLE = lexical.byte_class_table[:0x80] + bytes([lexical.CLASS_CONTINUATION]) * 0x80
+    IN_TOKEN = class_table(set(range(256)) - {lexical.CLASS_SPACE, lexical.CLASS_NEWLINE})
+    # Pairs of classes where the second character continues the token of the first: inside a run
+    # of letters and digits, and an operator followed by '='. Digits followed by a letter, digits
+    # followed by '.' and longer operator runs are decided apart.
+    CONTINUES = pair_table([(previous, current) for previous in WORD_CLASSES for current in WORD_CLASSES]
+                           + [(operator, lexical.CLASS_EQUALS) for operator in OPERATOR_CLASSES])
+    WORD_STARTS = pair_table([(previous, current) for previous in range(16) for current in WORD_CLASSES
+                              if previous not in WORD_CLASSES])
+    OPERATOR_PAIRS = pair_table([(previous, current) for previous in OPERATOR_CLASSES for current in OPERATOR_CLASSES])
+    WORD_MASKS = numpy.array([(1 << 8 * count) - 1 for count in range(9)], dtype=numpy.uint64) # Low count bytes of a word
+    DIGIT_LETTER = lexical.CLASS_DIGIT << 4 | lexical.CLASS_LETTER
+    DIGIT_DOT = lexical.CLASS_DIGIT << 4 | lexical.CLASS_DOT
+    # Kind of a token by the class of its first character (numbers are refined by their dots)
+    FIRST_CLASS_KINDS = numpy.full(256, lexical.KIND_INVALID, dtype=numpy.uint8)
+    FIRST_CLASS_KINDS[lexical.CLASS_LETTER] = lexical.KIND_IDENTIFIER
+    FIRST_CLASS_KINDS[lexical.CLASS_DIGIT] = lexical.KIND_INTEGER
+    FIRST_CLASS_KINDS[lexical.CLASS_SEPARATOR] = lexical.KIND_SEPARATOR
+    FIRST_CLASS_KINDS[list(OPERATOR_CLASSES)] = lexical.KIND_OPERATOR
+
+def lookup(values, table, dtype=bool, writable=False): # table[value] for each byte of values (bytes-like or uint8 array)
+    translated = (values if isinstance(values, bytes) else bytes(values)).translate(table)
+    return numpy.frombuffer(bytearray(translated) if writable else translated, dtype=dtype)
+
+def available(): # Whether the vectorized lexer can run (NumPy is installed)
+    return numpy is not None
+
+def comment_spans(raw, data):
+    # (start, end) of every [* *] comment; an unterminated comment runs to the end
+    size = len(data)
+    opening = data[:-1] == ord("[")
+    opening &= data[1:] == ord("*")
+    closing = data[:-1] == ord("*")
+    closing &= data[1:] == ord("]")
+    opens = numpy.flatnonzero(opening)
+    if not len(opens):
+        return []
+    closes = numpy.flatnonzero(closing)
+    next_closes = numpy.searchsorted(closes, opens + 2)
+    ends = numpy.append(closes + 2, size)[next_closes]
+    if (ends[:-1] <= opens[1:]).all(): # Every '[*' after the first starts a comment
+        last = numpy.searchsorted(ends, size) # Comments after an unterminated one are inside it
+        return list(zip(opens[:last + 1].tolist(), ends[:last + 1].tolist()))
+    spans = [] # Some '[*' are inside comments: follow the comments from the first one
+    start = raw.find(b"[*")
+    while start >= 0:
+        close = raw.find(b"*]", start + 2)
+        end = size if close < 0 else close + 2
+        spans.append((start, end))
+        if close < 0:
+            break
+        start = raw.find(b"[*", end)
+    return spans
+
+def line_pieces(positions, newline_positions, spans, size):
+    # Sorted (start, end) of the line pieces (text between newlines and comments) holding positions
+    line_numbers = numpy.searchsorted(newline_positions, positions)
+    ends_of_lines = numpy.append(newline_positions, size)
+    starts = numpy.where(line_numbers > 0, ends_of_lines[numpy.maximum(line_numbers - 1, 0)] + 1, 0)
+    ends = ends_of_lines[line_numbers]
+    if spans:
+        bounds = numpy.array(spans, dtype=numpy.int64)
+        comments = numpy.searchsorted(bounds[:, 0], positions, side="right") # Comments starting before
+        starts = numpy.where(comments > 0, numpy.maximum(starts, bounds[numpy.maximum(comments - 1, 0), 1]), starts)
+        next_starts = numpy.append(bounds[:, 0], size)
+        ends = numpy.minimum(ends, next_starts[comments])
+    return sorted(set(zip(starts.tolist(), ends.tolist())))
+
+def group_keys(keys, key_count=None):
+    # Group equal keys: by a table when they are all below key_count, otherwise by sorting them
+    # (not stably). Returns (first token of each group, in key order, and the group of each token).
+    if key_count is not None:
+        present = numpy.zeros(key_count, dtype=bool)
+        present[keys] = True
+        unique_keys = numpy.flatnonzero(present)
+        numbers = numpy.empty(key_count, dtype=numpy.int64)
+        numbers[unique_keys] = numpy.arange(len(unique_keys))
+        inverse = numbers[keys]
+        group_count = len(unique_keys)
+    else:
+        order = numpy.argsort(keys)
+        sorted_keys = keys[order]
+        new_group = numpy.empty(len(keys), dtype=bool)
+        new_group[0] = True
+        numpy.not_equal(sorted_keys[1:], sorted_keys[:-1], out=new_group[1:])
+        inverse = numpy.empty(len(keys), dtype=numpy.int64)
+        inverse[order] = numpy.cumsum(new_group) - 1
+        group_count = int(inverse[order[-1]]) + 1
+    first_tokens = numpy.full(group_count, len(keys), dtype=numpy.int64)
+    numpy.minimum.at(first_tokens, inverse, numpy.arange(len(keys)))
+    return first_tokens, inverse
+
+def identifier_words(data, starts, lengths):
+    # The bytes of each identifier as uint64 words, read unaligned from the buffer and zero-padded
+    padded = numpy.concatenate((data, numpy.zeros(8, dtype=numpy.uint8)))
+    words = numpy.ndarray((len(data),), dtype="<u8", buffer=padded, strides=(1,)) # The 8 bytes from each position
+    for column in range((int(lengths.max()) + 7) // 8):
+        yield words[numpy.minimum(starts + 8 * column, len(data) - 1)] & WORD_MASKS[numpy.clip(lengths - 8 * column, 0, 8)]
+
+def group_identifiers(raw, data, starts, lengths):
+    # Group identifiers by their bytes. Returns (lexemes, first token of each group, group of each token).
+    columns = list(identifier_words(data, starts, lengths))
+    hashes = columns[0]
+    for words in columns[1:]:
+        hashes = hashes * numpy.uint64(HASH_MULTIPLIER) ^ words
+    first_tokens, inverse = group_keys(hashes)
+    representatives = first_tokens[inverse]
+    if any((words != words[representatives]).any() for words in columns):
+        # A hash collision: group them one at a time
+        names = {}
+        inverse = numpy.array([names.setdefault(raw[start:start + length], len(names))
+                               for start, length in zip(starts.tolist(), lengths.tolist())], dtype=numpy.int64)
+        first_tokens = numpy.full(len(names), len(starts), dtype=numpy.int64)
+        numpy.minimum.at(first_tokens, inverse, numpy.arange(len(starts)))
+    first_starts = starts[first_tokens].tolist()
+    lexemes = [raw[start:start + length].decode("ascii") for start, length in zip(first_starts, lengths[first_tokens].tolist())]
+    return lexemes, first_tokens, inverse
+
+def lex(buffer):
+    # Lex a whole buffer (str, bytes or mmap) into a TokenStream, like TokenStream.from_buffer
+    if numpy is None or (isinstance(buffer, str) and not buffer.isascii()):
+        return lexical.TokenStream.from_buffer(buffer)
+    raw = buffer.encode("ascii") if isinstance(buffer, str) else buffer
+    stream = lexical.TokenStream(buffer)
+    size = len(raw)
+    if not size:
+        return stream
+    data = numpy.frombuffer(raw, dtype=numpy.uint8)
+    classes = lookup(raw, CLASS_TABLE, numpy.uint8, writable=True)
+
+    # Comments count as whitespace
+    spans = comment_spans(raw, data)
+    for start, end in spans:
+        classes[start:end] = lexical.CLASS_SPACE
+    newline_positions = numpy.flatnonzero(data == ord("\n"))
+    in_token = lookup(classes, IN_TOKEN, writable=True)
+    pairs = numpy.empty(size, dtype=numpy.uint8) # previous class * 16 + class
+    pairs[0] = lexical.CLASS_SPACE << 4 | classes[0]
+    numpy.left_shift(classes[:-1], 4, out=pairs[1:])
+    pairs[1:] |= classes[1:]
+    pair_bytes = pairs.tobytes()
+    continues = lookup(pair_bytes, CONTINUES, writable=True)
+    irregular = [numpy.flatnonzero(classes == lexical.CLASS_CONTINUATION)] # Non-ASCII text
+
+    # Digits followed by a letter or a '.': an integer followed by an identifier or a real,
+    # unless the run of letters and digits they end started with a letter (an identifier)
+    word_starts = numpy.flatnonzero(lookup(pair_bytes, WORD_STARTS))
+    letters = numpy.flatnonzero(pairs == DIGIT_LETTER)
+    dots = numpy.flatnonzero(pairs == DIGIT_DOT)
+    letter_runs = word_starts[numpy.searchsorted(word_starts, letters, side="right") - 1]
+    irregular.append(letters[classes[letter_runs] == lexical.CLASS_DIGIT]) # Such as 12ab
+    dot_runs = word_starts[numpy.searchsorted(word_starts, dots - 1, side="right") - 1]
+    numbers = classes[dot_runs] == lexical.CLASS_DIGIT
+    after_dot = numbers & (dot_runs > 0) & (classes[numpy.maximum(dot_runs - 1, 0)] == lexical.CLASS_DOT)
+    irregular.append(dots[after_dot]) # Such as 1.2.3, where the tokens depend on the one before
+    joined = dots[numbers & ~after_dot] # A '.' that continues an integer, and the digits after it
+    continues[joined] = True
+    fractions = joined[joined + 1 < size] + 1
+    continues[fractions[classes[fractions] == lexical.CLASS_DIGIT]] = True
+
+    # Runs of three or more operator characters (<==, ===, ...)
+    operator_pairs = numpy.flatnonzero(lookup(pair_bytes, OPERATOR_PAIRS))
+    irregular.append(operator_pairs[1:][numpy.diff(operator_pairs) == 1])
+
+    # Line pieces holding an irregular position are lexed by the DFA
+    fallback_records = []
+    irregular = numpy.concatenate(irregular)
+    if len(irregular):
+        for start, end in line_pieces(irregular, newline_positions, spans, size):
+            line = int(numpy.searchsorted(newline_positions, start))
+            line_start = int(newline_positions[line - 1]) + 1 if line else 0
+            for kind, lexeme, offset, line_number, column in lexical.scan(raw[start:end], False, 0, line + 1, line_start - start):
+                fallback_records.append((kind, lexeme, offset + start, line_number, column))
+            in_token[start:end] = False
+        continues &= in_token
+        joined = joined[in_token[joined]]
+
+    # Token starts and ends
+    starts = numpy.flatnonzero(in_token & ~continues)
+    last = in_token.copy() # Last character of each token: the next one does not continue it
+    last[:-1] &= ~continues[1:]
+    ends = numpy.flatnonzero(last) + 1
+    lengths = ends - starts
+
+    kinds = FIRST_CLASS_KINDS[classes[starts]]
+    if len(joined): # Numbers with a '.' are reals, or invalid when nothing follows the '.'
+        reals = numpy.searchsorted(starts, joined, side="right") - 1
+        kinds[reals] = numpy.where(classes[ends[reals] - 1] == lexical.CLASS_DIGIT, lexical.KIND_REAL, lexical.KIND_INVALID)
+
+    # The tokens of each line follow each other, so the lines come from the token count before each newline
+    line_ends = numpy.searchsorted(starts, newline_positions)
+    lines = numpy.repeat(numpy.arange(1, len(newline_positions) + 2), numpy.diff(line_ends, prepend=0, append=len(starts)))
+    line_starts = numpy.concatenate(([0], newline_positions + 1))
+    columns = starts - line_starts[lines - 1] + 1
+
+    # Merge in the tokens lexed by the DFA, in source order
+    vector_count = len(starts)
+    if fallback_records:
+        fallback = list(zip(*fallback_records))
+        fallback_lengths = [len(lexeme) if lexeme.isascii() else len(lexeme.encode("utf-8", "surrogateescape"))
+                            for lexeme in fallback[1]]
+        offsets = numpy.concatenate((starts, numpy.array(fallback[2], dtype=numpy.int64)))
+        order = numpy.argsort(offsets, kind="stable")
+        kinds = numpy.concatenate((kinds, numpy.array(fallback[0], dtype=numpy.uint8)))
+        lengths = numpy.concatenate((lengths, numpy.array(fallback_lengths, dtype=numpy.int64)))
+        lines = numpy.concatenate((lines, numpy.array(fallback[3], dtype=numpy.int64)))
+        columns = numpy.concatenate((columns, numpy.array(fallback[4], dtype=numpy.int64)))
+        ranks = numpy.empty(len(offsets), dtype=numpy.int64) # Position of each token in source order
+        ranks[order] = numpy.arange(len(offsets))
+    else:
+        offsets = starts
+        order = None
+        ranks = numpy.arange(len(offsets))
+
+    # Interned lexemes are numbered in order of first appearance, as TokenStream.intern does
+    symbols = numpy.full(len(offsets), -1, dtype=numpy.int64)
+    first_seen = {} # Interned lexeme -> position of its first token in source order
+    groups = [] # (tokens, lexeme of each group, group of each token)
+
+    def add_group(tokens, lexemes, first_tokens, inverse):
+        for lexeme, rank in zip(lexemes, ranks[tokens[first_tokens]].tolist()):
+            if first_seen.get(lexeme, rank) >= rank:
+                first_seen[lexeme] = rank
+        groups.append((tokens, lexemes, inverse))
+
+    # Separators and operators: one or two ASCII characters, keyed by their byte values
+    vector_kinds = kinds[:vector_count]
+    short = numpy.flatnonzero((vector_kinds == lexical.KIND_SEPARATOR) | (vector_kinds == lexical.KIND_OPERATOR))
+    if len(short):
+        second = numpy.where(lengths[short] > 1, data[numpy.minimum(starts[short] + 1, size - 1)], 0)
+        keys = data[starts[short]].astype(numpy.int32) << 8 | second
+        first_tokens, inverse = group_keys(keys, 1 << 16)
+        lexemes = [chr(key >> 8) + (chr(key & 255) if key & 255 else "") for key in keys[first_tokens].tolist()]
+        add_group(short, lexemes, first_tokens, inverse)
+
+    # Identifiers (and keywords)
+    identifiers = numpy.flatnonzero(vector_kinds == lexical.KIND_IDENTIFIER)
+    long_identifiers = identifiers[lengths[identifiers] > MAX_VECTOR_LENGTH]
+    identifiers = identifiers[lengths[identifiers] <= MAX_VECTOR_LENGTH]
+    if len(identifiers):
+        lexemes, first_tokens, inverse = group_identifiers(raw, data, starts[identifiers], lengths[identifiers])
+        keyword = numpy.array([lexeme in lexical.keyword_set for lexeme in lexemes], dtype=bool)
+        kinds[identifiers[keyword[inverse]]] = lexical.KIND_KEYWORD
+        add_group(identifiers, lexemes, first_tokens, inverse)
+
+    # Tokens interned one at a time: long identifiers and the interned tokens the DFA lexed
+    single = [(token, raw[start:end].decode("ascii"))
+              for token, start, end in zip(long_identifiers.tolist(), starts[long_identifiers].tolist(), ends[long_identifiers].tolist())]
+    for record_number, record in enumerate(fallback_records):
+        if record[0] in lexical.TokenStream.INTERNED_KINDS:
+            single.append((vector_count + record_number, record[1]))
+    for token, lexeme in single:
+        if token < vector_count and lexeme in lexical.keyword_set:
+            kinds[token] = lexical.KIND_KEYWORD
+        rank = int(ranks[token])
+        if first_seen.get(lexeme, rank) >= rank:
+            first_seen[lexeme] = rank
+
+    strings = sorted(first_seen, key=first_seen.__getitem__)
+    string_ids = {lexeme: symbol for symbol, lexeme in enumerate(strings)}
+    for tokens, lexemes, inverse in groups:
+        group_symbols = numpy.array([string_ids[lexeme] for lexeme in lexemes], dtype=numpy.int64)
+        symbols[tokens] = group_symbols[inverse]
+    for token, lexeme in single:
+        symbols[token] = string_ids[lexeme]
+
+    if order is not None:
+        kinds, offsets, lengths, lines, columns, symbols = (values[order] for values in (kinds, offsets, lengths, lines, columns, symbols))
+    for name, values in (("kinds", kinds), ("offsets", offsets), ("lengths", lengths), ("lines", lines),
+                         ("columns", columns), ("symbols", symbols)):
+        target = getattr(stream, name)
+        target.frombytes(bytes(len(values) * target.itemsize))
+        numpy.frombuffer(target, dtype=target.typecode)[:] = values # Converted as it is copied
+    stream.strings = strings
+    stream.string_ids = string_ids
+    return stream
+
+def lex_file(file): # Memory-map an open binary file and lex it (see Assignment1.lex_file)
+    return lex(lexical.map_file(file))
+
+def same_tokens(first, second): # Whether two TokenStreams hold the same tokens and string table
+    return (all(getattr(first, name) == getattr(second, name)
+                for name in ("kinds", "offsets", "lengths", "lines", "columns", "symbols"))
+            and first.strings == second.strings)
+
+def build_argument_parser():
+    arguments = argparse.ArgumentParser(description="Lex RAT24F programs with the vectorized lexer and time it.")
+    arguments.add_argument("files", nargs="+", help="programs to lex")
+    arguments.add_argument("--check", action="store_true", help="also lex with the scalar lexer and compare")
+    return arguments
+
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    if not available():
+        print("NumPy is not installed; using the scalar lexer", file=sys.stderr)
+    status = 0
+    for filename in args.files:
+        with open(filename, "rb") as input_file:
+            data = input_file.read()
+        start = time.perf_counter()
+        tokens = lex(data)
+        seconds = time.perf_counter() - start
+        line = f"{filename}: {len(tokens)} tokens in {seconds:.4f} s"
+        if args.check:
+            start = time.perf_counter()
+            expected = lexical.TokenStream.from_buffer(data)
+            scalar_seconds = time.perf_counter() - start
+            same = same_tokens(tokens, expected)
+            line += f" (scalar {scalar_seconds:.4f} s, {'same tokens' if same else 'DIFFERENT tokens'})"
+            status = status or (0 if same else 1)
+        print(line)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())